@@ -5,14 +5,25 @@ from .base import (
     LIMIT_THRESHOLD,
     browse_element
 )
+from .count import CountCache, count_cache
 from .comment import (
     browse_comment,
     create_comment,
     delete_comment,
     get_comment
 )
+from .job import (
+    JobKind,
+    claim_job,
+    enqueue_job,
+    fail_job,
+    job_handler,
+    run_job,
+    run_worker
+)
 from .post import (
     DEFAULT_TERMS,
+    Upload,
     browse_post,
     count_all as count_all_posts,
     create_post,
@@ -25,13 +36,33 @@ from .post import (
     get_size,
     move_post,
     process_filename,
+    process_post,
     perma_delete_post,
+    relocate_post,
     replace_post,
     save_file
 )
+from .manifest import (
+    Manifested,
+    forget_files,
+    load_manifest,
+    manifest_key,
+    record_files,
+    rebuild_manifest
+)
+from .media import MediaInfo, probe_media
+from .page_cache import PageCache, page_cache
 from .role import get_role_by_priority
 from .removed import create_log, delete_log
+from .reprocess import RateLimiter, ReprocessCheckpoint, ReprocessFilter
 from .score import add_vote, delete_score, get_vote, get_score, remove_vote
+from .search import (
+    SearchQuery,
+    TagIds,
+    compile_query,
+    parse_terms,
+    resolve_tags
+)
 from .tag import (
     add_tags,
     browse_tag,
@@ -42,11 +73,32 @@ from .tag import (
     get_tag
 )
 from .thumbnail import (
+    VARIANT_SIZES,
+    VARIANT_TYPE,
+    EncodedThumbnail,
     ThumbnailType,
     create_thumbnail,
+    delete_thumbnail,
+    delete_thumbnail_images,
+    encode_thumbnail,
     generate_thumbnail,
-    is_alpha_used
+    get_thumbnail,
+    get_thumbnail_size,
+    get_thumbnail_variant,
+    is_alpha_used,
+    send_thumbnail,
+    thumbnail_srcset
+)
+from .thumbnail_store import (
+    DatabaseStore,
+    FilesystemStore,
+    ThumbnailStore,
+    filesystem_store,
+    store_of,
+    thumbnail_store
 )
+from .tag_index import TagIndex, tag_index
+from .tag_suggest import TagSuggester, tag_suggester
 from .snapshot import (
     browse_snapshots,
     create_snapshot,
@@ -1,8 +1,14 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as DecodeError
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from json import dumps, loads
 from logging import getLogger
-from typing import Callable, Literal, Optional, TypeVar
+from typing import Any, Callable, Hashable, Literal, Optional, TypeVar
 
-from flask_sqlalchemy.pagination import SelectPagination
-from sqlalchemy import Select, select
+from flask_sqlalchemy.pagination import Pagination, SelectPagination
+from sqlalchemy import ColumnElement, Select, and_, func, or_, select
+from sqlalchemy.orm import lazyload
 
 from config import (
     DEFAULT_LIMIT,
@@ -11,11 +17,267 @@ from config import (
     LIMIT_THRESHOLD
 )
 from db import db
+from .bitmap import Bitmap
+from .count import DEPENDENCIES, count_cache
+from .loaders import load_profile
 
 T = TypeVar('T')
 
 logger = getLogger('app_logger')
 
+@dataclass(frozen = True)
+class Cursor:
+    """
+    Represents a position next to an element of a sorted browse.
+    Encoded into an opaque string handed out to clients.
+    """
+    key: str
+    direction: str
+    value: Any
+    id: int
+    # Whether elements before the position are wanted instead of after.
+    before: bool = False
+
+    @classmethod
+    def of(
+        cls,
+        item: Any,
+        key: str,
+        direction: str,
+        before: bool = False
+    ) -> 'Cursor':
+        return cls(key, direction, getattr(item, key), item.id, before)
+
+    @classmethod
+    def decode(cls, token: str) -> Optional['Cursor']:
+        """
+        Returns decoded cursor or None if token is malformed.
+
+        Args:
+            token: Encoded cursor
+        """
+        try:
+            padding = b'=' * (-len(token) % 4)
+            data = loads(urlsafe_b64decode(token.encode() + padding))
+
+            if data.pop('datetime', False):
+                data['value'] = datetime.fromisoformat(data['value'])
+
+            return cls(**data)
+        except (AttributeError, DecodeError, TypeError, ValueError) as exception:
+            logger.warning(f'Invalid cursor passed: {token}')
+            return None
+
+    def encode(self) -> Optional[str]:
+        """
+        Returns encoded cursor or None if its value can't be encoded.
+        """
+        data = asdict(self)
+
+        if isinstance(self.value, datetime):
+            data.update(value = self.value.isoformat(), datetime = True)
+
+        try:
+            data = dumps(data, separators = (',', ':'))
+        except TypeError as exception:
+            logger.debug(f'Can\'t encode cursor value of {self.key}')
+            return None
+
+        return urlsafe_b64encode(data.encode()).rstrip(b'=').decode()
+
+    def seek(self, element: T) -> ColumnElement[bool]:
+        """
+        Returns condition selecting elements past the cursor in its
+        direction, sorted by (key, id) where NULL sorts lowest.
+
+        Args:
+            element: Element being browsed
+        """
+        column, element_id = getattr(element, self.key), element.id
+        greater = (self.direction == 'asc') != self.before
+
+        if self.key == 'id':
+            return element_id > self.id if greater else element_id < self.id
+
+        if self.value is None:
+            if greater:
+                return or_(
+                    column.is_not(None),
+                    and_(column.is_(None), element_id > self.id)
+                )
+
+            return and_(column.is_(None), element_id < self.id)
+
+        # Compare against the value as stored by the cursor's element,
+        # its encoded copy may be formatted differently (e.g datetimes).
+        value = func.coalesce(
+            select(column).where(element.id == self.id).scalar_subquery(),
+            self.value
+        )
+
+        if greater:
+            return or_(
+                column > value,
+                and_(column == value, element_id > self.id)
+            )
+
+        return or_(
+            column < value,
+            and_(column == value, element_id < self.id),
+            column.is_(None)
+        )
+
+class CursorMixin:
+    """
+    Adds next and previous page cursors to a pagination.
+    """
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+    def _set_cursors(self, items: list, has_next: bool, has_prev: bool) -> None:
+        if not items:
+            return
+
+        key, direction = self._query_args['key'], self._query_args['direction']
+
+        if has_next:
+            self.next_cursor = Cursor.of(items[-1], key, direction).encode()
+
+        if has_prev:
+            self.prev_cursor = Cursor.of(
+                items[0], key, direction, before = True
+            ).encode()
+
+class BrowsePagination(CursorMixin, SelectPagination):
+    """
+    Paginates a statement, counting its rows through the count cache.
+    """
+    approximate = False
+
+    def _query_count(self) -> int:
+        stmt = self._query_args['select'].options(lazyload('*')).order_by(None)
+        session = self._query_args['session']
+        element, key = self._query_args['element'], self._query_args['count_key']
+
+        def count_fn(limit: Optional[int]) -> int:
+            subquery = (stmt.limit(limit) if limit else stmt).subquery()
+            return session.scalar(select(func.count()).select_from(subquery))
+
+        if key is None:
+            return count_fn(None)
+
+        # Count at least two pages past this one, so there's a next page.
+        count = count_cache.count(
+            (element.__name__, key),
+            DEPENDENCIES.get(element.__name__, (element.__name__,)),
+            count_fn,
+            needed = self._query_offset + 2 * self.per_page
+        )
+        self.approximate = count.approximate
+
+        return count.total
+
+class OffsetPagination(BrowsePagination):
+    """
+    Paginates a statement by page number.
+    """
+    def _query_items(self) -> list:
+        stmt = self._query_args['select']
+        items = list(self._query_args['session'].scalars(
+            stmt.limit(self.per_page + 1).offset(self._query_offset)
+        ).unique())
+
+        self._set_cursors(
+            items[:self.per_page],
+            has_next = len(items) > self.per_page,
+            has_prev = self.page > 1
+        )
+        return items[:self.per_page]
+
+class KeysetPagination(BrowsePagination):
+    """
+    Paginates a statement by seeking past a cursor, so deep pages
+    cost as much as the first one.
+    """
+    def _query_items(self) -> list:
+        element, cursor = self._query_args['element'], self._query_args['cursor']
+        stmt = self._query_args['select']
+
+        if cursor:
+            stmt = stmt.where(cursor.seek(element))
+
+        # Walk backwards from the cursor and flip the page afterwards.
+        if cursor and cursor.before:
+            stmt = element.apply_sort(
+                stmt.order_by(None),
+                cursor.key,
+                'asc' if cursor.direction == 'desc' else 'desc'
+            )
+
+        items = list(self._query_args['session'].scalars(
+            stmt.limit(self.per_page + 1)
+        ).unique())
+        more = len(items) > self.per_page
+        items = items[:self.per_page]
+
+        if cursor and cursor.before:
+            items.reverse()
+            self._set_cursors(items, has_next = True, has_prev = more)
+        else:
+            self._set_cursors(items, has_next = more, has_prev = bool(cursor))
+
+        return items
+
+class IdPagination(CursorMixin, Pagination):
+    """
+    Paginates elements by a bitmap of their IDs,
+    fetching only the current page's rows by primary key.
+    """
+    approximate = False
+
+    def _query_items(self) -> list:
+        element, cursor = self._query_args['element'], self._query_args['cursor']
+        ids: Bitmap = self._query_args['ids']
+        reverse = self._query_args['direction'] == 'desc'
+        offset, limit, total = self._query_offset, self.per_page, len(ids)
+
+        # Translate cursor into an offset in browsing order.
+        if cursor and cursor.before:
+            end = total - ids.rank(cursor.id + 1) if reverse\
+            else ids.rank(cursor.id)
+            offset = max(end - limit, 0)
+            limit = end - offset
+        elif cursor:
+            offset = total - ids.rank(cursor.id) if reverse\
+            else ids.rank(cursor.id + 1)
+
+        page_ids = ids.slice(offset, limit, reverse = reverse)
+        elements = {}
+
+        if page_ids:
+            elements = {
+                item.id: item for item in db.session.scalars(
+                    select(element)
+                    .where(element.id.in_(page_ids))
+                    .options(*self._query_args['options'])
+                )
+            }
+
+        items = [
+            elements[element_id] for element_id in page_ids
+            if element_id in elements
+        ]
+
+        self._set_cursors(
+            items,
+            has_next = offset + limit < total,
+            has_prev = offset > 0
+        )
+        return items
+
+    def _query_count(self) -> int:
+        return len(self._query_args['ids'])
+
 def browse_element(
     element: T,
     extra_fn: Optional[Callable[[Select[T]], Select[T]]] = None,
@@ -23,8 +285,14 @@ def browse_element(
     limit: Optional[int] = DEFAULT_LIMIT,
     page: Optional[int] = 1,
     sort: Optional[str] = DEFAULT_SORT,
-    terms: Optional[str] = None
-    ) -> SelectPagination:
+    terms: Optional[str] = None,
+    stmt: Optional[Select[T]] = None,
+    ids: Optional[Bitmap] = None,
+    cursor: Optional[str] = None,
+    include_total: Optional[bool] = True,
+    count_key: Optional[Hashable] = None,
+    profile: Optional[str] = None
+    ) -> Pagination:
     """
     Paginates element.
 
@@ -37,6 +305,15 @@ def browse_element(
         page: Page
         sort: What column to sort
         terms: Searching terms
+        stmt: Statement to paginate, selects every element by default
+        ids: IDs of elements to paginate instead of a statement,
+        only used when sorting by ID
+        cursor: Cursor of a previous page to continue from instead of page
+        include_total: Whether to count elements to know amount of pages
+        count_key: Normalized searching criteria to cache the count by,
+        counts aren't cached without it
+        profile: Loader profile of relationships the page will use
+        (see api/loaders.py)
     """
     logger.debug(f'Creating select for element {element.__name__}')
 
@@ -48,7 +325,40 @@ def browse_element(
         logger.warning(f'Invalid select sort direction passed: {direction}')
         direction = DEFAULT_SORT_DIR
 
-    stmt = element.apply_sort(select(element), sort, direction)
+    key = element.get_sort_key(sort)
+
+    if cursor is not None:
+        cursor = Cursor.decode(cursor)
+
+        if cursor and (cursor.key, cursor.direction) != (key, direction):
+            logger.warning('Cursor of a differently sorted browse passed')
+            cursor = None
+
+        # Cursor replaces the page.
+        page = 1
+
+    args = {
+        'page': page,
+        'per_page': limit,
+        'max_per_page': None,
+        'count': include_total,
+        'element': element,
+        'key': key,
+        'direction': direction,
+        'cursor': cursor,
+        'count_key': count_key,
+        'options': load_profile(element, profile)
+    }
+
+    if ids is not None and key == 'id':
+        logger.debug(f'Paginating {len(ids)} {element.__name__} IDs')
+
+        return IdPagination(ids = ids, **args)
+
+    if stmt is None:
+        stmt = select(element)
+
+    stmt = element.apply_sort(stmt, sort, direction).options(*args['options'])
 
     if extra_fn:
         stmt = extra_fn(stmt)
@@ -57,10 +367,7 @@ def browse_element(
             f'selecting: {extra_fn.__name__}'
         )
 
-    elements = db.paginate(
-        stmt,
-        page = page,
-        per_page = limit
-    )
+    pagination = KeysetPagination if cursor else OffsetPagination
+    elements = pagination(select = stmt, session = db.session(), **args)
 
     return elements
@@ -0,0 +1,359 @@
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator
+from typing import Optional
+
+# Containers holding at most this many values are stored as sorted arrays,
+# bigger ones as a 65536 bit wide integer. Integer operations run natively
+# while arrays are walked value by value, hence the limit is kept lower
+# than the 4096 values at which both take equal memory.
+ARRAY_LIMIT = 512
+CONTAINER_BITS = 1 << 16
+CONTAINER_BYTES = CONTAINER_BITS // 8
+# Bits counted at once when skipping through a bitmap container.
+BLOCK_BITS = 2048
+
+Container = array | int
+
+def _cardinality(container: Container) -> int:
+    if isinstance(container, int):
+        return container.bit_count()
+
+    return len(container)
+
+def _to_bits(container: Container) -> int:
+    if isinstance(container, int):
+        return container
+
+    data = bytearray(CONTAINER_BYTES)
+
+    for value in container:
+        data[value >> 3] |= 1 << (value & 7)
+
+    return int.from_bytes(data, 'little')
+
+def _iter_bits(bits: int, reverse: bool = False, skip: int = 0) -> Iterator[int]:
+    """
+    Yields the set bits of a bitmap container in order. Bits are found
+    by scanning its binary digits, so the cost grows with set bits
+    rather than the container width, and skipped blocks are only counted.
+    """
+    # Digit at index i is bit i.
+    digits = format(bits, f'0{CONTAINER_BITS}b')[::-1]
+    blocks = range(CONTAINER_BITS - BLOCK_BITS, -1, -BLOCK_BITS) if reverse\
+    else range(0, CONTAINER_BITS, BLOCK_BITS)
+
+    for start in blocks:
+        end = start + BLOCK_BITS
+
+        if skip:
+            count = digits.count('1', start, end)
+
+            if skip >= count:
+                skip -= count
+                continue
+
+        if reverse:
+            index = digits.rfind('1', start, end)
+
+            while index != -1:
+                if skip:
+                    skip -= 1
+                else:
+                    yield index
+
+                index = digits.rfind('1', start, index)
+        else:
+            index = digits.find('1', start, end)
+
+            while index != -1:
+                if skip:
+                    skip -= 1
+                else:
+                    yield index
+
+                index = digits.find('1', index + 1, end)
+
+def _to_array(bits: int) -> array:
+    return array('H', _iter_bits(bits))
+
+def _optimize(container: Container) -> Optional[Container]:
+    """
+    Returns the cheapest representation of a container,
+    or None if it's empty.
+    """
+    if isinstance(container, int):
+        count = container.bit_count()
+
+        if not count:
+            return None
+
+        return _to_array(container) if count <= ARRAY_LIMIT else container
+
+    if not container:
+        return None
+
+    return container if len(container) <= ARRAY_LIMIT else _to_bits(container)
+
+def _filter(values: array, bits: int, keep: bool) -> array:
+    """
+    Returns values whose bit in the bitmap container is set
+    (or unset if keep is False).
+    """
+    data = bits.to_bytes(CONTAINER_BYTES, 'little')
+
+    return array('H', (
+        value for value in values
+        if bool(data[value >> 3] >> (value & 7) & 1) == keep
+    ))
+
+class Bitmap:
+    """
+    Represents a compressed set of unsigned integers, in the style of
+    roaring bitmaps. Values are split by their upper 16 bits into
+    containers that are either a sorted array (sparse) or
+    a 65536 bit integer (dense), so set algebra on dense
+    containers runs at native integer speed.
+    """
+    __slots__ = ('_containers',)
+
+    def __init__(self, values: Iterable[int] = ()):
+        self._containers: dict[int, Container] = {}
+
+        for value in values:
+            self.add(value)
+
+    @classmethod
+    def from_sorted(cls, values: Iterable[int]) -> 'Bitmap':
+        """
+        Builds a bitmap from ascending unique values.
+
+        Args:
+            values: Ascending unique values
+        """
+        bitmap = cls()
+        key, chunk = None, array('H')
+
+        for value in values:
+            high = value >> 16
+
+            if high != key:
+                if chunk:
+                    bitmap._containers[key] = _optimize(chunk)
+
+                key, chunk = high, array('H')
+
+            chunk.append(value & 0xFFFF)
+
+        if chunk:
+            bitmap._containers[key] = _optimize(chunk)
+
+        return bitmap
+
+    def add(self, value: int) -> None:
+        high, low = value >> 16, value & 0xFFFF
+        container = self._containers.get(high)
+
+        if container is None:
+            self._containers[high] = array('H', (low,))
+        elif isinstance(container, int):
+            self._containers[high] = container | 1 << low
+        else:
+            index = bisect_left(container, low)
+
+            if index < len(container) and container[index] == low:
+                return
+
+            container.insert(index, low)
+
+            if len(container) > ARRAY_LIMIT:
+                self._containers[high] = _to_bits(container)
+
+    def discard(self, value: int) -> None:
+        high, low = value >> 16, value & 0xFFFF
+        container = self._containers.get(high)
+
+        if container is None:
+            return
+
+        if isinstance(container, int):
+            container &= ~(1 << low)
+        else:
+            index = bisect_left(container, low)
+
+            if index == len(container) or container[index] != low:
+                return
+
+            del container[index]
+
+        container = _optimize(container)
+
+        if container is None:
+            del self._containers[high]
+        else:
+            self._containers[high] = container
+
+    def copy(self) -> 'Bitmap':
+        bitmap = Bitmap()
+        bitmap._containers = {
+            key: container if isinstance(container, int) else array('H', container)
+            for key, container in self._containers.items()
+        }
+
+        return bitmap
+
+    def rank(self, value: int) -> int:
+        """
+        Returns amount of values lower than value.
+
+        Args:
+            value: Value to rank
+        """
+        high, low = value >> 16, value & 0xFFFF
+        count = 0
+
+        for key, container in self._containers.items():
+            if key < high:
+                count += _cardinality(container)
+            elif key == high:
+                if isinstance(container, int):
+                    count += (container & (1 << low) - 1).bit_count()
+                else:
+                    count += bisect_left(container, low)
+
+        return count
+
+    def slice(
+        self,
+        offset: int,
+        limit: int,
+        reverse: bool = False
+    ) -> list[int]:
+        """
+        Returns up to limit values after skipping offset values,
+        without expanding the containers that are skipped.
+
+        Args:
+            offset: Amount of values to skip
+            limit: Amount of values to return
+            reverse: Walk from the largest value down
+        """
+        values = []
+
+        for key in sorted(self._containers, reverse = reverse):
+            container = self._containers[key]
+            count = _cardinality(container)
+
+            if offset >= count:
+                offset -= count
+                continue
+
+            if isinstance(container, int):
+                low_values = _iter_bits(container, reverse, offset)
+            else:
+                low_values = container[::-1] if reverse else container
+                low_values = low_values[offset:]
+
+            offset = 0
+
+            for low in low_values:
+                values.append(key << 16 | low)
+
+                if len(values) == limit:
+                    return values
+
+        return values
+
+    def __and__(self, other: 'Bitmap') -> 'Bitmap':
+        bitmap = Bitmap()
+
+        for key in self._containers.keys() & other._containers.keys():
+            a, b = self._containers[key], other._containers[key]
+
+            if isinstance(a, int) and isinstance(b, int):
+                container = a & b
+            elif isinstance(a, int):
+                container = _filter(b, a, True)
+            elif isinstance(b, int):
+                container = _filter(a, b, True)
+            else:
+                container = array('H', sorted(set(a).intersection(b)))
+
+            container = _optimize(container)
+
+            if container is not None:
+                bitmap._containers[key] = container
+
+        return bitmap
+
+    def __or__(self, other: 'Bitmap') -> 'Bitmap':
+        bitmap = self.copy()
+
+        for key, b in other._containers.items():
+            a = bitmap._containers.get(key)
+
+            if a is None:
+                container = b if isinstance(b, int) else array('H', b)
+            elif isinstance(a, int) or isinstance(b, int):
+                container = _to_bits(a) | _to_bits(b)
+            else:
+                container = array('H', sorted(set(a).union(b)))
+
+            bitmap._containers[key] = _optimize(container)
+
+        return bitmap
+
+    def __sub__(self, other: 'Bitmap') -> 'Bitmap':
+        bitmap = Bitmap()
+
+        for key, a in self._containers.items():
+            b = other._containers.get(key)
+
+            if b is None:
+                container = a if isinstance(a, int) else array('H', a)
+            elif isinstance(a, int):
+                container = a & ~_to_bits(b)
+            elif isinstance(b, int):
+                container = _filter(a, b, False)
+            else:
+                excluded = set(b)
+                container = array('H', (v for v in a if v not in excluded))
+
+            container = _optimize(container)
+
+            if container is not None:
+                bitmap._containers[key] = container
+
+        return bitmap
+
+    def __contains__(self, value: int) -> bool:
+        container = self._containers.get(value >> 16)
+        low = value & 0xFFFF
+
+        if container is None:
+            return False
+
+        if isinstance(container, int):
+            return bool(container >> low & 1)
+
+        index = bisect_left(container, low)
+        return index < len(container) and container[index] == low
+
+    def __iter__(self) -> Iterator[int]:
+        for key in sorted(self._containers):
+            container = self._containers[key]
+
+            if isinstance(container, int):
+                container = _to_array(container)
+
+            for low in container:
+                yield key << 16 | low
+
+    def __len__(self) -> int:
+        return sum(map(_cardinality, self._containers.values()))
+
+    def __bool__(self) -> bool:
+        return bool(self._containers)
+
+    def __repr__(self) -> str:
+        return f'<Bitmap of {len(self)} values>'
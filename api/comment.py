@@ -18,10 +18,13 @@ def browse_comment(*args, **kwargs) -> 'Pagination[Comment]':
     Args:
         direction (str, optional): Sorting direction, asc for ascending
         and desc for descending
+        cursor (str): Next/prev cursor of a previous page to continue from
+        include_total (bool): Whether to count comments for amount of pages
         limit (int): Amount of comments per page
         page (int): Page
         sort (str): Comment's column to sort by
         terms (str): Words to search
+        profile (str): Loader profile of relationships the page will use
     """
     def comment_select(stmt: Select[T]) -> Select[T]:
         terms: str = kwargs.get('terms')
@@ -36,7 +39,13 @@ def browse_comment(*args, **kwargs) -> 'Pagination[Comment]':
 
         return stmt.where(or_(*conditions))
 
-    return browse_element(Comment, comment_select, *args, **kwargs)
+    return browse_element(
+        Comment,
+        comment_select,
+        *args,
+        count_key = kwargs.get('terms') or '',
+        **kwargs
+    )
 
 def create_comment(content: str, author: User, post: Post) -> Comment:
     """
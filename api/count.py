@@ -0,0 +1,127 @@
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from logging import getLogger
+from threading import Lock
+from time import monotonic
+from typing import Callable, Hashable, Iterable, Optional
+
+from config import COUNT_APPROXIMATE_AFTER, COUNT_CACHE_SIZE, COUNT_CACHE_TTL
+from db import ChangeSet, subscribe
+
+# Models whose changes affect counts of an element other than itself.
+DEPENDENCIES = {
+    'Post': ('Post', 'ScoreAssociation', 'Tag', 'User')
+}
+
+logger = getLogger('app_logger')
+
+@dataclass(frozen = True)
+class Count:
+    """
+    Represents a cached row count.
+    """
+    total: int
+    # Whether more rows exist than total, counting stopped early.
+    approximate: bool
+    expires: float
+
+class CountCache:
+    """
+    Represents a least recently used cache of row counts.
+    Counts are keyed by the generation of every model they depend on,
+    which committed changes bump, so stale counts are never looked up
+    again. Writes made by another process only invalidate after the TTL.
+    """
+    def __init__(self, size: int, ttl: int):
+        self._counts: OrderedDict[Hashable, Count] = OrderedDict()
+        self._generations: defaultdict[str, int] = defaultdict(int)
+        self._lock = Lock()
+        self.size = size
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+
+    def bump(self, changes: ChangeSet) -> None:
+        """
+        Invalidates counts depending on models written by a transaction.
+
+        Args:
+            changes: Changes of a committed transaction
+        """
+        with self._lock:
+            for model in changes.models:
+                self._generations[model] += 1
+
+    def count(
+        self,
+        key: Hashable,
+        models: Iterable[str],
+        count_fn: Callable[[Optional[int]], int],
+        needed: int = 0,
+        exact: bool = False
+    ) -> Count:
+        """
+        Returns cached count or counts rows with count_fn.
+
+        Args:
+            key: Normalized query being counted
+            models: Names of models the count depends on
+            count_fn: Function counting rows, up to a limit if passed
+            needed: Rows that must be counted before stopping early
+            exact: Whether to never stop counting early
+        """
+        limit = None
+
+        if COUNT_APPROXIMATE_AFTER and not exact:
+            limit = max(COUNT_APPROXIMATE_AFTER, needed)
+
+        with self._lock:
+            key = (key, tuple(self._generations[model] for model in models))
+            count = self._counts.get(key)
+
+            if count and count.expires > monotonic() and (
+                not count.approximate or (limit and count.total >= limit)
+            ):
+                self._counts.move_to_end(key)
+                self.hits += 1
+
+                return count
+
+            self.misses += 1
+
+        # Count one row past the limit to know whether more exist.
+        total = count_fn(limit + 1 if limit else None)
+        count = Count(
+            total = min(total, limit) if limit else total,
+            approximate = bool(limit) and total > limit,
+            expires = monotonic() + self.ttl
+        )
+        logger.debug(
+            f'Counted {count.total}{'+' if count.approximate else ''} '\
+            f'rows of {key}'
+        )
+
+        with self._lock:
+            self._counts[key] = count
+            self._counts.move_to_end(key)
+
+            while len(self._counts) > self.size:
+                self._counts.popitem(last = False)
+
+        return count
+
+    def stats(self) -> dict:
+        """
+        Returns hit and miss counts and the amount of cached counts.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._counts),
+                'size': self.size
+            }
+
+count_cache = CountCache(COUNT_CACHE_SIZE, COUNT_CACHE_TTL)
+subscribe(count_cache.bump)
@@ -3,13 +3,14 @@ from logging import getLogger
 from typing import Any, Callable, ParamSpec, TypeVar
 
 from apiflask import abort as api_abort
-from flask import request, abort
+from flask import Response, abort, g, make_response, request, session
 from flask_babel import gettext
 from flask_login import current_user
 from sqlalchemy import or_, select
 
-from config import ALLOW_POSTS, ALLOW_USERS
+from config import ALLOW_POSTS, ALLOW_USERS, PAGE_CACHE_SIZE
 from db import db
+from .page_cache import page_cache
 
 P = ParamSpec('P')
 R = TypeVar('R')
@@ -244,6 +245,53 @@ def owner_or_perm_required(model_class: Any, slug: str):
 
     return decorator
 
+def page_cached(callback: View) -> View:
+    """
+    Serves anonymous users the page from the page cache, keyed by
+    language, host, path and arguments, rendering and caching it on a miss.
+    Whether it was cached is told by the X-Cache header.
+
+    Args:
+        callback: Route rendering the same page for every anonymous user
+    """
+    @wraps(callback)
+    def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        # Pending flashes are rendered into the page for this visitor only.
+        if not PAGE_CACHE_SIZE or current_user.is_authenticated or\
+        request.method != 'GET' or '_flashes' in session:
+            return callback(*args, **kwargs)
+
+        key = (
+            g.get('lang_code'),
+            request.host,
+            request.path,
+            tuple(sorted(request.args.items(multi = True)))
+        )
+        generation = page_cache.generation
+        page = page_cache.get(key, generation)
+
+        if page:
+            response = Response(page.body, mimetype = page.mimetype)
+            response.headers['X-Cache'] = 'HIT'
+            return response
+
+        response = make_response(callback(*args, **kwargs))
+
+        # A page that touched the session (e.g flashed) isn't everyone's.
+        if response.status_code == 200 and not response.direct_passthrough\
+        and not session.modified:
+            page_cache.put(
+                key,
+                generation,
+                response.get_data(),
+                response.mimetype
+            )
+
+        response.headers['X-Cache'] = 'MISS'
+        return response
+
+    return wrapper
+
 def post_protect(callback: View) -> View:
     """
     Restricts view if post management is not possible at the moment.
@@ -0,0 +1,208 @@
+from datetime import datetime, timedelta, timezone
+from enum import StrEnum
+from logging import getLogger
+from threading import Event
+from typing import Callable, Optional
+
+from sqlalchemy import and_, or_, select, update
+
+from config import JOB_BACKOFF, JOB_MAX_ATTEMPTS, JOB_TIMEOUT
+from db import Job, JobStatus, Post, PostStatus, db
+
+logger = getLogger('app_logger')
+
+class JobKind(StrEnum):
+    """
+    Represents what a job does, each kind has one handler.
+    """
+    PROCESS_POST = 'process_post'
+
+Handler = Callable[[Job], None]
+handlers: dict[str, Handler] = {}
+
+def _now() -> datetime:
+    """
+    Returns current time in UTC, how job times are stored.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo = None)
+
+def job_handler(kind: JobKind) -> Callable[[Handler], Handler]:
+    """
+    Registers function to run jobs of a kind. It receives the job and
+    raises to have the job retried, its changes are committed along
+    the job's deletion.
+
+    Args:
+        kind: Kind of jobs the function runs
+    """
+    def decorator(handler: Handler) -> Handler:
+        handlers[kind] = handler
+        return handler
+
+    return decorator
+
+def enqueue_job(kind: JobKind, post: Optional[Post] = None) -> Job:
+    """
+    Creates and returns job that's run once the transaction commits.
+
+    Args:
+        kind: What the job does
+        post: Post the job processes
+    """
+    job = Job()
+    job.kind = kind
+    job.post = post
+    job.run_after = _now()
+
+    db.session.add(job)
+
+    logger.debug(f'Queued {kind} job of post #{post.id if post else None}')
+    return job
+
+def claim_job(worker: str) -> Optional[Job]:
+    """
+    Marks the next due job as running by worker and returns it.
+    Jobs running for longer than JOB_TIMEOUT, whose worker likely
+    died, are claimed again.
+
+    Args:
+        worker: Name of the claiming worker
+    """
+    while True:
+        now = _now()
+        claimable = or_(
+            and_(Job.status == JobStatus.QUEUED, Job.run_after <= now),
+            and_(
+                Job.status == JobStatus.RUNNING,
+                Job.claimed <= now - timedelta(seconds = JOB_TIMEOUT)
+            )
+        )
+
+        job_id = db.session.scalar(
+            select(Job.id)
+            .where(claimable)
+            .order_by(Job.run_after, Job.id)
+            .limit(1)
+        )
+
+        if job_id is None:
+            db.session.commit()
+            return
+
+        # Another worker may claim the same job in between,
+        # whoever updates it first runs it.
+        claimed = db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, claimable)
+            .values(
+                status = JobStatus.RUNNING,
+                attempts = Job.attempts + 1,
+                claimed = now,
+                worker = worker
+            )
+        ).rowcount
+        db.session.commit()
+
+        if claimed:
+            return db.session.get(Job, job_id)
+
+def fail_job(job: Job, error: str) -> None:
+    """
+    Retries job later with exponential backoff, or marks it and its
+    post failed once it ran out of attempts.
+
+    Args:
+        job: Job that failed
+        error: Why the job failed
+    """
+    job.error = error
+    job.worker = None
+
+    if job.attempts >= JOB_MAX_ATTEMPTS:
+        job.status = JobStatus.FAILED
+
+        if job.post:
+            job.post.status = PostStatus.FAILED
+
+        logger.error(
+            f'Job #{job.id} failed after {job.attempts} attempts: {error}'
+        )
+        return
+
+    delay = JOB_BACKOFF * 2 ** (job.attempts - 1)
+
+    job.status = JobStatus.QUEUED
+    job.run_after = _now() + timedelta(seconds = delay)
+
+    logger.warning(
+        f'Job #{job.id} failed attempt {job.attempts}, '\
+        f'retrying in {delay} seconds: {error}'
+    )
+
+def run_job(job: Job) -> bool:
+    """
+    Runs claimed job with its handler, deleting it if it succeeded.
+    Returns whether it succeeded.
+
+    Args:
+        job: Job to run
+    """
+    # Post was deleted while its job was queued.
+    if job.post_id is not None and job.post is None:
+        logger.info(f'Dropped job #{job.id} of deleted post #{job.post_id}')
+        db.session.delete(job)
+        db.session.commit()
+        return True
+
+    try:
+        handler = handlers[job.kind]
+    except KeyError:
+        fail_job(job, f'No handler of {job.kind} jobs')
+        db.session.commit()
+        return False
+
+    try:
+        handler(job)
+        db.session.delete(job)
+        db.session.commit()
+    except Exception as exception:
+        db.session.rollback()
+        fail_job(job, repr(exception))
+        db.session.commit()
+        return False
+
+    logger.info(f'Finished {job.kind} job #{job.id}')
+    return True
+
+def run_worker(
+    worker: str,
+    stop: Event,
+    poll_interval: float = 1,
+    burst: bool = False
+) -> int:
+    """
+    Runs due jobs until stopped. Returns amount of jobs that were run.
+
+    Args:
+        worker: Name of the worker
+        stop: Event that stops the worker after its current job
+        poll_interval: Seconds to wait for jobs when none are due
+        burst: Return once no jobs are due instead of waiting
+    """
+    count = 0
+
+    while not stop.is_set():
+        job = claim_job(worker)
+
+        if job is None:
+            if burst:
+                break
+
+            stop.wait(poll_interval)
+            continue
+
+        run_job(job)
+        count += 1
+
+    logger.info(f'Worker {worker} stopped after {count} jobs')
+    return count
@@ -0,0 +1,110 @@
+from logging import getLogger
+from typing import Optional, TypeVar
+
+from sqlalchemy.orm import joinedload, raiseload, selectinload, undefer
+from sqlalchemy.sql.base import ExecutableOption
+
+from db import Comment, Post, Role, Tag, User
+from .thumbnail import VARIANT_SIZES
+
+T = TypeVar('T')
+
+logger = getLogger('app_logger')
+
+# Authors are serialized with their role's permissions (is_moderator).
+_author = (
+    joinedload(User.role).selectinload(Role.permissions),
+)
+# Every relationship a page or response touches is loaded per page
+# in a constant amount of queries, the ones it doesn't touch raise
+# so a new lazy load is caught instead of silently issuing N queries.
+PROFILES: dict[type, dict[str, tuple[ExecutableOption, ...]]] = {
+    Post: {
+        # Post tiles of browsing pages.
+        'tile': (
+            selectinload(Post.tags),
+            raiseload(Post.author),
+            raiseload(Post.comments),
+            raiseload(Post.scores),
+            raiseload(Post.snapshots),
+            raiseload(Post.thumbnail),
+            # Older databases lack variants until they're made.
+            *((undefer(Post.thumbnail_widths),) if VARIANT_SIZES else ())
+        ),
+        # Post view page.
+        'detail': (
+            selectinload(Post.tags),
+            selectinload(Post.thumbnail),
+            joinedload(Post.author).options(*_author),
+            selectinload(Post.comments).joinedload(Comment.author)
+            .options(*_author),
+            raiseload(Post.scores),
+            raiseload(Post.snapshots)
+        ),
+        # PostOut.
+        'api_list': (
+            selectinload(Post.tags),
+            joinedload(Post.author).options(*_author),
+            selectinload(Post.comments).joinedload(Comment.author)
+            .options(*_author),
+            raiseload(Post.thumbnail),
+            raiseload(Post.scores),
+            raiseload(Post.snapshots)
+        )
+    },
+    Comment: {
+        # CommentOut, whose post is a PostOut without author.
+        'api_list': (
+            joinedload(Comment.author).options(*_author),
+            selectinload(Comment.post).options(
+                selectinload(Post.tags),
+                selectinload(Post.comments).joinedload(Comment.author)
+                .options(*_author),
+                raiseload(Post.thumbnail),
+                raiseload(Post.scores),
+                raiseload(Post.snapshots)
+            ),
+            raiseload(Comment.scores)
+        )
+    },
+    Tag: {
+        # TagOut, whose posts are PostOuts without tags (but nsfw).
+        'api_list': (
+            selectinload(Tag.posts).options(
+                selectinload(Post.tags),
+                joinedload(Post.author).options(*_author),
+                selectinload(Post.comments).joinedload(Comment.author)
+                .options(*_author),
+                raiseload(Post.thumbnail),
+                raiseload(Post.scores),
+                raiseload(Post.snapshots)
+            ),
+            raiseload(Tag.snapshots)
+        )
+    }
+}
+
+def load_profile(
+    element: T,
+    profile: Optional[str]
+) -> tuple[ExecutableOption, ...]:
+    """
+    Returns loader options of element's named profile.
+
+    Args:
+        element: Element being selected
+        profile: Name of the profile (e.g tile), nothing is eagerly
+        loaded without one
+    """
+    if profile is None:
+        return ()
+
+    options = PROFILES.get(element, {}).get(profile)
+
+    if options is None:
+        logger.warning(
+            f'No loader profile {profile} of element {element.__name__}'
+        )
+        return ()
+
+    return options
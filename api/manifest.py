@@ -0,0 +1,136 @@
+from logging import getLogger
+from os import stat_result
+from pathlib import Path
+from typing import Iterable, NamedTuple
+
+from sqlalchemy import delete, insert, select
+
+from config import CONTENT_PATH
+from db import ManifestEntry, Post, db
+
+# Rows written per statement, well within SQLite's variable limit.
+MANIFEST_CHUNK_SIZE = 500
+
+logger = getLogger('app_logger')
+
+class Manifested(NamedTuple):
+    """
+    Represents what the manifest knows of a file.
+    """
+    size: int
+    mtime_ns: int
+    inode: int
+    md5: str
+
+    @classmethod
+    def of(cls, stat: stat_result, md5: str) -> 'Manifested':
+        return cls(stat.st_size, stat.st_mtime_ns, stat.st_ino, md5)
+
+    def matches(self, stat: stat_result) -> bool:
+        """
+        Whether file is unchanged since it was manifested.
+        """
+        return (self.size, self.mtime_ns, self.inode) ==\
+        (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+def manifest_key(path: Path) -> str:
+    """
+    Returns manifest key of file, its path relative to CONTENT_PATH.
+
+    Args:
+        path: File within CONTENT_PATH
+    """
+    return path.relative_to(CONTENT_PATH).as_posix()
+
+def forget_files(keys: Iterable[str]) -> None:
+    """
+    Deletes manifest entries of files.
+
+    Args:
+        keys: Manifest keys of the files
+    """
+    keys = list(keys)
+
+    for index in range(0, len(keys), MANIFEST_CHUNK_SIZE):
+        db.session.execute(
+            delete(ManifestEntry)
+            .where(ManifestEntry.path.in_(
+                keys[index:index + MANIFEST_CHUNK_SIZE]
+            ))
+        )
+
+def load_manifest() -> dict[str, Manifested]:
+    """
+    Returns every manifested file by its manifest key.
+    """
+    return {
+        row.path: Manifested(row.size, row.mtime_ns, row.inode, row.md5)
+        for row in db.session.execute(select(
+            ManifestEntry.path,
+            ManifestEntry.size,
+            ManifestEntry.mtime_ns,
+            ManifestEntry.inode,
+            ManifestEntry.md5
+        ))
+    }
+
+def record_files(files: dict[str, Manifested]) -> None:
+    """
+    Creates or replaces manifest entries of files.
+
+    Args:
+        files: What's known of files by their manifest key
+    """
+    forget_files(files)
+    rows = [
+        { 'path': key, **entry._asdict() } for key, entry in files.items()
+    ]
+
+    for index in range(0, len(rows), MANIFEST_CHUNK_SIZE):
+        db.session.execute(
+            insert(ManifestEntry),
+            rows[index:index + MANIFEST_CHUNK_SIZE]
+        )
+
+def rebuild_manifest(batch_size: int = 500) -> int:
+    """
+    Replaces the manifest with entries of every post's file that exists,
+    trusting their stored MD5. Returns amount of files manifested.
+
+    Args:
+        batch_size: Amount of posts to manifest per transaction
+    """
+    db.session.execute(delete(ManifestEntry))
+    last_id, count = 0, 0
+
+    while True:
+        posts = db.session.execute(
+            select(Post.id, Post.directory, Post.md5, Post.ext)
+            .where(Post.id > last_id)
+            .order_by(Post.id)
+            .limit(batch_size)
+        ).all()
+
+        if not posts:
+            break
+
+        files = dict()
+
+        for post in posts:
+            name = f'{post.md5}.{post.ext}'
+            path = CONTENT_PATH / (post.directory or '') / name
+
+            try:
+                files[manifest_key(path)] = Manifested.of(path.stat(), post.md5)
+            except FileNotFoundError:
+                logger.warning(f'File of post #{post.id} is missing: {path}')
+
+        record_files(files)
+        db.session.commit()
+
+        last_id = posts[-1].id
+        count += len(files)
+
+    db.session.commit()
+    logger.info(f'Rebuilt manifest of {count} files')
+    return count
@@ -0,0 +1,132 @@
+from dataclasses import dataclass, field
+from logging import getLogger
+from pathlib import Path
+from typing import Optional
+
+import ffmpeg
+
+# Pixel formats with an alpha channel, or a palette that may have one.
+ALPHA_PIX_FMTS = ('abgr', 'argb', 'bgra', 'gbrap', 'pal8', 'rgba', 'ya', 'yuva')
+
+logger = getLogger('app_logger')
+
+def _frame_size(stream: dict) -> Optional[tuple[int, int]]:
+    """
+    Returns size of stream's frames as ffmpeg outputs them, autorotated.
+    """
+    width, height = stream.get('width'), stream.get('height')
+
+    if not width or not height:
+        return
+
+    rotation = stream.get('tags', {}).get('rotate', 0)
+
+    for side_data in stream.get('side_data_list', ()):
+        rotation = side_data.get('rotation', rotation)
+
+    try:
+        if int(float(rotation)) % 180:
+            width, height = height, width
+    except ValueError:
+        pass
+
+    return width, height
+
+@dataclass(frozen = True)
+class MediaInfo:
+    """
+    Represents what a single ffprobe call found out about a file,
+    shared by everything that inspects it during an upload.
+    """
+    path: Path
+    # Demuxer name (e.g mov,mp4,m4a,3gp,3g2,mj2), None if not media.
+    format_name: Optional[str] = None
+    streams: tuple[dict, ...] = field(default = (), repr = False)
+    duration: Optional[float] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    # Pixel format and displayed (rotated) size of the stream
+    # thumbnails are made of.
+    pix_fmt: Optional[str] = None
+    frame_size: Optional[tuple[int, int]] = None
+    # Index of the stream of embedded cover art, if any.
+    attached_pic: Optional[int] = None
+
+    @property
+    def dimensions(self) -> Optional[tuple[int, int]]:
+        if self.width is None or self.height is None:
+            return
+
+        return self.width, self.height
+
+    @property
+    def has_alpha(self) -> bool:
+        """
+        Whether thumbnails may need transparency, True if it isn't known.
+        """
+        return self.pix_fmt is None or self.pix_fmt.startswith(ALPHA_PIX_FMTS)
+
+    @property
+    def is_media(self) -> bool:
+        return self.format_name is not None
+
+    @property
+    def is_visual(self) -> bool:
+        return self.dimensions is not None
+
+def probe_media(path: Path) -> MediaInfo:
+    """
+    Inspects file's format and streams with one ffprobe call.
+
+    Args:
+        path: File to inspect
+    """
+    try:
+        probe_data = ffmpeg.probe(str(path))
+    except ffmpeg.Error as exception:
+        # File isn't multimedia.
+        logger.debug(f'Can\'t probe {path}: {exception.stderr}')
+        return MediaInfo(path)
+
+    streams = tuple(probe_data.get('streams', ()))
+    probe_format = probe_data.get('format', {})
+
+    try:
+        format_name = probe_format['format_name']
+    except KeyError:
+        logger.warning(
+            f'Path: {path} is possibly malformed or not a media file.'
+        )
+        return MediaInfo(path, streams = streams)
+
+    # First video stream, which is the cover art of audio files.
+    video = next(
+        (stream for stream in streams if stream.get('codec_type') == 'video'),
+        {}
+    )
+    cover = next(
+        (
+            stream for stream in streams
+            if stream.get('disposition', {}).get('attached_pic') == 1
+        ),
+        None
+    )
+
+    try:
+        duration = float(probe_format['duration'])
+    except (KeyError, ValueError):
+        duration = None
+
+    info = MediaInfo(
+        path = path,
+        format_name = format_name,
+        streams = streams,
+        duration = duration,
+        width = video.get('width'),
+        height = video.get('height'),
+        pix_fmt = (cover or video).get('pix_fmt'),
+        frame_size = _frame_size(cover or video),
+        attached_pic = cover['index'] if cover else None
+    )
+    logger.debug(f'Probed {info}')
+    return info
@@ -0,0 +1,127 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from logging import getLogger
+from threading import Lock
+from time import monotonic
+from typing import Hashable, Optional
+
+from config import PAGE_CACHE_SIZE, PAGE_CACHE_TTL
+from db import ChangeSet, subscribe
+
+# Models rendered into cached pages, writing any of them bumps the generation.
+DEPENDENCIES = frozenset((
+    'Comment',
+    'Post',
+    'RemovedLog',
+    'ScoreAssociation',
+    'Tag',
+    'Thumbnail',
+    'User'
+))
+
+logger = getLogger('app_logger')
+
+@dataclass(frozen = True)
+class Page:
+    """
+    Represents a cached rendered page.
+    """
+    body: bytes
+    mimetype: str
+    expires: float
+
+class PageCache:
+    """
+    Represents a least recently used cache of pages rendered for anonymous
+    users. Pages are keyed by the content generation they were rendered at,
+    which committed changes bump, so a page rendered while content changed
+    is never looked up. Writes made by another process only invalidate
+    after the TTL.
+    """
+    def __init__(self, size: int, ttl: int):
+        self._pages: OrderedDict[Hashable, Page] = OrderedDict()
+        self._lock = Lock()
+        self.generation = 0
+        self.size = size
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+
+    def bump(self, changes: ChangeSet) -> None:
+        """
+        Invalidates every page if a transaction wrote rendered content.
+
+        Args:
+            changes: Changes of a committed transaction
+        """
+        if not changes.models & DEPENDENCIES:
+            return
+
+        with self._lock:
+            self.generation += 1
+            self._pages.clear()
+
+    def get(self, key: Hashable, generation: int) -> Optional[Page]:
+        """
+        Returns cached page, if it's still current.
+
+        Args:
+            key: Normalized request of the page
+            generation: Content generation the page must be rendered at
+        """
+        with self._lock:
+            page = self._pages.get((key, generation))
+
+            if page and page.expires > monotonic():
+                self._pages.move_to_end((key, generation))
+                self.hits += 1
+
+                return page
+
+            self.misses += 1
+
+    def put(
+        self,
+        key: Hashable,
+        generation: int,
+        body: bytes,
+        mimetype: str
+    ) -> None:
+        """
+        Caches rendered page.
+
+        Args:
+            key: Normalized request of the page
+            generation: Content generation the page was rendered at
+            body: Rendered page
+            mimetype: MIME type of the page
+        """
+        page = Page(body, mimetype, monotonic() + self.ttl)
+
+        with self._lock:
+            if generation != self.generation:
+                return
+
+            self._pages[(key, generation)] = page
+            self._pages.move_to_end((key, generation))
+
+            while len(self._pages) > self.size:
+                self._pages.popitem(last = False)
+
+        logger.debug(f'Cached page {key} of generation {generation}')
+
+    def stats(self) -> dict:
+        """
+        Returns hit and miss counts and the amount of cached pages.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._pages),
+                'size': self.size
+            }
+
+page_cache = PageCache(PAGE_CACHE_SIZE, PAGE_CACHE_TTL)
+subscribe(page_cache.bump)
@@ -1,27 +1,45 @@
-from hashlib import md5 as _md5
+from dataclasses import dataclass
+from errno import EXDEV
+from hashlib import file_digest, md5 as _md5
 from logging import getLogger
+from os import replace
 from pathlib import Path
-from re import findall, sub, search
-from shutil import SameFileError, copy
-from typing import Optional, TypeVar
+from re import sub
+from shutil import copyfileobj
+from tempfile import NamedTemporaryFile
+from typing import Optional
 
-import ffmpeg
 from flask_sqlalchemy.pagination import Pagination
 from magic import from_file
-from sqlalchemy import Select, func, or_, select
+from sqlalchemy import func, or_, select
 from werkzeug.datastructures import FileStorage
 
-from config import CONTENT_PATH, NSFW_TAG, TEMP_PATH
-from db import Post, Tag, User, db
-from db.models.tag import TAG_PATTERN
+from config import (
+    BACKGROUND_JOBS,
+    CONTENT_PATH,
+    DEFAULT_SORT,
+    NSFW_TAG,
+    SEARCH_INDEX,
+    TEMP_PATH
+)
+from db import Job, Post, PostStatus, User, db, fts_available
 from .base import browse_element
+from .count import count_cache
+from .job import JobKind, enqueue_job, job_handler
+from .loaders import load_profile
+from .media import MediaInfo, probe_media
 from .removed import create_log
+from .search import RELEVANCE, compile_query, parse_terms, resolve_tags
 from .tag import create_tag, get_tag
-from .thumbnail import create_thumbnail
+from .tag_index import tag_index
+from .thumbnail import (
+    EncodedThumbnail,
+    create_thumbnail,
+    delete_thumbnail,
+    delete_thumbnail_images
+)
 
 NONALPHA = r'[^a-zA-Z0-9.]'
-ATTR_PATTERN = r'\b\w+:[<>]?\S*'  # attr:value, attr: , attr:<value, attr:>value
-CAPTION_PATTERN = r'"([^"]*)"'  # "hello world"
 
 MIME_MAP = {
     'gif': 'image/gif',
@@ -36,16 +54,54 @@ MIME_MAP = {
     'webp': 'image/webp',
     'webp_pipe': 'image/webp'
 }
+# Categories of files libmagic recognizes that may be posted
+# before they're probed.
+MEDIA_CATEGORIES = ('audio', 'image', 'video')
 
 # What default term(s) shall be used when none are provided?
 DEFAULT_TERMS = f'-{NSFW_TAG}'
-
-T = TypeVar('T')
+# Bytes read, hashed and written at a time while ingesting files.
+INGEST_CHUNK_SIZE = 1024 * 1024
 
 logger = getLogger('app_logger')
 
+@dataclass(frozen = True)
+class Upload:
+    """
+    Represents a file to post, whose MD5 and size were taken
+    while it was written, so it's never read again for them.
+    """
+    path: Path
+    md5: str
+    size: int
+
+def _place(source: Path, destination: Path) -> None:
+    """
+    Atomically moves file to destination, so a half written file
+    is never served. Across filesystems (TEMP_PATH on another one
+    than CONTENT_PATH) it's copied beside destination first.
+    """
+    destination.parent.mkdir(parents = True, exist_ok = True)
+
+    try:
+        replace(source, destination)
+        return
+    except OSError as exception:
+        if exception.errno != EXDEV:
+            raise
+
+    temp_path = destination.with_name(f'.{destination.name}.tmp')
+
+    with source.open('rb') as src, temp_path.open('wb') as dst:
+        copyfileobj(src, dst, INGEST_CHUNK_SIZE)
+
+    replace(temp_path, destination)
+    source.unlink(missing_ok = True)
+
 def browse_post(
     *args,
+    sort: Optional[str] = DEFAULT_SORT,
+    terms: Optional[str] = DEFAULT_TERMS,
     **kwargs
 ) -> 'Pagination[Post]':
     """
@@ -54,164 +110,120 @@ def browse_post(
     Args:
         direction (str, optional): Sorting direction, asc for ascending
         and desc for descending
+        cursor (str): Next/prev cursor of a previous page to continue from
+        include_total (bool): Whether to count posts for amount of pages
         limit (int): Amount of posts per page
         page (int): Page
-        sort (str): Post's column to sort by
+        sort (str): Post's column to sort by, or relevance
+        of caption matches
         terms (str): Tags, caption and attribute selection
+        profile (str): Loader profile of relationships the page will use
     """
-    def post_select(stmt: Select[T]) -> Select[T]:
-        terms = kwargs.get('terms', DEFAULT_TERMS)
-        caption = None
-
-        try:
-            # Capture caption text from terms.
-            caption = search(CAPTION_PATTERN, terms)[1]
-            terms = sub(CAPTION_PATTERN, '', terms)
-
-            logger.debug(f'Found caption: {repr(caption)}')
-        except (TypeError, IndexError):
-            logger.debug(f'Failed to obtain caption from: {repr(terms)}')
-
-        # Capture attribute selectors.
-        attrs: list[str] = findall(ATTR_PATTERN, terms)
-        terms = sub(ATTR_PATTERN, '', terms)
-        logger.debug(f'Attributes: {attrs}')
-
-        # Get tags.
-        tags: list[str] = findall(TAG_PATTERN, terms)
-
-        # Look for words in posts in unordered sequence.
-        try:
-            for word in caption.split():
-                stmt = stmt.where(
-                    Post.caption.like(f'%{word}%')
-                )
-                logger.debug(f'Searching for word {repr(word)} in caption.')
-        except AttributeError:
-            # No caption, error is already messaged.
-            pass
-
-        # Apply attribute selectors.
-        for attr in attrs:
-            sign = '<' if '<' in attr else ('>' if '>' in attr else '')
-
-            name, value = attr.split(f':{sign}', 1)
-
-            # Handle specific attributes.
-            if name == 'author':
-                stmt = stmt.join(Post.author).where(User.name == value)
-
-                continue
-
-            try:
-                col = getattr(Post, name)
-            # Skip attribute selector that doesn't exist.
-            except AttributeError as exception:
-                logger.debug(f'Attribute: {name} doesn\'t exist')
-                continue
-
-            try:
-                value = int(value)
-            except ValueError as exception:
-                pass
+    query = parse_terms(terms)
+    tag_ids = resolve_tags(query)
+    ids = None
+
+    # Tag searches sorted by ID are answered from memory.
+    if SEARCH_INDEX and Post.get_sort_key(sort) == 'id':
+        ids = tag_index.search(query, tag_ids)
+
+    fts = bool(query.caption) and fts_available()
+    ranked = fts and sort == RELEVANCE
+
+    # Relevance has no position to seek from, so pages are numbered.
+    if ranked:
+        kwargs.pop('cursor', None)
+
+    pagination = browse_element(
+        Post,
+        None,
+        *args,
+        sort = sort,
+        stmt = compile_query(query, tag_ids, fts, ranked),
+        terms = str(query),
+        ids = ids,
+        count_key = str(query),
+        **kwargs
+    )
 
-            if (
-                value == 0 and name != 'score'
-            ) or (isinstance(value, str) and not len(value)):
-                # Look for posts that don't have the column set.
-                where = or_(col == None, col == '')
-            else:
-                if sign == '<':
-                    where = col < value
-                elif sign == '>':
-                    where = col > value
-                else:
-                    where = col == value
-
-            stmt = stmt.where(where)
-            logger.debug(
-                f'Searching attribute: {name}'\
-                f'{'=' if not sign else sign}{value}'
-            )
-
-        # Apply tag selection.
-
-        # Apply non-NSFW tag if it's not explicitly specified by user.
-        if f'-{NSFW_TAG}' not in tags and NSFW_TAG not in tags:
-            tags.append(f'-{NSFW_TAG}')
-            logger.debug('Appending -NSFW tag by default.')
-
-        # Handle showing/hiding removed posts.
-        removed_value = Post.removed == False
-
-        if 'removed' in tags:
-            removed_value = Post.removed == True
-            tags.remove('removed')
-            logger.debug('Showing removed (deleted) posts.')
-
-        stmt = stmt.where(removed_value)
-
-        # Handle where a user wants to search for posts with no tags.
-        if 'no_tags' in tags:
-            stmt = stmt.where(~Post.tags.any())
-        else:
-            for tag in tags:
-                if tag[0] != '-':
-                    where = Post.tags.any(Tag.name == tag)
-                else:
-                    where = ~Post.tags.any(Tag.name == tag[1:])
-
-                stmt = stmt.where(where)
-                logger.debug(f'Searching tag: {tag} in posts.')
-
-        return stmt
-
-    return browse_element(Post, post_select, *args, **kwargs)
+    if ranked:
+        pagination.next_cursor = pagination.prev_cursor = None
+
+    return pagination
 
 def count_all() -> int:
     """
     Returns count of all Posts who aren't marked removed.
     """
-    count = db.session.scalar(
-        select(func.count(Post.id))
-        .where(Post.removed == False)
-    )
+    count = count_cache.count(
+        ('Post', 'count_all'),
+        ('Post',),
+        lambda limit: db.session.scalar(
+            select(func.count(Post.id))
+            .where(Post.removed == False)
+        ),
+        exact = True
+    ).total
 
     logger.debug(f'Post count: {count}')
     return count
 
 def create_post(
     author: User,
-    path: Path,
+    path: Path | Upload,
     directory: Optional[str] = None,
     op: Optional[str] = None,
     src: Optional[str] = None,
     caption: Optional[str] = None,
-    tags: Optional[str] = None
+    tags: Optional[str] = None,
+    info: Optional[MediaInfo] = None,
+    defer: bool = BACKGROUND_JOBS,
+    thumbnail: Optional[EncodedThumbnail] = None
 ) -> Post:
     """
     Creates and returns post.
 
     Args:
         author: Post's owner
-        path: Temporary path to file
+        path: Saved upload, or path to file to hash
         directory: What directory should the post be stored at
         op: Original author of the post
         src: Source
         caption: Post's caption or title
         tags: Space separated tags
+        info: What probing the file found out, probed if not passed
+        defer: Leave probing and thumbnailing to a job, so the post
+        is created as soon as its file is stored
+        thumbnail: Thumbnail made of the file already, made if not passed
 
     Returns:
         Post ready to commit
     """
     post = Post()
 
-    # Gather metadata about the post.
-    dimensions = get_dimensions(path)
+    if not isinstance(path, Upload):
+        path = Upload(path, get_hash(path), get_size(path))
+
+    upload, path = path, path.path
+
     ext = get_extension(path)
-    md5 = get_hash(path)
-    mime = get_mime(path)
-    size = get_size(path)
+    md5 = upload.md5
+    size = upload.size
+
+    if defer:
+        # libmagic only reads the start of the file, which is enough
+        # to refuse what isn't media until the job probes it.
+        info = None
+        dimensions = None
+        mime = get_generic_mime(path)
+
+        if mime.split('/')[0] not in MEDIA_CATEGORIES:
+            mime = None
+    else:
+        # Gather metadata about the post, probing the file once.
+        info = info or probe_media(path)
+        dimensions = info.dimensions
+        mime = get_mime(path, info)
 
     if not mime:
         return
@@ -240,6 +252,7 @@ def create_post(
 
     post.mime = mime
     post.size = size
+    post.status = PostStatus.PROCESSING if defer else PostStatus.READY
 
     try:
         post.height = dimensions[1]
@@ -247,25 +260,27 @@ def create_post(
     except TypeError:
         pass
 
-    post.path.parent.mkdir(parents = True, exist_ok = True)
-
-    try:
-        copy(path, post.path)
-        path.unlink(missing_ok = True)
-    except SameFileError as exception:
-        # This is likely caused by 'add' Flask command.
-        logger.debug(f'Post {path} already is in {CONTENT_PATH}.')
-
     for tag in tag_objs:
         db.session.add(tag)
 
     db.session.add(post)
+    # A post of the same MD5 fails here, before its file is placed
+    # where nothing would clean it up.
     db.session.flush()
 
-    thumbnail = create_thumbnail(post)
+    if path.resolve() == post.path.resolve():
+        # This is likely caused by 'add' Flask command.
+        logger.debug(f'Post {path} already is in {CONTENT_PATH}.')
+    else:
+        _place(path, post.path)
+
+    if defer:
+        enqueue_job(JobKind.PROCESS_POST, post)
+    else:
+        thumbnail = create_thumbnail(post, info, thumbnail)
 
-    if not thumbnail:
-        logger.warning(f'No thumbnail was made for post #{post.id}')
+        if not thumbnail:
+            logger.warning(f'No thumbnail was made for post #{post.id}')
 
     logger.info(f'Created post #{post.id}')
     return post
@@ -290,33 +305,27 @@ def perma_delete_post(post: Post | int) -> None:
     if isinstance(post, int):
         post = get_post(post)
 
+    # Thumbnail rows are deleted along the post, their images aren't.
+    if post.thumbnail:
+        delete_thumbnail_images(post.thumbnail)
+
     db.session.delete(post)
     post.path.unlink(missing_ok = True)
 
     logger.info(f'Permanently deleted post #{post.id}')
 
-def get_dimensions(path: Path) -> tuple[int, int]:
+def get_dimensions(
+    path: Path,
+    info: Optional[MediaInfo] = None
+) -> Optional[tuple[int, int]]:
     """
     Obtains X and Y coordinates of a media path.
-    """
-    try:
-        probe_data = ffmpeg.probe(
-            str(path),
-            select_streams = 'v:0',
-            show_entries = 'stream=width, height'
-        )
-    except ffmpeg.Error:
-        # File isn't multimedia.
-        return
 
-    try:
-        stream = probe_data['streams'][0]
-    except (IndexError, KeyError):
-        return
-
-    x, y = stream['width'], stream['height']
-
-    return (x, y)
+    Args:
+        path: Media file
+        info: What probing the file found out, probed if not passed
+    """
+    return (info or probe_media(path)).dimensions
 
 def get_extension(path: Path) -> str:
     """
@@ -335,7 +344,7 @@ def get_hash(path: Path) -> str:
         str: MD5
     """
     with path.open('rb') as stream:
-        return _md5(stream.read()).hexdigest()
+        return file_digest(stream, _md5).hexdigest()
 
 def get_generic_mime(path: Path) -> str:
     """
@@ -346,18 +355,17 @@ def get_generic_mime(path: Path) -> str:
     """
     return from_file(str(path), mime = True)
 
-def get_mime(path: Path) -> Optional[str]:
-    try:
-        probe_output = ffmpeg.probe(str(path))
-    except ffmpeg.Error as exception:
-        return
+def get_mime(path: Path, info: Optional[MediaInfo] = None) -> Optional[str]:
+    """
+    Obtains MIME type of a media path, None if it isn't media.
 
-    try:
-        format_name = probe_output['format']['format_name']
-    except KeyError as exception:
-        logger.warning(
-            f'Path: {path} is possibly malformed or not a media file.'
-        )
+    Args:
+        path: Media file
+        info: What probing the file found out, probed if not passed
+    """
+    format_name = (info or probe_media(path)).format_name
+
+    if not format_name:
         return
 
     # There can be multiple MIMEs involved with 'image2' demuxer.
@@ -377,14 +385,19 @@ def get_mime(path: Path) -> Optional[str]:
                 # image2 is tied to image/png in the dictionary.
                 pass
 
-    return MIME_MAP.get(format_name, get_generic_mime(path))
+    # libmagic is only asked about formats missing from the map.
+    return MIME_MAP.get(format_name) or get_generic_mime(path)
 
-def get_post(post_id: int | str) -> Optional[Post]:
+def get_post(
+    post_id: int | str,
+    profile: Optional[str] = None
+) -> Optional[Post]:
     """
     Queries for a post by its ID or MD5.
 
     Args:
         post_id: The ID/MD5 of a post you wish to see
+        profile: Loader profile of relationships that will be used
 
     Returns:
         Post
@@ -393,7 +406,7 @@ def get_post(post_id: int | str) -> Optional[Post]:
         select(Post).where(or_(
             Post.id.is_(post_id),
             Post.md5.is_(post_id)
-        ))
+        )).options(*load_profile(Post, profile))
     )
 
 def get_size(path: Path) -> int:
@@ -403,10 +416,7 @@ def get_size(path: Path) -> int:
     Returns:
         int
     """
-    with path.open('rb') as stream:
-        stream.seek(0, 2)
-
-        return stream.tell()
+    return path.stat().st_size
 
 def move_post(post: Post, directory: str) -> None:
     """
@@ -418,13 +428,10 @@ def move_post(post: Post, directory: str) -> None:
     """
     original_path = post.path
 
-    new_dir = CONTENT_PATH / Path(directory)
-    new_dir.mkdir(exist_ok = True, parents = True)
-    new_path = new_dir / post.name
+    new_path = CONTENT_PATH / Path(directory) / post.name
 
     if new_path != original_path:
-        copy(original_path, new_path)
-        original_path.unlink(missing_ok = True)
+        _place(original_path, new_path)
 
     post.directory = directory
     logger.info(f'Moved post #{post.id} from {original_path} to {new_path}')
@@ -441,6 +448,74 @@ def process_filename(filename: str) -> str:
     logger.debug(f'Processed filename "{filename}" to {name}')
     return name
 
+def process_post(
+    post: Post,
+    info: Optional[MediaInfo] = None,
+    thumbnail: Optional[EncodedThumbnail] = None
+) -> Post:
+    """
+    Probes post's file for its MIME type, dimensions and size, creates
+    its thumbnail anew and marks it ready. Raises ValueError if it
+    isn't media.
+
+    Args:
+        post: Post to process
+        info: What probing the post's file found out, probed if not passed
+        thumbnail: Thumbnail made of the post's file already, made if not passed
+    """
+    info = info or probe_media(post.path)
+    mime = get_mime(post.path, info)
+
+    if not mime:
+        raise ValueError(f'{post.path} isn\'t a media file')
+
+    if post.thumbnail:
+        delete_thumbnail(post.thumbnail)
+        db.session.flush()
+
+    # The post is changed after its thumbnail is made, so flushing it
+    # doesn't hold SQLite's write lock, blocking other workers, meanwhile.
+    if not create_thumbnail(post, info, thumbnail):
+        logger.warning(f'No thumbnail was made for post #{post.id}')
+
+    post.mime = mime
+    post.size = get_size(post.path)
+
+    try:
+        post.height = info.dimensions[1]
+        post.width = info.dimensions[0]
+    except TypeError:
+        pass
+
+    post.status = PostStatus.READY
+
+    logger.info(f'Processed post #{post.id}')
+    return post
+
+@job_handler(JobKind.PROCESS_POST)
+def _process_post_job(job: Job) -> None:
+    process_post(job.post)
+
+def relocate_post(post: Post, path: Path) -> None:
+    """
+    Points post at its file, which was moved to path within
+    CONTENT_PATH without the booru, e.g by hand.
+
+    Args:
+        post: Post whose file was moved
+        path: Where the file is now
+    """
+    original_path = post.path
+    post.directory = str(path.relative_to(CONTENT_PATH).parent)
+
+    # Files are named by their MD5 within their directory.
+    if path != post.path:
+        _place(path, post.path)
+
+    logger.info(
+        f'Relocated post #{post.id} from {original_path} to {post.path}'
+    )
+
 def replace_post(post: Post, file: FileStorage) -> tuple[Post, Path, Path]:
     """
     Replaces given Post with new file.
@@ -455,26 +530,34 @@ def replace_post(post: Post, file: FileStorage) -> tuple[Post, Path, Path]:
         - Uploaded file's Path object
         - Previous post's Path object
     """
-    path = save_file(file)
-    md5 = get_hash(path)
+    upload = save_file(file)
+    path, md5 = upload.path, upload.md5
 
     # Ignore the same file being uploaded.
     if md5 == post.md5:
         logger.warning(f'Can\'t replace post #{post.id} with same MD5.')
         return post, path, None
 
+    # The file would take the place of the other post's file.
+    if get_post(md5):
+        logger.warning(
+            f'Can\'t replace post #{post.id} with MD5 of another post.'
+        )
+        return post, path, None
+
     prev_md5 = post.md5
     prev_path = post.path
 
-    dimensions = get_dimensions(path)
+    info = probe_media(path)
+    dimensions = info.dimensions
     ext = get_extension(path)
-    mime = get_mime(path)
+    mime = get_mime(path, info)
 
     if not mime:
         logger.warning(f'Can\'t replace post #{post.id} with invalid MIME.')
         return post, path, None
 
-    size = get_size(path)
+    size = upload.size
 
     try:
         post.height = dimensions[1]
@@ -488,13 +571,13 @@ def replace_post(post: Post, file: FileStorage) -> tuple[Post, Path, Path]:
     post.size = size
 
     if post.thumbnail:
-        db.session.delete(post.thumbnail)
-        db.session.flush()
+        delete_thumbnail(post.thumbnail)
 
-    post.path.parent.mkdir(parents = True, exist_ok = True)
-    copy(path, post.path)
+    # Constraints fail here, before the file is placed.
+    db.session.flush()
+    _place(path, post.path)
 
-    thumb = create_thumbnail(post)
+    thumb = create_thumbnail(post, info)
 
     if thumb:
         thumb.post_id = post.id
@@ -503,19 +586,34 @@ def replace_post(post: Post, file: FileStorage) -> tuple[Post, Path, Path]:
     logger.info(f'Replaced post #{post.id} from {prev_md5} to {post.md5}.')
     return post, path, prev_path
 
-def save_file(file: FileStorage) -> Path:
+def save_file(file: FileStorage) -> Upload:
     """
-    Saves given file with filename processing before upload.
+    Saves given file with filename processing before upload, streaming it
+    in chunks while hashing, so it's neither held in memory nor read again.
 
     Args:
         file: File to save
 
     Returns:
-        Path: Saved file path
+        Upload: Saved file with its MD5 and size
     """
     filename = process_filename(file.filename)
-
-    temp_path = TEMP_PATH / filename
-    file.save(temp_path)
-
-    return temp_path
+    md5 = _md5()
+    size = 0
+
+    TEMP_PATH.mkdir(parents = True, exist_ok = True)
+
+    # Uploads of files with the same name mustn't overwrite each other.
+    with NamedTemporaryFile(
+        dir = TEMP_PATH,
+        prefix = f'{Path(filename).stem}-',
+        suffix = Path(filename).suffix,
+        delete = False
+    ) as stream:
+        while chunk := file.stream.read(INGEST_CHUNK_SIZE):
+            md5.update(chunk)
+            stream.write(chunk)
+            size += len(chunk)
+
+    logger.debug(f'Saved {filename} of {size} bytes to {stream.name}')
+    return Upload(Path(stream.name), md5.hexdigest(), size)
@@ -0,0 +1,179 @@
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from hashlib import md5
+from json import dumps, loads
+from os import replace
+from pathlib import Path
+from threading import Lock
+from time import monotonic, sleep
+from typing import Iterator, Optional
+
+from sqlalchemy import Row, Select, or_, select
+
+from config import TEMP_PATH
+from db import Post, db, fts_available
+from .search import compile_query, parse_terms, resolve_tags
+
+@dataclass(frozen = True)
+class ReprocessFilter:
+    """
+    Represents which posts are reprocessed, every criterion narrows it.
+    """
+    # Searching terms, the way posts are browsed.
+    terms: Optional[str] = None
+    # MIME categories, e.g image.
+    categories: tuple[str, ...] = ()
+    missing_thumbnail: bool = False
+    # Creation range, since inclusive and until exclusive.
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+
+    @property
+    def key(self) -> str:
+        """
+        Returns what tells runs of this filter apart from others.
+        """
+        text = dumps(asdict(self), default = str, sort_keys = True)
+        return md5(text.encode()).hexdigest()
+
+    def select(self, after: int, limit: Optional[int]) -> Select:
+        """
+        Returns statement selecting ID, file and size of the next posts.
+
+        Args:
+            after: ID of the last post that was selected
+            limit: Amount of posts to select, every one if None
+        """
+        stmt = select(Post)
+
+        if self.terms:
+            query = parse_terms(self.terms)
+            stmt = compile_query(query, resolve_tags(query), fts_available())
+
+        if self.categories:
+            stmt = stmt.where(or_(*(
+                Post.mime.like(f'{category}/%')
+                for category in self.categories
+            )))
+
+        if self.missing_thumbnail:
+            stmt = stmt.where(~Post.has_thumbnail)
+
+        if self.since:
+            stmt = stmt.where(Post.created >= self.since)
+
+        if self.until:
+            stmt = stmt.where(Post.created < self.until)
+
+        return (
+            stmt.with_only_columns(
+                Post.id,
+                Post.directory,
+                Post.md5,
+                Post.ext,
+                Post.size
+            )
+            .where(Post.id > after)
+            .order_by(Post.id)
+            .limit(limit)
+        )
+
+    def posts(self, after: int = 0, page_size: int = 500) -> Iterator[Row]:
+        """
+        Yields ID, file and size of matching posts by their ID,
+        a page at a time so memory doesn't grow with them.
+
+        Args:
+            after: ID of the last post that was reprocessed
+            page_size: Amount of posts to select at once
+        """
+        while True:
+            rows = db.session.execute(self.select(after, page_size)).all()
+
+            yield from rows
+
+            if len(rows) < page_size:
+                break
+
+            after = rows[-1].id
+
+@dataclass
+class ReprocessCheckpoint:
+    """
+    Represents how far a reprocessing run got, so an interrupted run
+    resumes after the last post it committed.
+    """
+    path: Path
+    last_id: int = 0
+    done: int = 0
+    failed: int = 0
+
+    @classmethod
+    def of(cls, selection: ReprocessFilter) -> 'ReprocessCheckpoint':
+        """
+        Returns checkpoint of runs with selection, empty if none was saved.
+
+        Args:
+            selection: Which posts the run reprocesses
+        """
+        path = TEMP_PATH / f'reprocess-{selection.key}.json'
+
+        try:
+            return cls(path, **loads(path.read_text()))
+        except FileNotFoundError:
+            return cls(path)
+
+    def save(self) -> None:
+        """
+        Atomically writes checkpoint, so an interruption never leaves
+        it half written.
+        """
+        self.path.parent.mkdir(parents = True, exist_ok = True)
+        temp_path = self.path.with_name(f'.{self.path.name}.tmp')
+
+        temp_path.write_text(dumps({
+            'last_id': self.last_id,
+            'done': self.done,
+            'failed': self.failed
+        }))
+        replace(temp_path, self.path)
+
+    def clear(self) -> None:
+        """
+        Deletes checkpoint once its run finished.
+        """
+        self.path.unlink(missing_ok = True)
+
+@dataclass
+class RateLimiter:
+    """
+    Limits how much of something, e.g bytes read, is spent per second.
+    Unspent allowance accumulates up to a second's worth.
+    """
+    rate: float
+    _allowance: float = field(init = False, default = 0)
+    _updated: float = field(init = False, default_factory = monotonic)
+    _lock: Lock = field(init = False, default_factory = Lock)
+
+    def __post_init__(self):
+        self._allowance = self.rate
+
+    def acquire(self, amount: float = 1) -> None:
+        """
+        Waits until amount can be spent and spends it. Amounts above
+        a second's worth wait for the allowance to recover from debt.
+
+        Args:
+            amount: How much is about to be spent
+        """
+        with self._lock:
+            now = monotonic()
+            self._allowance = min(
+                self.rate,
+                self._allowance + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._allowance -= amount
+
+            if self._allowance < 0:
+                sleep(-self._allowance / self.rate)
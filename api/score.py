@@ -1,12 +1,40 @@
 from logging import getLogger
 from typing import Optional
 
-from sqlalchemy import and_, select
+from sqlalchemy import and_, select, update
 
-from db import ScoreAssociation, db
+from db import Comment, Post, ScoreAssociation, db
+
+# Elements with a stored score, by target type.
+SCORE_TARGETS = {
+    'comment': Comment,
+    'post': Post
+}
 
 logger = getLogger('app_logger')
 
+def _add_score(target_id: int, score_type: str, delta: int) -> None:
+    """
+    Atomically adds delta to stored score of target.
+
+    Args:
+        target_id: Target's ID
+        score_type: Target type (e.g post)
+        delta: Points to add, negative to subtract
+    """
+    target = SCORE_TARGETS.get(score_type)
+
+    if target is None:
+        logger.warning(f'Can\'t store score of {score_type}={target_id}')
+        return
+
+    if delta:
+        db.session.execute(
+            update(target)
+            .where(target.id == target_id)
+            .values(score = target.score + delta)
+        )
+
 def _set_vote(
     target_id: int,
     user_id: int,
@@ -37,7 +65,9 @@ def _set_vote(
         )
         db.session.add(score)
 
+    delta = value - (score.value or 0)
     score.value = value
+    _add_score(target_id, score_type, delta)
 
     return score
 
@@ -70,6 +100,7 @@ def delete_score(score: ScoreAssociation) -> None:
         f'{score.user_id} removes vote for '\
         f'{score.target_type}={score.target_id}'
     )
+    _add_score(score.target_id, score.target_type, -score.value)
     db.session.delete(score)
 
 def get_vote(
@@ -0,0 +1,304 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from logging import getLogger
+from re import compile
+from typing import Optional
+
+from sqlalchemy import Select, false, func, literal_column, or_, select
+
+from config import NSFW_TAG, SEARCH_CACHE_SIZE
+from db import Post, Tag, TagAssociation, User, db, post_fts
+from db.fts import FTS_TABLE
+from db.models.tag import TAG_PATTERN
+
+ATTR_PATTERN = compile(r'\b\w+:[<>]?\S*')  # attr:value, attr:<value
+CAPTION_PATTERN = compile(r'"([^"]*)"')  # "hello world"
+TAG_REGEX = compile(TAG_PATTERN)
+WORD_REGEX = compile(r'\w')
+
+# Joins caption words into a phrase, e.g "hello+world"
+PHRASE_SEPARATOR = '+'
+# Sorts caption searches by how well posts match.
+RELEVANCE = 'relevance'
+
+# Special tags that toggle a filter instead of matching a tag name.
+NO_TAGS = 'no_tags'
+REMOVED = 'removed'
+
+logger = getLogger('app_logger')
+
+@dataclass(frozen = True, order = True)
+class Attribute:
+    """
+    Represents an attribute selector, e.g width:>1919
+    """
+    name: str
+    sign: str
+    value: str
+
+    def __str__(self) -> str:
+        return f'{self.name}:{self.sign}{self.value}'
+
+@dataclass(frozen = True)
+class SearchQuery:
+    """
+    Represents parsed and normalized post searching terms.
+    Two searches that select the same posts compare equal,
+    which makes this object usable as a cache key.
+    """
+    caption: tuple[str, ...] = ()
+    attrs: tuple[Attribute, ...] = ()
+    include: tuple[str, ...] = ()
+    exclude: tuple[str, ...] = ()
+    no_tags: bool = False
+    removed: bool = False
+
+    def __str__(self) -> str:
+        """
+        Returns the canonical search string.
+        """
+        parts = []
+
+        if self.caption:
+            parts.append(f'"{' '.join(self.caption)}"')
+
+        parts.extend(str(attr) for attr in self.attrs)
+        parts.extend(self.include)
+        parts.extend(f'-{tag}' for tag in self.exclude)
+
+        if self.no_tags:
+            parts.append(NO_TAGS)
+
+        if self.removed:
+            parts.append(REMOVED)
+
+        return ' '.join(parts)
+
+@dataclass(frozen = True)
+class TagIds:
+    """
+    Represents a search query's tag names resolved to tag IDs.
+    """
+    # None when an included tag doesn't exist and nothing can match.
+    include: Optional[tuple[int, ...]] = ()
+    exclude: tuple[int, ...] = ()
+
+@lru_cache(maxsize = SEARCH_CACHE_SIZE)
+def parse_terms(terms: Optional[str]) -> SearchQuery:
+    """
+    Parses searching terms into a normalized search query.
+
+    Args:
+        terms: Tags, caption and attribute selection
+    """
+    raw = terms = terms or ''
+    caption = ()
+
+    # Capture caption text from terms.
+    match = CAPTION_PATTERN.search(terms)
+
+    if match:
+        caption = tuple(sorted(set(match[1].split())))
+        terms = CAPTION_PATTERN.sub('', terms)
+
+    # Capture attribute selectors.
+    attrs = set()
+
+    for attr in ATTR_PATTERN.findall(terms):
+        sign = '<' if '<' in attr else ('>' if '>' in attr else '')
+        name, value = attr.split(f':{sign}', 1)
+
+        attrs.add(Attribute(name, sign, value))
+
+    terms = ATTR_PATTERN.sub('', terms)
+
+    # Get tags.
+    tags = { tag.lower() for tag in TAG_REGEX.findall(terms) }
+
+    no_tags = NO_TAGS in tags
+    removed = REMOVED in tags
+    tags -= { NO_TAGS, REMOVED }
+
+    include = { tag for tag in tags if not tag.startswith('-') }
+    exclude = { tag[1:] for tag in tags if tag.startswith('-') and tag[1:] }
+
+    # Apply non-NSFW tag if it's not explicitly specified by user.
+    if NSFW_TAG and NSFW_TAG not in include and NSFW_TAG not in exclude:
+        exclude.add(NSFW_TAG)
+
+    # Tags don't matter when searching for posts without any.
+    if no_tags:
+        include, exclude = set(), set()
+
+    query = SearchQuery(
+        caption = caption,
+        attrs = tuple(sorted(attrs)),
+        include = tuple(sorted(include)),
+        exclude = tuple(sorted(exclude)),
+        no_tags = no_tags,
+        removed = removed
+    )
+
+    logger.debug(f'Parsed terms {repr(raw)} as {repr(str(query))}')
+    return query
+
+def match_expression(word: str) -> Optional[str]:
+    """
+    Returns full-text match expression of a caption word, matching it
+    as a prefix or a phrase. None if the word has nothing to match.
+
+    Args:
+        word: Caption word, or phrase joined by PHRASE_SEPARATOR
+    """
+    parts = [ part for part in word.split(PHRASE_SEPARATOR) if part ]
+
+    if not parts or not all(WORD_REGEX.search(part) for part in parts):
+        return None
+
+    if len(parts) > 1:
+        return f'"{' '.join(parts)}"'
+
+    return f'"{parts[0]}"*'
+
+@lru_cache(maxsize = SEARCH_CACHE_SIZE)
+def compile_query(
+    query: SearchQuery,
+    tag_ids: TagIds = TagIds(),
+    fts: bool = False,
+    ranked: bool = False
+) -> Select[tuple[Post]]:
+    """
+    Compiles a search query into an unsorted post selecting statement.
+    Compiled statements are immutable and are therefore shared
+    between every search that normalizes to the same query.
+
+    Args:
+        query: Parsed searching terms
+        tag_ids: Query's tag names resolved by resolve_tags
+        fts: Whether to match caption with the full-text index
+        ranked: Whether to sort by caption relevance, requires fts
+    """
+    stmt = select(Post)
+    match = []
+
+    # Look for words in posts in unordered sequence.
+    for word in query.caption:
+        expression = match_expression(word) if fts else None
+
+        if expression:
+            match.append(expression)
+        else:
+            phrase = word.replace(PHRASE_SEPARATOR, ' ')
+            stmt = stmt.where(Post.caption.like(f'%{phrase}%'))
+
+        logger.debug(f'Searching for word {repr(word)} in caption.')
+
+    if match:
+        stmt = stmt.join(post_fts, post_fts.c.rowid == Post.id).where(
+            literal_column(FTS_TABLE).op('MATCH')(' '.join(match))
+        )
+
+        if ranked:
+            stmt = stmt.order_by(post_fts.c.rank)
+
+    # Apply attribute selectors.
+    for attr in query.attrs:
+        name, sign, value = attr.name, attr.sign, attr.value
+
+        # Handle specific attributes.
+        if name == 'author':
+            stmt = stmt.join(Post.author).where(User.name == value)
+
+            continue
+
+        try:
+            col = getattr(Post, name)
+        # Skip attribute selector that doesn't exist.
+        except AttributeError as exception:
+            logger.debug(f'Attribute: {name} doesn\'t exist')
+            continue
+
+        try:
+            value = int(value)
+        except ValueError as exception:
+            pass
+
+        if (
+            value == 0 and name != 'score'
+        ) or (isinstance(value, str) and not len(value)):
+            # Look for posts that don't have the column set.
+            where = or_(col == None, col == '')
+        else:
+            if sign == '<':
+                where = col < value
+            elif sign == '>':
+                where = col > value
+            else:
+                where = col == value
+
+        stmt = stmt.where(where)
+        logger.debug(
+            f'Searching attribute: {name}'\
+            f'{'=' if not sign else sign}{value}'
+        )
+
+    # Handle showing/hiding removed posts.
+    stmt = stmt.where(Post.removed == query.removed)
+
+    # Handle where a user wants to search for posts with no tags.
+    if query.no_tags:
+        stmt = stmt.where(Post.id.not_in(select(TagAssociation.post_id)))
+
+    # Posts having every included tag, found with a single
+    # tag_association scan instead of one EXISTS per tag.
+    if tag_ids.include is None:
+        stmt = stmt.where(false())
+        logger.debug('Included tag doesn\'t exist, nothing can match.')
+    elif tag_ids.include:
+        stmt = stmt.where(Post.id.in_(
+            select(TagAssociation.post_id)
+            .where(TagAssociation.tag_id.in_(tag_ids.include))
+            .group_by(TagAssociation.post_id)
+            .having(func.count() == len(tag_ids.include))
+        ))
+        logger.debug(f'Searching tags: {query.include} in posts.')
+
+    # Anti-join against posts having any of the excluded tags.
+    if tag_ids.exclude:
+        stmt = stmt.where(Post.id.not_in(
+            select(TagAssociation.post_id)
+            .where(TagAssociation.tag_id.in_(tag_ids.exclude))
+        ))
+        logger.debug(f'Excluding tags: {query.exclude} from posts.')
+
+    logger.debug(f'Compiled search query: {repr(str(query))}')
+    return stmt
+
+def resolve_tags(query: SearchQuery) -> TagIds:
+    """
+    Resolves every tag name of a search query to its ID in one query.
+    Excluded tags that don't exist are dropped since they can't match.
+
+    Args:
+        query: Parsed searching terms
+    """
+    names = query.include + query.exclude
+
+    if not names:
+        return TagIds()
+
+    ids: dict[str, int] = dict(db.session.execute(
+        select(Tag.name, Tag.id).where(Tag.name.in_(names))
+    ).all())
+
+    include = tuple(sorted(ids[name] for name in query.include if name in ids))
+
+    if len(include) != len(query.include):
+        include = None
+
+    return TagIds(
+        include = include,
+        exclude = tuple(sorted(
+            ids[name] for name in query.exclude if name in ids
+        ))
+    )
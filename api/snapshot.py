@@ -38,6 +38,7 @@ def browse_snapshots(
         Snapshot,
         extra_fn = snapshot_select,
         *args,
+        count_key = md5,
         **kwargs
     )
 
@@ -23,10 +23,13 @@ def browse_tag(*args, **kwargs) -> 'Pagination[Tag]':
     Args:
         direction (str, optional): Sorting direction, asc for ascending
         and desc for descending
+        cursor (str): Next/prev cursor of a previous page to continue from
+        include_total (bool): Whether to count tags for amount of pages
         limit (int): Amount of tags per page
         page (int): Page
         sort (str): Tag's column to sort by
         terms (str): Tag name to search for
+        profile (str): Loader profile of relationships the page will use
     """
     def tag_select(stmt: Select[T]) -> Select[T]:
         terms: str = kwargs.get('terms')
@@ -52,7 +55,13 @@ def browse_tag(*args, **kwargs) -> 'Pagination[Tag]':
 
         return stmt
 
-    return browse_element(Tag, tag_select, *args, **kwargs)
+    return browse_element(
+        Tag,
+        tag_select,
+        *args,
+        count_key = kwargs.get('terms') or '',
+        **kwargs
+    )
 
 def create_tag(name: str, posts: Optional[list[Post]] = None) -> Tag | None:
     """
@@ -0,0 +1,209 @@
+from array import array
+from itertools import groupby
+from logging import getLogger
+from operator import itemgetter
+from threading import Lock
+from typing import Optional
+
+from sqlalchemy import select
+
+from db import ChangeSet, Post, TagAssociation, db, subscribe
+from .bitmap import Bitmap
+from .search import SearchQuery, TagIds
+
+# Rows fetched at once while building the index.
+BUILD_BATCH = 10000
+
+logger = getLogger('app_logger')
+
+class TagIndex:
+    """
+    Represents an in-memory inverted index of tag ID to post IDs.
+    Kept up to date by committed session changes, so writes made by
+    another process (e.g a CLI command) are only seen after a rebuild.
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self._built = False
+
+        self._tags: dict[int, Bitmap] = {}
+        self._posts = Bitmap()
+        self._removed = Bitmap()
+        self._tagged = Bitmap()
+        # Tag count of each post, indexed by post ID.
+        self._tag_counts = array('H')
+
+    @property
+    def built(self) -> bool:
+        return self._built
+
+    def build(self) -> None:
+        """
+        (Re)builds the index from the database.
+        Changes committed meanwhile wait for the lock and are applied after.
+        """
+        with self._lock:
+            tags = {}
+            tag_counts = array('H')
+            rows = db.session.execute(
+                select(TagAssociation.tag_id, TagAssociation.post_id)
+                .order_by(TagAssociation.tag_id, TagAssociation.post_id)
+                .execution_options(yield_per = BUILD_BATCH)
+            )
+
+            for tag_id, group in groupby(rows, itemgetter(0)):
+                post_ids = array('L', map(itemgetter(1), group))
+                tags[tag_id] = Bitmap.from_sorted(post_ids)
+
+                for post_id in post_ids:
+                    _grow(tag_counts, post_id)
+                    tag_counts[post_id] += 1
+
+            posts = db.session.execute(
+                select(Post.id, Post.removed).order_by(Post.id)
+            ).all()
+
+            self._tags = tags
+            self._tag_counts = tag_counts
+            self._posts = Bitmap.from_sorted(post_id for post_id, _ in posts)
+            self._removed = Bitmap.from_sorted(
+                post_id for post_id, removed in posts if removed
+            )
+            self._tagged = Bitmap.from_sorted(
+                post_id for post_id, _ in posts
+                if post_id < len(tag_counts) and tag_counts[post_id]
+            )
+            self._built = True
+
+        logger.info(
+            f'Built tag index of {len(tags)} tags and {len(posts)} posts'
+        )
+
+    def apply(self, changes: ChangeSet) -> None:
+        """
+        Applies committed changes to the index.
+
+        Args:
+            changes: Changes of a committed transaction
+        """
+        with self._lock:
+            if not self._built:
+                return
+
+            for post_id, removed in changes.posts_created.items():
+                self._posts.add(post_id)
+
+                if removed:
+                    self._removed.add(post_id)
+
+            for post_id, removed in changes.posts_removed.items():
+                if removed:
+                    self._removed.add(post_id)
+                else:
+                    self._removed.discard(post_id)
+
+            for post_id, tag_ids in changes.tags_added.items():
+                for tag_id in tag_ids:
+                    bitmap = self._tags.setdefault(tag_id, Bitmap())
+
+                    # Already seen by a build that raced this change.
+                    if post_id in bitmap:
+                        continue
+
+                    bitmap.add(post_id)
+                    self._count_tag(post_id, 1)
+
+            for post_id, tag_ids in changes.tags_removed.items():
+                for tag_id in tag_ids:
+                    bitmap = self._tags.get(tag_id)
+
+                    if bitmap is None or post_id not in bitmap:
+                        continue
+
+                    bitmap.discard(post_id)
+                    self._count_tag(post_id, -1)
+
+            # Deleted tags take their associations with them.
+            for tag_id in changes.tags_deleted:
+                for post_id in self._tags.pop(tag_id, ()):
+                    self._count_tag(post_id, -1)
+
+            for post_id in changes.posts_deleted:
+                for bitmap in self._tags.values():
+                    bitmap.discard(post_id)
+
+                self._posts.discard(post_id)
+                self._removed.discard(post_id)
+                self._tagged.discard(post_id)
+
+                if post_id < len(self._tag_counts):
+                    self._tag_counts[post_id] = 0
+
+    def search(
+        self,
+        query: SearchQuery,
+        tag_ids: TagIds
+    ) -> Optional[Bitmap]:
+        """
+        Returns IDs of posts matching a search query,
+        or None if the query can't be answered by the index.
+
+        Args:
+            query: Parsed searching terms
+            tag_ids: Query's tag names resolved by resolve_tags
+        """
+        if query.caption or query.attrs:
+            return None
+
+        if not self._built:
+            self.build()
+
+        if tag_ids.include is None:
+            return Bitmap()
+
+        with self._lock:
+            # Tag bitmaps only hold existing posts, so the whole post set
+            # is only needed without included tags. Intersect from the
+            # rarest tag to keep intermediate bitmaps small.
+            include = sorted(
+                (self._tags.get(tag_id, Bitmap()) for tag_id in tag_ids.include),
+                key = len
+            )
+            result = include[0] if include else self._posts
+
+            for bitmap in include[1:]:
+                result &= bitmap
+
+            if query.removed:
+                result &= self._removed
+            else:
+                result -= self._removed
+
+            if query.no_tags:
+                result -= self._tagged
+
+            for tag_id in tag_ids.exclude:
+                bitmap = self._tags.get(tag_id)
+
+                if bitmap:
+                    result -= bitmap
+
+        return result
+
+    def _count_tag(self, post_id: int, delta: int) -> None:
+        _grow(self._tag_counts, post_id)
+        count = self._tag_counts[post_id] = max(
+            self._tag_counts[post_id] + delta, 0
+        )
+
+        if count:
+            self._tagged.add(post_id)
+        else:
+            self._tagged.discard(post_id)
+
+def _grow(counts: array, index: int) -> None:
+    if index >= len(counts):
+        counts.frombytes(bytes(counts.itemsize * (index + 1 - len(counts))))
+
+tag_index = TagIndex()
+subscribe(tag_index.apply)
@@ -0,0 +1,173 @@
+from bisect import bisect_left, insort
+from heapq import nsmallest
+from logging import getLogger
+from threading import Lock
+from typing import Iterable
+
+from sqlalchemy import select
+
+from db import ChangeSet, Tag, db, subscribe
+
+# How many suggestions are kept per cached prefix.
+CACHED_SUGGESTIONS = 50
+# How many prefixes to keep suggestions of.
+CACHED_PREFIXES = 4096
+# Sorts after every character, bounds names starting with a prefix.
+LAST_CHARACTER = '\U0010ffff'
+
+logger = getLogger('app_logger')
+
+class TagSuggester:
+    """
+    Represents an in-memory prefix index of tag names
+    for suggesting the most used tags starting with a prefix.
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self._built = False
+
+        # Sorted tag names, searched by bisection.
+        self._names: list[str] = []
+        self._names_by_id: dict[int, str] = {}
+        # Tag name mapped to how many posts have it.
+        self._counts: dict[str, int] = {}
+        # Prefix mapped to its most used tag names.
+        self._cache: dict[str, list[str]] = {}
+
+    def build(self) -> None:
+        """
+        (Re)builds the index from the database.
+        """
+        with self._lock:
+            rows = db.session.execute(
+                select(Tag.id, Tag.name, Tag.post_count)
+            ).all()
+
+            self._names_by_id = { tag_id: name for tag_id, name, _ in rows }
+            self._counts = { name: count for _, name, count in rows }
+            self._names = sorted(self._counts)
+            self._cache.clear()
+            self._built = True
+
+        logger.info(f'Built tag suggestion index of {len(rows)} tags')
+
+    def apply(self, changes: ChangeSet) -> None:
+        """
+        Applies committed tag changes to the index.
+
+        Args:
+            changes: Changes of a committed transaction
+        """
+        if not (changes.tags_named or changes.tags_deleted or
+            changes.tags_added or changes.tags_removed):
+            return
+
+        with self._lock:
+            if not self._built:
+                return
+
+            for tag_id, name in changes.tags_named.items():
+                count = self._remove(tag_id)
+                self._names_by_id[tag_id] = name
+                self._counts[name] = count
+                self._invalidate(name)
+                insort(self._names, name)
+
+            for tag_id in changes.tags_deleted:
+                self._remove(tag_id)
+
+            for tag_ids, delta in (
+                (changes.tags_added.values(), 1),
+                (changes.tags_removed.values(), -1)
+            ):
+                for ids in tag_ids:
+                    for tag_id in ids:
+                        name = self._names_by_id.get(tag_id)
+
+                        if name is not None:
+                            self._counts[name] = max(
+                                self._counts[name] + delta, 0
+                            )
+                            self._invalidate(name)
+
+    def suggest(
+        self,
+        prefix: str,
+        limit: int,
+        exclude: Iterable[str] = ()
+    ) -> list[tuple[str, int]]:
+        """
+        Returns names and post counts of the most used tags
+        starting with prefix.
+
+        Args:
+            prefix: Start of tag name
+            limit: Amount of tags to return
+            exclude: Tag names to leave out
+        """
+        if not self._built:
+            self.build()
+
+        prefix = prefix.strip().lower()
+        exclude = { name.lower() for name in exclude }
+
+        with self._lock:
+            names = self._cache.get(prefix)
+
+            if names is None:
+                names = self._top(prefix, CACHED_SUGGESTIONS)
+
+                if len(self._cache) >= CACHED_PREFIXES:
+                    self._cache.clear()
+
+                self._cache[prefix] = names
+
+            # Cached suggestions ran out because of exclusions.
+            if len(names) == CACHED_SUGGESTIONS and\
+            limit + len(exclude) > CACHED_SUGGESTIONS:
+                names = self._top(prefix, limit + len(exclude))
+
+            return [
+                (name, self._counts[name]) for name in names
+                if name not in exclude
+            ][:limit]
+
+    def _top(self, prefix: str, limit: int) -> list[str]:
+        """
+        Returns most used tag names starting with prefix.
+        """
+        start = bisect_left(self._names, prefix)
+        end = bisect_left(self._names, prefix + LAST_CHARACTER, start)
+
+        return nsmallest(
+            limit,
+            self._names[start:end],
+            key = lambda name: (-self._counts[name], name)
+        )
+
+    def _invalidate(self, name: str) -> None:
+        """
+        Forgets cached suggestions of every prefix of name.
+        """
+        for end in range(len(name) + 1):
+            self._cache.pop(name[:end], None)
+
+    def _remove(self, tag_id: int) -> int:
+        """
+        Removes tag from the index and returns its post count.
+        """
+        name = self._names_by_id.pop(tag_id, None)
+
+        if name is None:
+            return 0
+
+        self._invalidate(name)
+        index = bisect_left(self._names, name)
+
+        if index < len(self._names) and self._names[index] == name:
+            del self._names[index]
+
+        return self._counts.pop(name, 0)
+
+tag_suggester = TagSuggester()
+subscribe(tag_suggester.apply)
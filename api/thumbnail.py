@@ -1,17 +1,25 @@
+from dataclasses import dataclass
 from enum import Enum
+from io import BytesIO
 from logging import getLogger
 from pathlib import Path
 from typing import Optional
 
 import ffmpeg
-from PIL import Image
+from flask import Response, url_for
+from PIL import Image, features
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
 
-from config import TEMP_PATH, TARGET_SIZE
-from db import db, Post, Thumbnail
+from config import TARGET_SIZE, THUMBNAIL_FORMAT, THUMBNAIL_SIZES
+from db import db, Post, Thumbnail, ThumbnailVariant
+from .media import MediaInfo, probe_media
+from .thumbnail_store import store_of, thumbnail_store
 
-# Use the largest axis for target.
-HEIGHT_EXPR = f'if(gt(iw, ih), {TARGET_SIZE}, -1)'
-WIDTH_EXPR = f'if(gt(iw, ih), -1, {TARGET_SIZE})'
+# Quality of JPEG thumbnails, Pillow defaults to 75.
+JPEG_QUALITY = 85
+# Quality of WebP thumbnails, Pillow defaults to 80.
+WEBP_QUALITY = 80
 
 logger = getLogger('app_logger')
 
@@ -21,105 +29,286 @@ class ThumbnailType(Enum):
     """
     JPEG = 'jpg'
     PNG = 'png'
+    WEBP = 'webp'
 
-def create_thumbnail(post: Post) -> Thumbnail:
+    @property
+    def format(self) -> str:
+        """ Returns Pillow's name of the format. """
+        return self.name
+
+    @property
+    def mime(self) -> str:
+        return f'image/{self.name.lower()}'
+
+    @property
+    def options(self) -> dict:
+        """ Returns Pillow's encoder options of the format. """
+        if self == ThumbnailType.PNG:
+            return { 'optimize': True }
+
+        if self == ThumbnailType.WEBP:
+            return { 'quality': WEBP_QUALITY }
+
+        return { 'quality': JPEG_QUALITY, 'optimize': True }
+
+if THUMBNAIL_FORMAT not in ('jpg', 'webp'):
+    logger.warning(
+        f'Unknown thumbnail format {THUMBNAIL_FORMAT}, using jpg format'
+    )
+
+# Format of variants, None picks JPEG or PNG by transparency
+# like the TARGET_SIZE thumbnail.
+VARIANT_TYPE = ThumbnailType.WEBP if THUMBNAIL_FORMAT == 'webp' else None
+
+if VARIANT_TYPE and not features.check('webp'):
+    logger.warning('Pillow was built without WebP, using jpg format')
+    VARIANT_TYPE = None
+
+# Sizes variants are made in, the TARGET_SIZE thumbnail
+# already is one in JPEG or PNG.
+VARIANT_SIZES = tuple(sorted({
+    size for size in THUMBNAIL_SIZES
+    if size > 0 and (VARIANT_TYPE or size != TARGET_SIZE)
+}))
+# Shorter side of the frame thumbnails of every size are made of.
+FRAME_SIZE = max((TARGET_SIZE, *VARIANT_SIZES))
+
+@dataclass(frozen = True)
+class EncodedThumbnail:
     """
-    Creates and returns thumbnail object that represents a post's thumbnail.
+    Represents an encoded thumbnail image yet to be stored, which
+    another process than the storing one may have made.
+    """
+    data: bytes
+    ext: ThumbnailType
+    # Shorter side of the image in pixels.
+    size: int = TARGET_SIZE
+    # Width of the image in pixels, which srcset describes it by.
+    width: Optional[int] = None
+    # Images of VARIANT_SIZES, made from the same frame.
+    variants: tuple['EncodedThumbnail', ...] = ()
+
+def _encode(
+    image: Image.Image,
+    size: int,
+    alpha: bool,
+    ext: Optional[ThumbnailType] = None
+) -> EncodedThumbnail:
+    """
+    Scales thumbnail frame down to size and encodes it.
 
     Args:
-        post: Post to capture thumbnail of.
+        image: Frame of at least size
+        size: Shorter side of the image in pixels
+        alpha: Whether the frame uses transparency
+        ext: Format to encode in, JPEG or PNG by transparency if not passed
     """
-    temp_f = generate_thumbnail(post)
-    alpha = is_alpha_used(temp_f)
-    logger.debug(f'Generated PNG thumbnail: {temp_f}')
+    dimensions = get_thumbnail_size(image.size, size)
+
+    if dimensions != image.size:
+        image = image.resize(dimensions, Image.Resampling.LANCZOS)
+
+    # Transparent thumbnails need PNG, the rest are smaller as JPEG.
+    if ext is None:
+        ext = ThumbnailType.PNG if alpha else ThumbnailType.JPEG
 
     if not alpha:
-        # Create new thumbnail in MJPEG container to minimize storage cost.
-        try:
-            temp_f.unlink(missing_ok = True)
-        except AttributeError as exception:
-            pass
+        image = image.convert('RGB')
 
-        temp_f = generate_thumbnail(post, ThumbnailType.JPEG)
-        logger.debug(
-            f'Generated JPEG thumbnail: {temp_f} '\
-            'cause it doesn\'t require transparency.'
-        )
+    buffer = BytesIO()
+    image.save(buffer, ext.format, **ext.options)
+    logger.debug(
+        f'Encoded {size} pixel {ext.format} thumbnail '\
+        f'of {len(buffer.getvalue())} bytes'
+    )
 
-    thumb = Thumbnail()
+    return EncodedThumbnail(buffer.getvalue(), ext, size, image.width)
 
-    try:
-        with temp_f.open('rb') as stream:
-            thumb.data = stream.read()
-    except AttributeError as exception:
+def create_thumbnail(
+    post: Post,
+    info: Optional[MediaInfo] = None,
+    encoded: Optional[EncodedThumbnail] = None
+) -> Thumbnail:
+    """
+    Creates and returns thumbnail object that represents a post's thumbnail.
+
+    Args:
+        post: Post to capture thumbnail of.
+        info: What probing the post's file found out, probed if not passed
+        encoded: Image made of the post's file already, made if not passed
+    """
+    encoded = encoded or encode_thumbnail(post.path, info)
+
+    if encoded is None:
         logger.debug('No thumbnail was made.')
         return
 
-    temp_f.unlink(missing_ok = True)
+    thumb = Thumbnail()
+    thumb.mime = encoded.ext.mime
+    thumbnail_store.save(thumb, post, encoded.data, encoded.ext.value)
+
+    for image in encoded.variants:
+        variant = ThumbnailVariant()
+        variant.size = image.size
+        variant.width = image.width
+        variant.mime = image.ext.mime
+        thumbnail_store.save(
+            variant,
+            post,
+            image.data,
+            image.ext.value,
+            image.size
+        )
+        thumb.variants.append(variant)
+
     db.session.add(thumb)
     thumb.post = post
 
     logger.info(f'Created thumbnail for post #{post.id}')
     return thumb
 
+def delete_thumbnail(thumbnail: Thumbnail) -> None:
+    """
+    Deletes thumbnail and its variants. Their images are deleted once
+    the deletion is committed, see remove_deleted_images.
+
+    Args:
+        thumbnail: Thumbnail to delete
+    """
+    db.session.delete(thumbnail)
+
+def delete_thumbnail_images(thumbnail: Thumbnail) -> None:
+    """
+    Deletes images of thumbnail and its variants, the rows are left
+    to the caller.
+
+    Args:
+        thumbnail: Thumbnail whose images to delete
+    """
+    for image in (thumbnail, *thumbnail.variants):
+        store_of(image).delete(image)
+
+def encode_thumbnail(
+    path: Path,
+    info: Optional[MediaInfo] = None
+) -> Optional[EncodedThumbnail]:
+    """
+    Generates and encodes thumbnail of file, None if it has no visuals.
+
+    Args:
+        path: File to capture thumbnail of
+        info: What probing the file found out, probed if not passed
+    """
+    # One frame is decoded, every size is scaled down from it.
+    image = generate_thumbnail(path, info, FRAME_SIZE)
+
+    if image is None:
+        return
+
+    alpha = is_alpha_used(image)
+    variants = tuple(
+        _encode(image, size, alpha, VARIANT_TYPE) for size in VARIANT_SIZES
+    )
+    encoded = _encode(image, TARGET_SIZE, alpha)
+
+    return EncodedThumbnail(
+        encoded.data,
+        encoded.ext,
+        width = encoded.width,
+        variants = variants
+    )
+
+def get_thumbnail(post_id: int) -> Optional[Thumbnail]:
+    """
+    Returns thumbnail of post, without its image
+    but with the post's MD5 it's cached by.
+
+    Args:
+        post_id: ID of the post
+    """
+    return db.session.scalar(
+        select(Thumbnail)
+        .where(Thumbnail.post_id == post_id)
+        .options(joinedload(Thumbnail.post).load_only(Post.md5))
+    )
+
+def get_thumbnail_variant(
+    thumbnail: Thumbnail,
+    size: int
+) -> Optional[ThumbnailVariant]:
+    """
+    Returns variant of thumbnail in size, without its image.
+
+    Args:
+        thumbnail: Thumbnail the variant is of
+        size: Shorter side of the variant in pixels
+    """
+    return db.session.scalar(
+        select(ThumbnailVariant)
+        .where(
+            ThumbnailVariant.thumbnail_id == thumbnail.id,
+            ThumbnailVariant.size == size
+        )
+    )
+
+def send_thumbnail(thumbnail: Thumbnail | ThumbnailVariant) -> Response:
+    """
+    Returns response sending image of thumbnail from its store.
+    Raises FileNotFoundError if the image is missing.
+
+    Args:
+        thumbnail: Thumbnail or variant to send
+    """
+    return store_of(thumbnail).send(thumbnail)
+
 def generate_thumbnail(
-    post: Post,
-    ext: ThumbnailType = ThumbnailType.PNG
-) -> Optional[Path]:
+    path: Path,
+    info: Optional[MediaInfo] = None,
+    target: int = TARGET_SIZE
+) -> Optional[Image.Image]:
     """
     Generate and return thumbnail based off the content's embedded
-    cover art or the generic first frame.
+    cover art or the generic first frame. ffmpeg scales a single frame
+    and pipes it raw, so nothing is encoded twice nor written to disk.
 
     Args:
-        post
-        ext
+        path: File to capture thumbnail of
+        info: What probing the file found out, probed if not passed
+        target: Shorter side of the thumbnail in pixels
     """
-    out = TEMP_PATH / (post.md5 + f'.{ext.value}')
-    post_path = str(post.path)
+    post_path = str(path)
+    info = info or probe_media(path)
 
-    # Find out which video stream has an embedded thumbnail.
-    try:
-        probe_data = ffmpeg.probe(post_path)
-    except ffmpeg.Error:
+    if not info.is_visual or not info.frame_size:
         logger.error(
             f'Can\'t probe non-visual file: {post_path}'
         )
         return
 
-    index: Optional[int] = None
+    stream = ffmpeg.input(post_path)
 
-    for stream in probe_data['streams']:
-        if stream.get('disposition', {}).get('attached_pic') == 1:
-            index = stream['index']
-            logger.debug(
-                f'Found visual stream: {index}/{len(probe_data['streams'])}'
-            )
-            break
+    # Use the embedded thumbnail if a stream has one, the first frame if not.
+    if info.attached_pic is not None:
+        logger.debug(
+            f'Found visual stream: {info.attached_pic}/{len(info.streams)}'
+        )
+        stream = stream[str(info.attached_pic)]
 
-    stream = ffmpeg.input(post_path)[str(index)]
+    # Transparency is only looked for if the pixel format can have it.
+    mode = 'RGBA' if info.has_alpha else 'RGB'
+    size = get_thumbnail_size(info.frame_size, target)
 
-    # Specify muxer.
-    stream = ffmpeg.filter(
-        stream,
-        'format',
-        pix_fmts = 'rgba' if ext == ThumbnailType.PNG else 'yuvj420p'
-    )
-    logger.debug(
-        'Using PNG format for thumbnail'
-        if ext == ThumbnailType.PNG else
-        'Using JPEG format for thumbnail'
-    )
-
-    # Specify dimensions.
-    stream = ffmpeg.filter(stream, 'scale', h = HEIGHT_EXPR, w = WIDTH_EXPR)
+    stream = ffmpeg.filter(stream, 'scale', w = size[0], h = size[1])
 
     try:
-        ffmpeg.output(
+        frame, _ = ffmpeg.output(
             stream,
-            str(out),
+            'pipe:',
+            format = 'rawvideo',
+            pix_fmt = 'rgba' if mode == 'RGBA' else 'rgb24',
             frames = '1'
         ).run(
-            overwrite_output = True,
+            capture_stdout = True,
             capture_stderr = True
         )
     except ffmpeg.Error as exception:
@@ -129,52 +318,83 @@ def generate_thumbnail(
         )
         return
 
-    logger.debug(f'Generated thumbnail: {out}')
-    return out
+    if len(frame) != size[0] * size[1] * len(mode):
+        logger.warning(
+            f'Path: {post_path} gave a {len(frame)} byte frame, '\
+            f'not one of {size[0]}x{size[1]} {mode}'
+        )
+        return
+
+    logger.debug(f'Generated {size[0]}x{size[1]} {mode} thumbnail')
+    return Image.frombytes(mode, size, frame)
 
-def is_alpha_used(path: Path) -> bool:
+def get_thumbnail_size(
+    size: tuple[int, int],
+    target: int = TARGET_SIZE
+) -> tuple[int, int]:
     """
-    Return True if the thumbnail path has transparency
-    and requires a PNG container.
+    Returns size of thumbnail of a frame, whose shorter axis is target.
 
     Args:
-        path
+        size: Width and height of the frame
+        target: Shorter side of the thumbnail in pixels
     """
-    try:
-        image = Image.open(path)
-    except AttributeError:
-        logger.error(f'Can\'t work with path: {path} in alpha checking.')
-        return False
+    width, height = size
 
-    if image.mode == 'P':
-        if 'transparency' in image.info:
-            image = image.convert('RGBA')
-        else:
-            image.close()
-            logger.warning(
-                f'Path: {path} is palette-based and lacks transparency data.'
-            )
+    if width > height:
+        return max(round(width * target / height), 1), target
+
+    return target, max(round(height * target / width), 1)
+
+def is_alpha_used(image: Image.Image) -> bool:
+    """
+    Return True if the thumbnail image has transparency
+    and requires a PNG container.
 
+    Args:
+        image
+    """
+    if image.mode == 'P':
+        if 'transparency' not in image.info:
+            logger.debug('Thumbnail is palette-based and lacks transparency.')
             return False
 
-    if image.mode not in ('LA', 'RGBA'):
-        image.close()
-        logger.warning(
-            f'Required Alpha channel (RGBA/LA) not found for path: {path}'
-        )
+        image = image.convert('RGBA')
 
+    if image.mode not in ('LA', 'RGBA'):
+        logger.debug(f'Thumbnail of mode {image.mode} has no alpha channel')
         return False
 
-    alpha_channel = image.getchannel('A')
-    min_a, max_a = alpha_channel.getextrema()
+    min_a, max_a = image.getchannel('A').getextrema()
 
     if min_a == 255 and max_a == 255:
-        image.close()
-        logger.warning(
-            f'Path: {path} doesn\'t have any pixels that use transparency'
-        )
-
+        logger.debug('Thumbnail doesn\'t have any pixels that use transparency')
         return False
 
-    image.close()
     return True
+
+def thumbnail_srcset(post: Post) -> str:
+    """
+    Returns srcset of post's thumbnail variants by their width, empty
+    if none of the configured sizes are made.
+
+    Args:
+        post: Post with a thumbnail, selected with its thumbnail_widths
+    """
+    if not VARIANT_SIZES or not post.thumbnail_widths:
+        return ''
+
+    widths = dict(
+        map(int, pair.split(':')) for pair in post.thumbnail_widths.split(',')
+    )
+
+    return ', '.join(
+        url_for(
+            'Root.Thumbnail.thumbnail_route',
+            post_id = post.id,
+            size = size,
+            v = post.thumbnail_version
+        ) + f' {widths[size]}w'
+        for size in VARIANT_SIZES
+        if size in widths
+    )
@@ -0,0 +1,218 @@
+from abc import ABC, abstractmethod
+from logging import getLogger
+from mimetypes import guess_type
+from os import replace
+from pathlib import Path
+
+from flask import Response, send_file
+from magic import from_buffer
+from sqlalchemy import select
+
+from config import (
+    TARGET_SIZE,
+    THUMBNAIL_ACCEL_PREFIX,
+    THUMBNAIL_PATH,
+    THUMBNAIL_SENDFILE,
+    THUMBNAIL_STORE
+)
+from db import ChangeSet, Post, Thumbnail, ThumbnailVariant, db, subscribe
+
+logger = getLogger('app_logger')
+
+class ThumbnailStore(ABC):
+    """
+    Represents where thumbnail images are kept.
+    """
+    @abstractmethod
+    def save(
+        self,
+        thumbnail: Thumbnail | ThumbnailVariant,
+        post: Post,
+        data: bytes,
+        ext: str,
+        size: int = TARGET_SIZE
+    ) -> None:
+        """
+        Stores encoded image as thumbnail of post.
+
+        Args:
+            thumbnail: Thumbnail or variant to store image of
+            post: Post the thumbnail is of
+            data: Encoded image
+            ext: Extension of the image format, e.g jpg
+            size: Shorter side of the image in pixels
+        """
+
+    @abstractmethod
+    def send(self, thumbnail: Thumbnail | ThumbnailVariant) -> Response:
+        """
+        Returns response sending image of thumbnail.
+
+        Args:
+            thumbnail: Thumbnail or variant kept by this store
+        """
+
+    @abstractmethod
+    def delete(self, thumbnail: Thumbnail | ThumbnailVariant) -> None:
+        """
+        Deletes image of thumbnail, the row is left to the caller.
+
+        Args:
+            thumbnail: Thumbnail or variant kept by this store
+        """
+
+class DatabaseStore(ThumbnailStore):
+    """
+    Keeps thumbnail images in the thumbnail table.
+    """
+    def save(
+        self,
+        thumbnail: Thumbnail | ThumbnailVariant,
+        post: Post,
+        data: bytes,
+        ext: str,
+        size: int = TARGET_SIZE
+    ) -> None:
+        thumbnail.data = data
+        thumbnail.path = None
+
+    def send(self, thumbnail: Thumbnail | ThumbnailVariant) -> Response:
+        model = type(thumbnail)
+        data = db.session.scalar(
+            select(model.data).where(model.id == thumbnail.id)
+        )
+
+        if data is None:
+            raise FileNotFoundError(
+                f'{model.__name__} #{thumbnail.id} has no image'
+            )
+
+        return Response(
+            response = data,
+            mimetype = thumbnail.mime or from_buffer(data, mime = True)
+        )
+
+    def delete(self, thumbnail: Thumbnail | ThumbnailVariant) -> None:
+        # The image is deleted along the row.
+        pass
+
+class FilesystemStore(ThumbnailStore):
+    """
+    Keeps thumbnail images as files addressed by their post's MD5
+    and size, e.g ab/cd/abcd...ef-250.jpg.
+    """
+    def __init__(self, root: Path):
+        self.root = root
+
+    @staticmethod
+    def key(md5: str, ext: str, size: int = TARGET_SIZE) -> str:
+        """
+        Returns path of an image within the store.
+
+        Args:
+            md5: MD5 of the post
+            ext: Image extension
+            size: Size variant of the thumbnail
+        """
+        return f'{md5[:2]}/{md5[2:4]}/{md5}-{size}.{ext}'
+
+    def write(self, key: str, data: bytes) -> None:
+        """
+        Atomically writes image to the store, so a half written file
+        is never served.
+
+        Args:
+            key: Path within the store
+            data: Image
+        """
+        path = self.root / key
+        path.parent.mkdir(parents = True, exist_ok = True)
+        temp_path = path.with_name(f'.{path.name}.tmp')
+
+        temp_path.write_bytes(data)
+        replace(temp_path, path)
+
+    def remove(self, key: str) -> None:
+        """
+        Deletes image from the store, if it's there.
+
+        Args:
+            key: Path within the store
+        """
+        (self.root / key).unlink(missing_ok = True)
+
+    def save(
+        self,
+        thumbnail: Thumbnail | ThumbnailVariant,
+        post: Post,
+        data: bytes,
+        ext: str,
+        size: int = TARGET_SIZE
+    ) -> None:
+        key = self.key(post.md5, ext, size)
+        self.write(key, data)
+
+        thumbnail.data = None
+        thumbnail.path = key
+
+    def send(self, thumbnail: Thumbnail | ThumbnailVariant) -> Response:
+        mime = thumbnail.mime or guess_type(thumbnail.path)[0]
+
+        if THUMBNAIL_SENDFILE == 'x-accel':
+            location = f'{THUMBNAIL_ACCEL_PREFIX.rstrip('/')}/{thumbnail.path}'
+            return Response(
+                mimetype = mime,
+                headers = { 'X-Accel-Redirect': location }
+            )
+
+        path = (self.root / thumbnail.path).resolve()
+
+        if THUMBNAIL_SENDFILE == 'x-sendfile':
+            return Response(mimetype = mime, headers = { 'X-Sendfile': str(path) })
+
+        # Caching headers are the caller's, derived from the post.
+        return send_file(path, mimetype = mime, etag = False)
+
+    def delete(self, thumbnail: Thumbnail | ThumbnailVariant) -> None:
+        if thumbnail.path:
+            self.remove(thumbnail.path)
+
+database_store = DatabaseStore()
+filesystem_store = FilesystemStore(THUMBNAIL_PATH)
+
+STORES: dict[str, ThumbnailStore] = {
+    'database': database_store,
+    'filesystem': filesystem_store
+}
+
+if THUMBNAIL_STORE not in STORES:
+    logger.warning(
+        f'Unknown thumbnail store {THUMBNAIL_STORE}, using database store'
+    )
+
+# Where new thumbnails are stored.
+thumbnail_store = STORES.get(THUMBNAIL_STORE, database_store)
+
+def store_of(thumbnail: Thumbnail | ThumbnailVariant) -> ThumbnailStore:
+    """
+    Returns store keeping image of thumbnail,
+    older thumbnails may be kept by another store than new ones.
+
+    Args:
+        thumbnail: Thumbnail or variant
+    """
+    return filesystem_store if thumbnail.path else database_store
+
+def remove_deleted_images(changes: ChangeSet) -> None:
+    """
+    Deletes files of thumbnails whose deletion was committed, so a
+    rolled back deletion never leaves its row without an image.
+    Files that new thumbnails took the place of are kept.
+
+    Args:
+        changes: What a committed transaction has changed
+    """
+    for key in changes.thumbnail_paths_deleted:
+        filesystem_store.remove(key)
+
+subscribe(remove_deleted_images)
@@ -38,7 +38,13 @@ def browse_user(*args, **kwargs) -> 'Pagination[User]':
 
         return stmt.where(or_(*conditions))
 
-    return browse_element(User, user_select, *args, **kwargs)
+    return browse_element(
+        User,
+        user_select,
+        *args,
+        count_key = kwargs.get('terms') or '',
+        **kwargs
+    )
 
 def create_user(
     name: str,
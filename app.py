@@ -1,9 +1,9 @@
 from apiflask import APIFlask
 from flask import g, request, redirect
-from flask.cli import with_appcontext
+from flask.cli import AppGroup, with_appcontext
 from flask_migrate import Migrate
 
-from api import get_user
+from api import VARIANT_TYPE, get_user, thumbnail_srcset
 from brand import brand
 from blueprint import api_bp, root_bp
 from config import (
@@ -12,7 +12,22 @@ from config import (
     SSL_ENABLED,
     SUPPORTED_TRANSLATIONS
 )
-from commands import add_command, reindex_command, setup_roles_command
+from commands import (
+    add_command,
+    benchmark_media_command,
+    benchmark_search_command,
+    fill_thumbnail_mimes_command,
+    index_captions_command,
+    media_reprocess_command,
+    move_thumbnails_command,
+    rebuild_manifest_command,
+    recount_scores_command,
+    recount_tags_command,
+    recount_users_command,
+    reindex_command,
+    setup_roles_command,
+    worker_command
+)
 from db import db, User
 from encryption import bcrypt
 from login import login_manager
@@ -36,6 +51,10 @@ def create_app() -> APIFlask:
         ]
 
     app.jinja_env.globals['brand'] = brand
+    app.jinja_env.globals['thumbnail_srcset'] = thumbnail_srcset
+    app.jinja_env.globals['thumbnail_variant_mime'] = (
+        VARIANT_TYPE.mime if VARIANT_TYPE else None
+    )
     app.config['SECRET_KEY'] = SECRET_KEY
     # Initialize database
     app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URI
@@ -44,8 +63,36 @@ def create_app() -> APIFlask:
 
     # Register command-line commands.
     app.cli.command('add')(with_appcontext(add_command))
+    app.cli.command('benchmark-media')(
+        with_appcontext(benchmark_media_command)
+    )
+    app.cli.command('benchmark-search')(
+        with_appcontext(benchmark_search_command)
+    )
+    app.cli.command('fill-thumbnail-mimes')(
+        with_appcontext(fill_thumbnail_mimes_command)
+    )
+    app.cli.command('index-captions')(
+        with_appcontext(index_captions_command)
+    )
+    # Commands of existing posts' media, e.g flask media reprocess.
+    media_cli = AppGroup('media', help = 'Manage media of existing posts.')
+    media_cli.command('reprocess')(media_reprocess_command)
+    app.cli.add_command(media_cli)
+    app.cli.command('move-thumbnails')(
+        with_appcontext(move_thumbnails_command)
+    )
+    app.cli.command('rebuild-manifest')(
+        with_appcontext(rebuild_manifest_command)
+    )
+    app.cli.command('recount-scores')(
+        with_appcontext(recount_scores_command)
+    )
+    app.cli.command('recount-tags')(with_appcontext(recount_tags_command))
+    app.cli.command('recount-users')(with_appcontext(recount_users_command))
     app.cli.command('reindex')(with_appcontext(reindex_command))
     app.cli.command('setup-roles')(with_appcontext(setup_roles_command))
+    app.cli.command('worker')(with_appcontext(worker_command))
 
     # Elevate standard HTTP links to HTTPS for consumption
     # within Jinja2 templates.
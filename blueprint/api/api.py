@@ -15,6 +15,7 @@ from .comment import comment_bp
 from .post import post_bp
 from .post_bulk import post_bulk_bp
 from .score import score_bp
+from .stats import stats_bp
 from .tag import tag_bp
 from .tags import tags_bp
 from .user import user_bp
@@ -76,6 +77,7 @@ api_bp.register_blueprint(comment_bp)
 api_bp.register_blueprint(post_bp)
 api_bp.register_blueprint(post_bulk_bp)
 api_bp.register_blueprint(score_bp)
+api_bp.register_blueprint(stats_bp)
 api_bp.register_blueprint(tag_bp)
 api_bp.register_blueprint(tags_bp)
 api_bp.register_blueprint(user_bp)
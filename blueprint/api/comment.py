@@ -22,11 +22,19 @@ def get_comments(data: BrowseIn):
         limit = data['limit'],
         page = data['page'],
         sort = data['sort'],
-        terms = data['terms']
+        terms = data['terms'],
+        cursor = data['cursor'],
+        include_total = data['include_total'],
+        profile = 'api_list'
     )
+    total = pagination.total
 
     return {
-        'pages': pagination.pages,
+        'pages': pagination.pages if total is not None else None,
+        'total': total,
+        'approximate': pagination.approximate,
+        'next': pagination.next_cursor,
+        'prev': pagination.prev_cursor,
         'comments': pagination.items
     }
 
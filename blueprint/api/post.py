@@ -1,5 +1,3 @@
-from shutil import copy
-
 from apiflask import APIBlueprint, abort
 from flask_login import current_user
 from sqlalchemy.exc import IntegrityError
@@ -42,11 +40,19 @@ def get_posts(data: BrowsePostIn):
         limit = data['limit'],
         page = data['page'],
         sort = data['sort'],
-        terms = data['terms']
+        terms = data['terms'],
+        cursor = data['cursor'],
+        include_total = data['include_total'],
+        profile = 'api_list'
     )
+    total = pagination.total
 
     return {
-        'pages': pagination.pages,
+        'pages': pagination.pages if total is not None else None,
+        'total': total,
+        'approximate': pagination.approximate,
+        'next': pagination.next_cursor,
+        'prev': pagination.prev_cursor,
         'posts': pagination.items
     }
 
@@ -59,7 +65,7 @@ def obtain_post(post_id: str):
     if post_id.isdecimal():
         post_id = int(post_id)
 
-    return get_post(post_id)
+    return get_post(post_id, 'api_list')
 
 @post_bp.delete('/post/<int:post_id>')
 @post_bp.input(PostDeleteIn, arg_name = 'data', location = 'query')
@@ -119,30 +125,28 @@ def upload_post(data: PostFormIn):
     posts = list()
 
     for file in files:
-        temp_path = save_file(file)
-        post = create_post(
-            current_user,
-            temp_path,
-            data.get('directory'),
-            data.get('op'),
-            data.get('src'),
-            data.get('caption')
-        )
-
+        upload = save_file(file)
         posted = False
-        db.session.flush()
-        create_snapshot(post, current_user)
 
         try:
+            post = create_post(
+                current_user,
+                upload,
+                data.get('directory'),
+                data.get('op'),
+                data.get('src'),
+                data.get('caption')
+            )
+
+            db.session.flush()
+            create_snapshot(post, current_user)
             db.session.commit()
             posted = True
         except IntegrityError as exception:
-            # Error likely of post that already exists.
+            # Error likely of post that already exists, which fails
+            # before the upload is placed.
             db.session.rollback()
-
-            # Move back the file.
-            copy(post.path, temp_path)
-            post.path.unlink(missing_ok = True)
+            upload.path.unlink(missing_ok = True)
 
         if posted:
             posts.append(post)
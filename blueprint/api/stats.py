@@ -0,0 +1,26 @@
+from apiflask import APIBlueprint
+
+from api import count_cache, page_cache
+from api.decorators import moderator_only
+from api_auth import auth
+from db.schemas import CacheStatsOut
+
+stats_bp = APIBlueprint(
+    name = 'Stats API',
+    import_name = __name__,
+    url_prefix = '/stats'
+)
+
+@stats_bp.get('/caches')
+@stats_bp.output(CacheStatsOut)
+@stats_bp.auth_required(auth)
+@moderator_only
+def get_cache_stats():
+    """
+    Obtain hit and miss counts of the in-memory caches of this process.
+    Only a moderator is allowed to see them.
+    """
+    return {
+        'pages': page_cache.stats(),
+        'counts': count_cache.stats()
+    }
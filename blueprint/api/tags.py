@@ -2,11 +2,25 @@ from apiflask import APIBlueprint, abort
 from flask_login import current_user
 from sqlalchemy.exc import IntegrityError
 
-from api import browse_tag, create_snapshot, create_tag, get_tag, get_post
+from api import (
+    browse_tag,
+    create_snapshot,
+    create_tag,
+    get_tag,
+    get_post,
+    tag_suggester
+)
 from api.decorators import post_protect, perm_required
 from api_auth import auth
 from db import db
-from db.schemas import BrowseIn, TagBulkIn, TagBulkOut, TagBrowse
+from db.schemas import (
+    BrowseIn,
+    TagBulkIn,
+    TagBulkOut,
+    TagBrowse,
+    TagSuggestIn,
+    TagSuggestOut
+)
 
 tags_bp = APIBlueprint(
     name = 'Tags API',
@@ -26,14 +40,36 @@ def get_tags(data: BrowseIn):
         limit = data['limit'],
         page = data['page'],
         sort = data['sort'],
-        terms = data['terms']
+        terms = data['terms'],
+        cursor = data['cursor'],
+        include_total = data['include_total'],
+        profile = 'api_list'
     )
+    total = pagination.total
 
     return {
-        'pages': pagination.pages,
+        'pages': pagination.pages if total is not None else None,
+        'total': total,
+        'approximate': pagination.approximate,
+        'next': pagination.next_cursor,
+        'prev': pagination.prev_cursor,
         'tags': pagination.items
     }
 
+@tags_bp.get('/suggest')
+@tags_bp.input(TagSuggestIn, arg_name = 'data', location = 'query')
+@tags_bp.output(TagSuggestOut)
+def suggest_tags(data: TagSuggestIn):
+    """
+    Suggest the most used tags starting with q, leaving out
+    excluded tags.
+    """
+    tags = tag_suggester.suggest(data['q'], data['limit'], data['exclude'])
+
+    return {
+        'tags': [ { 'name': name, 'count': count } for name, count in tags ]
+    }
+
 @tags_bp.patch('/add')
 @tags_bp.input(TagBulkIn, arg_name = 'data')
 @tags_bp.output(TagBulkOut)
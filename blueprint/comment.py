@@ -23,7 +23,8 @@ def comment_paged(page: int):
     bar = create_pagination_bar(
         page,
         comments.pages,
-        'Root.Comment.comment_page'
+        'Root.Comment.comment_page',
+        APPROXIMATE = comments.approximate
     )
 
     return render_template(
@@ -31,7 +31,8 @@ def user_list_paged(page: int):
     bar = create_pagination_bar(
         page,
         users.pages,
-        'Root.Manage User.user_list_page'
+        'Root.Manage User.user_list_page',
+        APPROXIMATE = users.approximate
     )
 
     return render_template(
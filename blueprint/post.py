@@ -8,7 +8,6 @@ from flask import (
     flash,
     redirect,
     render_template,
-    send_file,
     url_for
 )
 from flask_babel import gettext
@@ -35,12 +34,19 @@ from api import (
 )
 from api.decorators import (
     owner_or_perm_required,
+    page_cached,
     post_protect,
     perm_required
 )
 from db import Post, db
 from form import PostForm, PostRemovalForm, UploadForm
-from .utils import create_pagination_bar, flash_errors, log_user_activity
+from .utils import (
+    conditional_response,
+    create_pagination_bar,
+    flash_errors,
+    log_user_activity,
+    send_media
+)
 
 DEFAULT_BLUR = 'true'
 
@@ -55,6 +61,7 @@ def browse_page():
     return redirect(url_for('Root.Post.browse_paged', page = 1))
 
 @post_bp.route('/browse/<int:page>')
+@page_cached
 def browse_paged(page: int):
     args = request.args
 
@@ -83,13 +90,15 @@ def browse_paged(page: int):
         limit = limit,
         page = page,
         terms = search,
-        sort = sort
+        sort = sort,
+        profile = 'tile'
     )
 
     bar = create_pagination_bar(
         page,
         pagination.pages,
         'Root.Post.browse_paged',
+        APPROXIMATE = pagination.approximate,
         **request.args
     )
 
@@ -197,8 +206,9 @@ def edit_page(md5: str, post: Post):
     return render_template('edit.html', form = form, post = post)
 
 @post_bp.route('/view/<md5>')
+@page_cached
 def view_page(md5: str):
-    post = get_post(md5)
+    post = get_post(md5, 'detail')
 
     if not post:
         return abort(404)
@@ -214,15 +224,36 @@ def view_page(md5: str):
 def view_file_resource(post_id: int):
     post = get_post(post_id)
 
-    try:
-        return send_file(post.path)
-    except (AttributeError, FileNotFoundError) as exception:
+    if not post:
         log_user_activity(
             logger.warning,
             'tried to access post that doesn\'t exist.'
         )
         return abort(404)
 
+    def send():
+        try:
+            return send_media(
+                post.path,
+                post.md5,
+                post.modified or post.created,
+                post.mime
+            )
+        except FileNotFoundError as exception:
+            log_user_activity(
+                logger.warning,
+                'tried to access post whose file doesn\'t exist.'
+            )
+            return abort(404)
+
+    # Files are addressed by their MD5, which makes for a strong ETag.
+    return conditional_response(
+        post.md5,
+        post.modified or post.created,
+        request.args.get('v') == post.md5,
+        send
+    )
+
 @post_bp.route('/remove/<md5>', methods = ['GET', 'POST'])
 @login_required
 @owner_or_perm_required(Post, 'post:delete')
@@ -284,30 +315,30 @@ def upload_page():
 
     if form.validate_on_submit():
         for file in form.files.data:
-            temp_path = save_file(file)
+            upload = save_file(file)
             posted = False
 
-            with db.session.begin_nested():
-                post = create_post(
-                    author = current_user,
-                    path = temp_path,
-                    op = form.op.data.strip(),
-                    src = form.src.data.strip(),
-                    directory = form.directory.data.strip(),
-                    caption = form.caption.data.strip(),
-                    tags = form.tags.data
-                )
-
-                try:
-                    db.session.flush()
-                    posted = True
-                except IntegrityError as exception:
-                    db.session.rollback()
-                    logger.error(
-                        f'Failed to upload {file.filename}, '
-                        f'exception: {exception}'
+            # A post that already exists fails before its file is placed,
+            # the upload is deleted below.
+            try:
+                with db.session.begin_nested():
+                    post = create_post(
+                        author = current_user,
+                        path = upload,
+                        op = form.op.data.strip(),
+                        src = form.src.data.strip(),
+                        directory = form.directory.data.strip(),
+                        caption = form.caption.data.strip(),
+                        tags = form.tags.data
                     )
 
+                posted = True
+            except IntegrityError as exception:
+                logger.error(
+                    f'Failed to upload {file.filename}, '
+                    f'exception: {exception}'
+                )
+
             if posted:
                 flash(
                     gettext(
@@ -317,7 +348,7 @@ def upload_page():
                     )
                 )
             else:
-                temp_path.unlink(missing_ok = True)
+                upload.path.unlink(missing_ok = True)
 
                 flash(
                     gettext(
@@ -144,7 +144,8 @@ def tag_paged(page: int):
     bar = create_pagination_bar(
         tags.page,
         tags.pages,
-        'Root.Tag.tag_paged'
+        'Root.Tag.tag_paged',
+        APPROXIMATE = tags.approximate
     )
 
     return render_template(
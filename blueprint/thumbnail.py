@@ -1,7 +1,9 @@
-from flask import Blueprint, Response, abort
-from magic import from_buffer
+from typing import Optional
 
-from api import get_post
+from flask import Blueprint, abort, request
+
+from api import get_thumbnail, get_thumbnail_variant, send_thumbnail
+from .utils import conditional_response
 
 thumbnail_bp = Blueprint(
     name = 'Thumbnail',
@@ -9,13 +11,37 @@ thumbnail_bp = Blueprint(
 )
 
 @thumbnail_bp.route('/thumbnail/<int:post_id>')
-def thumbnail_route(post_id: int):
-    post = get_post(post_id)
+@thumbnail_bp.route('/thumbnail/<int:post_id>/<int:size>')
+def thumbnail_route(post_id: int, size: Optional[int] = None):
+    thumbnail = get_thumbnail(post_id)
 
-    try:
-        thumb = post.thumbnail
-    except AttributeError as exception:
+    if not thumbnail:
         return abort(404)
 
-    mime = from_buffer(thumb.data)
-    return Response(response = thumb.data, mimetype = mime)
+    version = thumbnail.version
+    image, etag = thumbnail, version
+    immutable = request.args.get('v') == version
+
+    # Thumbnails made before the size was configured lack its variant,
+    # stale srcsets still get an image. It isn't the one asked for, so
+    # it mustn't be cached as if it were.
+    if size is not None:
+        variant = get_thumbnail_variant(thumbnail, size)
+
+        if variant:
+            image, etag = variant, f'{etag}-{size}'
+        else:
+            immutable = False
+
+    def send():
+        try:
+            return send_thumbnail(image)
+        except FileNotFoundError as exception:
+            return abort(404)
+
+    return conditional_response(
+        etag,
+        thumbnail.created,
+        immutable,
+        send
+    )
@@ -1,12 +1,21 @@
+from datetime import datetime, timezone
 from logging import getLogger
 from math import floor
-from typing import Optional, Protocol
+from mimetypes import guess_type
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator, Optional, Protocol
 
-from flask import request, flash, url_for
+from flask import Response, request, flash, url_for
 from flask_login import current_user
 from flask_wtf import FlaskForm
+from werkzeug.datastructures import ContentRange
+from werkzeug.wsgi import wrap_file
 
 PAGINATION_DEPTH = 5
+# A year, the longest caches are expected to keep a response.
+IMMUTABLE_MAX_AGE = 31536000
+# Bytes read at a time when streaming media.
+MEDIA_CHUNK_SIZE = 64 * 1024
 
 class LoggerCallable(Protocol):
     def __call__(self, message: str) -> None:
@@ -14,11 +23,58 @@ class LoggerCallable(Protocol):
 
 logger = getLogger('app_logger')
 
+def _http_date(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    Returns datetime at the precision of HTTP dates, naive ones being UTC.
+    """
+    if value is None:
+        return None
+
+    return value.replace(microsecond = 0, tzinfo = value.tzinfo or timezone.utc)
+
+def _range_applies(etag: str, last_modified: Optional[datetime]) -> bool:
+    """
+    Returns whether the request's If-Range, if any, still matches the content,
+    otherwise the whole content is sent instead of the requested range.
+    """
+    header = request.headers.get('If-Range')
+
+    if not header:
+        return True
+
+    # Only strong validators may be used to combine ranges.
+    if header.startswith('W/'):
+        return False
+
+    if_range = request.if_range
+
+    if if_range.date:
+        return if_range.date == _http_date(last_modified)
+
+    return if_range.etag == etag
+
+def _read_range(file: BinaryIO, length: int) -> Iterator[bytes]:
+    """
+    Yields length bytes of file from its current position and closes it.
+    """
+    try:
+        while length > 0:
+            chunk = file.read(min(MEDIA_CHUNK_SIZE, length))
+
+            if not chunk:
+                break
+
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
 def create_pagination_bar(
         current_page: int,
         total_pages: int,
         endpoint: str,
         USE_DISPLAY_VALUE: Optional[bool] = True,
+        APPROXIMATE: Optional[bool] = False,
         **kwargs
     ) -> list[dict]:
     bar = list()
@@ -57,11 +113,58 @@ def create_pagination_bar(
 
         add_item(current_page + 1, '>')
 
-        if current_page < total_pages - floor(PAGINATION_DEPTH):
+        # Last page isn't known when pages were counted approximately.
+        if APPROXIMATE:
+            add_item(total_pages, f'{total_pages}+')
+        elif current_page < total_pages - floor(PAGINATION_DEPTH):
             add_item(total_pages, '>>')
 
     return bar
 
+def conditional_response(
+    etag: str,
+    last_modified: Optional[datetime],
+    immutable: bool,
+    response_fn: Callable[[], Response]
+) -> Response:
+    """
+    Returns 304 Not Modified if the client's copy is current, without
+    creating the response, otherwise the response. Both get caching headers.
+
+    Args:
+        etag: Strong entity tag of the content
+        last_modified: When the content last changed
+        immutable: Whether the URL is versioned, so its content never changes
+        response_fn: Function creating the full response
+    """
+    last_modified = _http_date(last_modified)
+
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified:
+        fresh = last_modified <= request.if_modified_since
+    else:
+        fresh = False
+
+    response = Response(status = 304) if fresh else response_fn()
+    response.set_etag(etag)
+
+    if last_modified:
+        response.last_modified = last_modified
+
+    response.cache_control.public = True
+
+    if immutable:
+        # send_file marks responses without max_age no-cache.
+        response.cache_control.no_cache = None
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        # Stored, but revalidated (cheaply) on every use.
+        response.cache_control.no_cache = True
+
+    return response
+
 def flash_errors(form: FlaskForm) -> None:
     for field in form.errors.values():
         for error in field:
@@ -91,3 +194,62 @@ def log_user_activity(log_fn: LoggerCallable, message: str) -> None:
     signals a logged in user's action.
     """
     log_fn(f'{get_ip()} [{get_username()}]: {message}')
+
+def send_media(
+    path: Path,
+    etag: str,
+    last_modified: Optional[datetime] = None,
+    mimetype: Optional[str] = None
+) -> Response:
+    """
+    Returns response streaming a media file, or the byte range of it
+    the client asked for (e.g to seek a video), without reading it into memory.
+
+    Ranges running to the end of the file, which is how players seek,
+    are handed to the server's file wrapper so a server like waitress
+    sends them from its event loop instead of a worker thread.
+
+    Args:
+        path: Media file
+        etag: Strong entity tag of the file, checked against If-Range
+        last_modified: When the file last changed, checked against If-Range
+        mimetype: MIME type of the file, guessed from its name by default
+    """
+    size = path.stat().st_size
+    start, stop = 0, size
+    partial = False
+    byte_range = request.range if _range_applies(etag, last_modified) else None
+
+    # Multiple ranges aren't worth a multipart response, send everything.
+    if byte_range and len(byte_range.ranges) == 1:
+        bounds = byte_range.range_for_length(size)
+
+        if bounds is None:
+            response = Response(status = 416)
+            response.content_range = ContentRange('bytes', None, None, size)
+            return response
+
+        start, stop = bounds
+        partial = True
+
+    file = path.open('rb')
+    file.seek(start)
+
+    if stop == size:
+        body = wrap_file(request.environ, file, MEDIA_CHUNK_SIZE)
+    else:
+        body = _read_range(file, stop - start)
+
+    response = Response(
+        body,
+        status = 206 if partial else 200,
+        mimetype = mimetype or guess_type(path)[0] or 'application/octet-stream',
+        direct_passthrough = True
+    )
+    response.content_length = stop - start
+    response.accept_ranges = 'bytes'
+
+    if partial:
+        response.content_range = ContentRange('bytes', start, stop, size)
+
+    return response
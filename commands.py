@@ -1,7 +1,84 @@
-def add_command():
-    from api import create_post, get_hash, get_post, get_user_by_username
+from datetime import datetime
+
+import click
+
+# MD5s of existing posts, given to every process of add's pool.
+_known_md5s: frozenset[str] = frozenset()
+
+def _init_add_process(known_md5s: frozenset[str]) -> None:
+    global _known_md5s
+    _known_md5s = known_md5s
+
+def _inspect_file(path):
+    """
+    Hashes, probes and thumbnails file in a process of add's pool.
+    Returns its upload, probe and thumbnail, or why it's skipped.
+    """
+    from api import (
+        Upload,
+        encode_thumbnail,
+        get_hash,
+        get_mime,
+        get_size,
+        probe_media
+    )
+
+    upload = Upload(path, get_hash(path), get_size(path))
+
+    if upload.md5 in _known_md5s:
+        return upload, None, None, 'it already exists in the database'
+
+    info = probe_media(path)
+
+    if not info.is_media or not get_mime(path, info):
+        return upload, info, None, 'it isn\'t a media file'
+
+    return upload, info, encode_thumbnail(path, info), None
+
+@click.option(
+    '--jobs',
+    default = None,
+    type = int,
+    help = 'Processes hashing, probing and thumbnailing files, '\
+    'one per CPU by default.'
+)
+@click.option(
+    '--batch-size',
+    default = 500,
+    help = 'Amount of files to insert posts of per transaction.'
+)
+def add_command(jobs: int, batch_size: int):
+    """
+    Creates posts of files within CONTENT_PATH that aren't posted yet.
+    Files the manifest saw unchanged aren't read, moved ones are
+    found by their inode or MD5 and update their post's directory.
+    """
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+    from datetime import timedelta
+    from itertools import islice
+    from os import cpu_count
+    from stat import S_ISREG
+    from time import perf_counter
+
+    from sqlalchemy import select
+
+    from api import (
+        Manifested,
+        create_post,
+        forget_files,
+        get_post,
+        get_user_by_username,
+        load_manifest,
+        manifest_key,
+        record_files,
+        relocate_post
+    )
     from config import CONTENT_PATH
-    from db import db
+    from db import ManifestEntry, Post, begin_write, db
+
+    ManifestEntry.__table__.create(db.session.connection(), checkfirst = True)
+    db.session.commit()
 
     print('Please select user that will possess created posts.')
     user, username = None, None
@@ -16,165 +93,989 @@ def add_command():
 
     print(f'Selected user: {user.username} - ID: {user.id}')
 
+    # Duplicates are told apart in memory instead of a query per file.
+    known = set(db.session.scalars(select(Post.md5)))
+    manifest = load_manifest()
+    files = dict()
+
+    # One stat per file tells whether it has to be read at all.
     for path in sorted(CONTENT_PATH.rglob('*')):
-        if path.is_dir():   continue
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
 
-        post = get_post(get_hash(path))
+        if S_ISREG(stat.st_mode):
+            files[manifest_key(path)] = (path, stat)
 
-        if post:
-            print(f'Skipping {path}, it already exists in the database.')
-            continue
+    # Files no longer where the manifest saw them, by their inode.
+    gone = {
+        entry.inode: key
+        for key, entry in manifest.items() if key not in files
+    }
+    # Manifest entries to write along the next commit.
+    records: dict[str, Manifested] = dict()
+    kept: set[str] = set()
+    to_read = list()
+    jobs = jobs or cpu_count() or 1
+    unchanged, moved = 0, 0
 
-        post = create_post(
-            author = user,
-            path = path,
-            directory = str(path.relative_to(CONTENT_PATH).parent)
-        )
+    added, skipped, failed, done = 0, 0, 0, 0
+    batch = 0
+    start = perf_counter()
+
+    def commit(report: bool = True) -> None:
+        nonlocal added, batch, failed
 
         try:
+            record_files(records)
             db.session.commit()
-            print(f'Added: {path} - Post ID: {post.id}')
+            added += batch
+            kept.update(records)
         except Exception as exception:
             db.session.rollback()
-            print(f'Failed to add: {path} - Error: {exception}')
+            failed += batch
+            print(f'Failed to add {batch} posts - Error: {exception}')
+
+        batch = 0
+        records.clear()
+
+        if not report:
+            return
+
+        total = len(to_read)
+        elapsed = perf_counter() - start
+        rate = done / elapsed if elapsed else 0
+        eta = '?'
+
+        if rate:
+            eta = timedelta(seconds = round((total - done) / rate))
+
+        print(
+            f'{done}/{total} files ({done / max(total, 1):.1%}), '\
+            f'added {added}, moved {moved}, skipped {skipped}, '\
+            f'failed {failed} - {rate:.1f} files/s, ETA {eta}'
+        )
+
+    def relocate(path, md5: str) -> bool:
+        """
+        Moves post of MD5 to path if its file is gone, e.g moved by hand.
+        """
+        nonlocal moved
+        post = get_post(md5)
+
+        if not post or post.path.exists():
+            return False
+
+        relocate_post(post, path)
+        moved += 1
+
+        records[manifest_key(post.path)] = Manifested.of(
+            post.path.stat(),
+            md5
+        )
+
+        return True
+
+    for key, (path, stat) in files.items():
+        entry = manifest.get(key)
+
+        if entry and entry.matches(stat):
+            kept.add(key)
+            unchanged += 1
+            continue
+
+        origin = gone.pop(stat.st_ino, None)
+
+        # Renaming a file keeps its inode, size and modification time.
+        if origin and manifest[origin].matches(stat):
+            md5 = manifest[origin].md5
+
+            if not relocate(path, md5):
+                records[key] = Manifested.of(stat, md5)
+
+            if len(records) >= batch_size:
+                commit(report = False)
+
+            continue
+
+        to_read.append(path)
+
+    commit(report = False)
+    print(
+        f'Found {len(files)} files, {unchanged} are unchanged, '\
+        f'{moved} were moved and {len(to_read)} will be read.'
+    )
+
+    with ProcessPoolExecutor(
+        jobs,
+        initializer = _init_add_process,
+        initargs = (frozenset(known),)
+    ) as pool:
+        remaining = iter(to_read)
+        # Posts are created in path order, while a few files per process
+        # are inspected ahead, so memory doesn't grow with the archive.
+        pending = deque(
+            (path, pool.submit(_inspect_file, path))
+            for path in islice(remaining, jobs * 4)
+        )
+
+        while pending:
+            # Progress is reported along every transaction.
+            if done and done % batch_size == 0:
+                commit()
+
+            path, future = pending.popleft()
+
+            for next_path in islice(remaining, 1):
+                pending.append(
+                    (next_path, pool.submit(_inspect_file, next_path))
+                )
+
+            done += 1
+
+            try:
+                upload, info, thumbnail, reason = future.result()
+            except Exception as exception:
+                failed += 1
+                print(f'Failed to add: {path} - Error: {exception}')
+                continue
+
+            # Same file can be found twice within the archive.
+            if not reason and upload.md5 in known:
+                reason = 'it already exists in the database'
+
+            if reason:
+                # Files of posts can be copied elsewhere as well as moved.
+                if upload.md5 in known and relocate(path, upload.md5):
+                    continue
+
+                skipped += 1
+                key = manifest_key(path)
+                records[key] = Manifested.of(files[key][1], upload.md5)
+                print(f'Skipping {path}, {reason}.')
+                continue
+
+            try:
+                # Savepoints are only undone along their batch if
+                # the batch's transaction was begun first.
+                begin_write()
+
+                with db.session.begin_nested():
+                    post = create_post(
+                        author = user,
+                        path = upload,
+                        directory = str(path.relative_to(CONTENT_PATH).parent),
+                        info = info,
+                        defer = False,
+                        thumbnail = thumbnail
+                    )
+            except Exception as exception:
+                failed += 1
+                print(f'Failed to add: {path} - Error: {exception}')
+                continue
+
+            known.add(upload.md5)
+            batch += 1
+            # Posted files are renamed to their MD5.
+            records[manifest_key(post.path)] = Manifested.of(
+                post.path.stat(),
+                upload.md5
+            )
+
+    commit(report = bool(to_read))
+
+    # Entries of files that are gone, or were renamed to their MD5.
+    forget_files(manifest.keys() - kept)
+    db.session.commit()
+
+    elapsed = timedelta(seconds = round(perf_counter() - start))
+    print(
+        f'Added {added}, moved {moved}, skipped {skipped} and failed '\
+        f'{failed} of {len(files)} files in {elapsed}.'
+    )
+
+@click.option('--size', default = 512, help = 'Size of the video in MiB.')
+@click.option('--viewers', default = 16, help = 'Amount of concurrent viewers.')
+@click.option('--seeks', default = 8, help = 'Seeks per viewer.')
+@click.option('--threads', default = 4, help = 'Worker threads of the server.')
+def benchmark_media_command(size: int, viewers: int, seeks: int, threads: int):
+    """
+    Times seeking a large video while viewers keep seeking it concurrently,
+    served with send_file and send_media by a throwaway waitress server.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from http.client import HTTPConnection
+    from pathlib import Path
+    from random import Random
+    from statistics import fmean, median, quantiles
+    from tempfile import TemporaryDirectory
+    from threading import Event, Thread
+    from time import perf_counter, sleep
+
+    from flask import Flask, send_file
+    from waitress.server import create_server
+
+    from blueprint.utils import send_media
+
+    # What a player buffers after seeking before it plays again.
+    buffered = 1024 * 1024
+
+    with TemporaryDirectory() as directory:
+        path = Path(directory) / 'benchmark.webm'
+
+        with path.open('wb') as file:
+            file.truncate(size * 1024 * 1024)
+
+        print(f'Serving {size} MiB video with {threads} threads...')
+
+        server_app = Flask('benchmark')
+        server_app.add_url_rule(
+            '/send_file', 'send_file',
+            lambda: send_file(path, etag = 'benchmark')
+        )
+        server_app.add_url_rule(
+            '/send_media', 'send_media', lambda: send_media(path, 'benchmark')
+        )
+
+        server = create_server(
+            server_app,
+            host = '127.0.0.1',
+            port = 0,
+            threads = threads
+        )
+        Thread(target = server.run, daemon = True).start()
+
+        def seek(endpoint: str, offset: int) -> float:
+            """
+            Seeks to offset, buffers and leaves, returning seek latency.
+            """
+            connection = HTTPConnection('127.0.0.1', server.effective_port)
+            start = perf_counter()
+
+            try:
+                connection.request(
+                    'GET',
+                    f'/{endpoint}',
+                    headers = { 'Range': f'bytes={offset}-' }
+                )
+                connection.getresponse().read(buffered)
+                return perf_counter() - start
+            finally:
+                connection.close()
+
+        def view(endpoint: str, seed: int) -> list[float]:
+            rng = Random(seed)
+
+            return [
+                seek(endpoint, rng.randrange(size * 1024 * 1024 - buffered))
+                for _ in range(seeks)
+            ]
+
+        for endpoint in ('send_file', 'send_media'):
+            samples = []
+            done = Event()
+
+            def sample():
+                while not done.is_set():
+                    samples.append(server.task_dispatcher.active_count)
+                    sleep(0.005)
+
+            sampler = Thread(target = sample)
+            sampler.start()
+            start = perf_counter()
+
+            with ThreadPoolExecutor(viewers) as executor:
+                latencies = [
+                    latency * 1000
+                    for viewer in executor.map(
+                        lambda seed: view(endpoint, seed), range(viewers)
+                    )
+                    for latency in viewer
+                ]
+
+            elapsed = perf_counter() - start
+
+            # Threads still streaming to viewers who left are occupied too.
+            while server.task_dispatcher.active_count:
+                sleep(0.005)
+
+            drained = perf_counter() - start - elapsed
+            done.set()
+            sampler.join()
+
+            print(
+                f'{endpoint:>10}: {len(latencies)} seeks in {elapsed:.1f}s, '\
+                f'latency median {median(latencies):.1f}ms, '\
+                f'p95 {quantiles(latencies, n = 20)[-1]:.1f}ms, '\
+                f'busy threads mean {fmean(samples):.1f}/{threads}, '\
+                f'busy {drained:.1f}s after viewers left'
+            )
+
+        server.task_dispatcher.shutdown()
+        server.close()
+
+@click.option('--posts', default = 500_000, help = 'Amount of posts to create.')
+@click.option('--tags', default = 200, help = 'Amount of tags to create.')
+@click.option('--runs', default = 5, help = 'Repetitions per query.')
+def benchmark_search_command(posts: int, tags: int, runs: int):
+    """
+    Times tag searching strategies on a throwaway in-memory database.
+    """
+    from random import Random
+    from time import perf_counter
+
+    from sqlalchemy import create_engine, func, insert, select
+    from sqlalchemy.orm import Session
+
+    from api import SearchQuery, TagIds, compile_query
+    from db import Post, Tag, TagAssociation, User, db
+
+    rng = Random(0)
+    engine = create_engine('sqlite://')
+    db.metadata.create_all(engine)
+
+    print(f'Creating {posts} posts with {tags} tags...')
+
+    with Session(engine) as session:
+        session.execute(insert(User), [{
+            'id': 1,
+            'name': 'benchmark',
+            'role_id': 1,
+            'pw_hash': '',
+            '_key': 'benchmark'
+        }])
+        session.execute(insert(Tag), [
+            { 'id': tag_id, 'name': f'tag{tag_id}' }
+            for tag_id in range(1, tags + 1)
+        ])
+        session.execute(insert(Post), [{
+            'id': post_id,
+            'author_id': 1,
+            'md5': f'{post_id:032x}',
+            'ext': 'png',
+            'mime': 'image/png',
+            'size': 1
+        } for post_id in range(1, posts + 1)])
+
+        # Popular tags are far more common, like on a real booru.
+        weights = [ 1 / tag_id for tag_id in range(1, tags + 1) ]
+        assoc = []
+
+        for post_id in range(1, posts + 1):
+            chosen = set(rng.choices(range(1, tags + 1), weights, k = 8))
+            assoc.extend(
+                { 'post_id': post_id, 'tag_id': tag_id } for tag_id in chosen
+            )
+
+        session.execute(insert(TagAssociation), assoc)
+        session.commit()
+
+        def legacy(include: list[int], exclude: list[int]):
+            stmt = select(Post).where(Post.removed == False)
+
+            for tag_id in include:
+                stmt = stmt.where(Post.tags.any(Tag.name == f'tag{tag_id}'))
+
+            for tag_id in exclude:
+                stmt = stmt.where(~Post.tags.any(Tag.name == f'tag{tag_id}'))
+
+            return stmt
+
+        def set_based(include: list[int], exclude: list[int]):
+            query = SearchQuery(
+                include = tuple(f'tag{tag_id}' for tag_id in include),
+                exclude = tuple(f'tag{tag_id}' for tag_id in exclude)
+            )
+
+            return compile_query(
+                query,
+                TagIds(tuple(sorted(include)), tuple(sorted(exclude)))
+            )
+
+        queries = [
+            ([1, 2, 3, 4, 5], []),
+            ([2, 5, 9, 14, 20], []),
+            ([1, 2, 3, 4], [5]),
+            ([1, 3, 7, 12, 30], [2])
+        ]
+
+        for include, exclude in queries:
+            terms = ' '.join(
+                [ f'tag{t}' for t in include ] + [ f'-tag{t}' for t in exclude ]
+            )
+
+            for name, strategy in (('EXISTS', legacy), ('Set', set_based)):
+                stmt = strategy(include, exclude)
+                start = perf_counter()
+
+                for _ in range(runs):
+                    count = session.scalar(
+                        select(func.count()).select_from(stmt.subquery())
+                    )
+                    session.scalars(
+                        stmt.order_by(Post.id.desc()).limit(20)
+                    ).all()
+
+                elapsed = (perf_counter() - start) / runs * 1000
+                print(f'{name:>6}: {terms} - {count} posts, {elapsed:.1f}ms')
+
+def index_captions_command():
+    from sqlalchemy import func, select
+
+    from db import Post, create_fts, db, rebuild_fts
+
+    connection = db.session.connection()
+
+    if not create_fts(connection):
+        print('Full-text search isn\'t supported, captions are searched with LIKE.')
+        return
+
+    print('Indexing captions...')
+    rebuild_fts(connection)
+    db.session.commit()
+
+    count = db.session.scalar(
+        select(func.count(Post.id)).where(Post.caption != None)
+    )
+    print(f'Indexed {count} captions.')
+
+def _upgrade_thumbnail_table() -> None:
+    """
+    Adds columns the thumbnail tables of older databases lack,
+    and the table of thumbnail variants.
+    """
+    from alembic.migration import MigrationContext
+    from alembic.operations import Operations
+    from sqlalchemy import Column, Integer, LargeBinary, String, inspect
+
+    from db import ThumbnailVariant, db
+
+    connection = db.session.connection()
+    ThumbnailVariant.__table__.create(connection, checkfirst = True)
+
+    variant_columns = {
+        column['name']
+        for column in inspect(connection).get_columns('thumbnail_variant')
+    }
+
+    if 'width' not in variant_columns:
+        print('Upgrading thumbnail variant table...')
+        Operations(MigrationContext.configure(connection)).add_column(
+            'thumbnail_variant',
+            Column('width', Integer, nullable = True)
+        )
+
+    columns = {
+        column['name']: column
+        for column in inspect(connection).get_columns('thumbnail')
+    }
+
+    if 'path' in columns and 'mime' in columns and columns['data']['nullable']:
+        db.session.commit()
+        return
+
+    print('Upgrading thumbnail table...')
+    operations = Operations(MigrationContext.configure(connection))
+
+    # SQLite can't alter columns, the table is rebuilt.
+    with operations.batch_alter_table('thumbnail') as batch:
+        for name in ('path', 'mime'):
+            if name not in columns:
+                batch.add_column(Column(name, String, nullable = True))
+
+        batch.alter_column('data', existing_type = LargeBinary, nullable = True)
+
+    db.session.commit()
+
+@click.option(
+    '--batch-size',
+    default = 500,
+    help = 'Amount of thumbnails to fill per transaction.'
+)
+def fill_thumbnail_mimes_command(batch_size: int):
+    """
+    Stores MIME type of thumbnails made before it was stored.
+    """
+    from mimetypes import guess_type
+
+    from magic import from_buffer
+    from sqlalchemy import select, update
+
+    from db import Thumbnail, db
+
+    _upgrade_thumbnail_table()
+    filled = 0
+
+    while True:
+        rows = db.session.execute(
+            select(Thumbnail.id, Thumbnail.path)
+            .where(Thumbnail.mime == None)
+            .order_by(Thumbnail.id)
+            .limit(batch_size)
+        ).all()
+
+        if not rows:
+            break
+
+        for thumbnail_id, path in rows:
+            if path:
+                mime, _ = guess_type(path)
+            else:
+                mime = from_buffer(
+                    db.session.scalar(
+                        select(Thumbnail.data)
+                        .where(Thumbnail.id == thumbnail_id)
+                    ) or b'',
+                    mime = True
+                )
 
-def reindex_command():
-    from sqlalchemy import delete, inspect, select
+            db.session.execute(
+                update(Thumbnail)
+                .where(Thumbnail.id == thumbnail_id)
+                .values(mime = mime or 'application/octet-stream')
+            )
+
+        db.session.commit()
+
+        filled += len(rows)
+        print(f'Filled {filled} thumbnails...')
+
+    print(f'Filled MIME type of {filled} thumbnails.')
+
+def _reprocess_file(path):
+    """
+    Probes and thumbnails file of a post in a process of reprocess's pool.
+    """
+    from api import encode_thumbnail, probe_media
+
+    if not path.is_file():
+        raise FileNotFoundError(f'{path} doesn\'t exist')
+
+    info = probe_media(path)
+
+    if not info.is_media:
+        return info, None
+
+    return info, encode_thumbnail(path, info)
+
+@click.option(
+    '--search',
+    default = None,
+    help = 'Only reprocess posts matching searching terms.'
+)
+@click.option(
+    '--category',
+    'categories',
+    multiple = True,
+    type = click.Choice(('audio', 'image', 'video')),
+    help = 'Only reprocess posts of a MIME category, can be repeated.'
+)
+@click.option(
+    '--missing-thumbnail',
+    is_flag = True,
+    help = 'Only reprocess posts without a thumbnail.'
+)
+@click.option(
+    '--since',
+    default = None,
+    type = click.DateTime(),
+    help = 'Only reprocess posts created since then, in UTC.'
+)
+@click.option(
+    '--until',
+    default = None,
+    type = click.DateTime(),
+    help = 'Only reprocess posts created before then, in UTC.'
+)
+@click.option(
+    '--jobs',
+    default = None,
+    type = int,
+    help = 'Processes probing and thumbnailing files, one per CPU by default.'
+)
+@click.option(
+    '--batch-size',
+    default = 100,
+    help = 'Amount of posts to update per transaction.'
+)
+@click.option(
+    '--max-files',
+    default = None,
+    type = float,
+    help = 'Most files to read per second.'
+)
+@click.option(
+    '--max-mib',
+    default = None,
+    type = float,
+    help = 'Most MiB of files to read per second.'
+)
+@click.option(
+    '--restart',
+    is_flag = True,
+    help = 'Start over instead of resuming an interrupted run.'
+)
+def media_reprocess_command(
+    search: str,
+    categories: tuple[str, ...],
+    missing_thumbnail: bool,
+    since: datetime,
+    until: datetime,
+    jobs: int,
+    batch_size: int,
+    max_files: float,
+    max_mib: float,
+    restart: bool
+):
+    """
+    Probes and thumbnails posts again, e.g after TARGET_SIZE changed,
+    refreshing their MIME type, dimensions and size while the booru runs.
+    Progress is saved along every transaction, so an interrupted run
+    with the same filters resumes after the last post it updated.
+    """
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+    from datetime import timedelta
+    from itertools import islice
+    from os import cpu_count
+    from time import perf_counter
+
+    from sqlalchemy import func, select
 
     from api import (
-        add_vote,
-        create_tag,
-        create_thumbnail,
-        get_comment,
-        get_tag,
-        remove_vote
+        RateLimiter,
+        ReprocessCheckpoint,
+        ReprocessFilter,
+        process_post
+    )
+    from config import CONTENT_PATH
+    from db import Post, begin_write, db
+
+    # Thumbnails are made anew with variants of THUMBNAIL_SIZES.
+    _upgrade_thumbnail_table()
+
+    selection = ReprocessFilter(
+        search,
+        tuple(sorted(set(categories))),
+        missing_thumbnail,
+        since,
+        until
     )
-    from db import (
-        Post,
-        ScoreAssociation,
-        Tag,
-        Thumbnail,
-        TagAssociation,
-        db
+    checkpoint = ReprocessCheckpoint.of(selection)
+
+    if restart:
+        checkpoint = ReprocessCheckpoint(checkpoint.path)
+    elif checkpoint.last_id:
+        print(
+            f'Resuming after post #{checkpoint.last_id}, '\
+            f'{checkpoint.done} posts were reprocessed before.'
+        )
+
+    # Reading files is throttled, so the booru stays responsive.
+    file_limiter = RateLimiter(max_files) if max_files else None
+    byte_limiter = RateLimiter(max_mib * 1024 * 1024) if max_mib else None
+
+    total = db.session.scalar(
+        select(func.count())
+        .select_from(selection.select(checkpoint.last_id, None).subquery())
+    )
+    jobs = jobs or cpu_count() or 1
+    results = list()
+    done = 0
+    start = perf_counter()
+
+    print(f'Reprocessing {total} posts...')
+
+    def commit() -> None:
+        """
+        Updates posts of finished files in one transaction,
+        so the database isn't locked while files are read.
+        """
+        begin_write()
+
+        for row, outcome in results:
+            post = db.session.get(Post, row.id)
+
+            # Post was deleted while its file was read.
+            if not post:
+                continue
+
+            try:
+                if isinstance(outcome, Exception):
+                    raise outcome
+
+                with db.session.begin_nested():
+                    process_post(post, *outcome)
+            except Exception as exception:
+                checkpoint.failed += 1
+                print(f'Failed to reprocess post #{row.id} - Error: {exception}')
+                continue
+
+            checkpoint.done += 1
+
+        db.session.commit()
+
+        checkpoint.last_id = results[-1][0].id
+        checkpoint.save()
+        results.clear()
+
+        elapsed = perf_counter() - start
+        rate = done / elapsed if elapsed else 0
+        eta = '?'
+
+        if rate:
+            eta = timedelta(seconds = round((total - done) / rate))
+
+        print(
+            f'{done}/{total} posts ({done / max(total, 1):.1%}), '\
+            f'failed {checkpoint.failed} - {rate:.1f} posts/s, ETA {eta}'
+        )
+
+    def submit(pool: ProcessPoolExecutor, row):
+        if file_limiter:
+            file_limiter.acquire()
+
+        if byte_limiter:
+            byte_limiter.acquire(row.size)
+
+        path = CONTENT_PATH / (row.directory or '') / f'{row.md5}.{row.ext}'
+        return row, pool.submit(_reprocess_file, path)
+
+    pool = ProcessPoolExecutor(jobs)
+
+    try:
+        remaining = selection.posts(checkpoint.last_id, batch_size)
+        # Posts are updated in ID order, while a few files per process
+        # are read ahead, so the checkpoint never skips a post.
+        pending = deque(
+            submit(pool, row) for row in islice(remaining, jobs * 4)
+        )
+
+        while pending:
+            row, future = pending.popleft()
+
+            for next_row in islice(remaining, 1):
+                pending.append(submit(pool, next_row))
+
+            try:
+                results.append((row, future.result()))
+            except Exception as exception:
+                results.append((row, exception))
+
+            done += 1
+
+            if len(results) >= batch_size:
+                commit()
+
+        if results:
+            commit()
+    except KeyboardInterrupt:
+        pool.shutdown(cancel_futures = True)
+        db.session.rollback()
+        print(
+            f'Interrupted after post #{checkpoint.last_id}, '\
+            'run the same command again to resume.'
+        )
+        return
+
+    pool.shutdown()
+    checkpoint.clear()
+
+    elapsed = timedelta(seconds = round(perf_counter() - start))
+    print(
+        f'Reprocessed {checkpoint.done} posts, failed {checkpoint.failed} '\
+        f'in {elapsed}.'
     )
 
-    print('Reindexing posts...')
-
-    # Create offline models of posts.
-    posts = db.session.scalars(
-        select(Post)
-        .order_by(Post.created.asc())
-    ).all()
-
-    post_data = []
-    post_meta = {}
-
-    for post in posts:
-        data = {
-            c.key: getattr(post, c.key)
-            for c in inspect(post).mapper.column_attrs
-        }
-        data.pop('id', None)  # We don't want to reassign the same ID.
-
-        meta = {
-            'comments': [
-                {
-                    'id': comment.id,
-                    'score': [
-                        {
-                            'user_id': score.user_id,
-                            'value': score.value
-                        } for score in comment.scores
-                    ]
-                } for comment in post.comments
-            ],
-            'score': [
-                {
-                    'id': score.target_id,
-                    'user_id': score.user_id,
-                    'value': score.value
-                } for score in post.scores
-            ],
-            'tags': [ tag.name for tag in post.tags ]
-        }
-
-        post_data.append(data)
-        post_meta[post.md5] = meta
-
-    # Delete all rows in Post/Score/Tag/Thumbnail tables.
-    db.session.execute(delete(Post))
-    db.session.execute(delete(ScoreAssociation))
-    db.session.execute(delete(Tag))
-    db.session.execute(delete(Thumbnail))
-    db.session.execute(delete(TagAssociation))
+@click.option(
+    '--batch-size',
+    default = 500,
+    help = 'Amount of thumbnails to move per transaction.'
+)
+def move_thumbnails_command(batch_size: int):
+    """
+    Moves thumbnail images out of the database into the filesystem store.
+    """
+    from sqlalchemy import select, update
+
+    from api import ThumbnailType, filesystem_store
+    from db import Post, Thumbnail, ThumbnailVariant, db
+
+    _upgrade_thumbnail_table()
+    moved = 0
+
+    while True:
+        rows = db.session.execute(
+            select(Thumbnail.id, Thumbnail.data, Post.md5)
+            .join(Thumbnail.post)
+            .where(Thumbnail.path == None, Thumbnail.data != None)
+            .order_by(Thumbnail.id)
+            .limit(batch_size)
+        ).all()
+
+        if not rows:
+            break
+
+        for thumbnail_id, data, md5 in rows:
+            if data.startswith(b'\x89PNG'):
+                ext = ThumbnailType.PNG
+            else:
+                ext = ThumbnailType.JPEG
+
+            key = filesystem_store.key(md5, ext.value)
+
+            # Files are written before the rows point at them,
+            # an interrupted move is continued by running it again.
+            filesystem_store.write(key, data)
+            db.session.execute(
+                update(Thumbnail)
+                .where(Thumbnail.id == thumbnail_id)
+                .values(path = key, data = None, mime = ext.mime)
+            )
+
+        db.session.commit()
+        db.session.expunge_all()
+
+        moved += len(rows)
+        print(f'Moved {moved} thumbnails...')
+
+    types = { ext.mime: ext for ext in ThumbnailType }
+
+    while True:
+        rows = db.session.execute(
+            select(
+                ThumbnailVariant.id,
+                ThumbnailVariant.data,
+                ThumbnailVariant.mime,
+                ThumbnailVariant.size,
+                Post.md5
+            )
+            .join(ThumbnailVariant.thumbnail)
+            .join(Thumbnail.post)
+            .where(ThumbnailVariant.path == None, ThumbnailVariant.data != None)
+            .order_by(ThumbnailVariant.id)
+            .limit(batch_size)
+        ).all()
+
+        if not rows:
+            break
+
+        for variant_id, data, mime, size, md5 in rows:
+            key = filesystem_store.key(md5, types[mime].value, size)
+
+            filesystem_store.write(key, data)
+            db.session.execute(
+                update(ThumbnailVariant)
+                .where(ThumbnailVariant.id == variant_id)
+                .values(path = key, data = None)
+            )
+
+        db.session.commit()
+        db.session.expunge_all()
+
+        moved += len(rows)
+        print(f'Moved {moved} thumbnails...')
+
+    print(f'Moved {moved} thumbnails to {filesystem_store.root}.')
+
+    if moved:
+        print('Run VACUUM on the database to reclaim space of the images.')
+
+@click.option(
+    '--batch-size',
+    default = 500,
+    help = 'Amount of posts to manifest per transaction.'
+)
+def rebuild_manifest_command(batch_size: int):
+    """
+    Rebuilds manifest of files flask add saw from posts, trusting their MD5.
+    """
+    from api import rebuild_manifest
+    from db import ManifestEntry, db
+
+    ManifestEntry.__table__.create(db.session.connection(), checkfirst = True)
+
+    print('Rebuilding manifest...')
+    count = rebuild_manifest(batch_size)
+
+    print(f'Manifested {count} files of posts.')
+
+def recount_scores_command():
+    from db import Comment, Post, add_count_column, db, recount_scores
+
+    connection = db.session.connection()
+
+    # Databases created before scores were stored lack the columns.
+    for element in (Post, Comment):
+        if add_count_column(connection, element.__table__.c.score):
+            print(f'Added score column of {element.__tablename__}.')
+
+    print('Recounting scores...')
+    count = recount_scores(connection)
     db.session.commit()
-    db.session.expire_all()
-    db.session.expunge_all()
 
-    # Convert offline models to online instances.
-    db.session.bulk_insert_mappings(Post, post_data)
+    print(f'Corrected score of {count} posts and comments.')
+
+def recount_tags_command():
+    from db import Tag, add_count_column, create_count_triggers, db, recount_tags
+
+    connection = db.session.connection()
+
+    # Databases created before counts were stored lack the column.
+    if add_count_column(connection, Tag.__table__.c.post_count):
+        print('Added post count column.')
+
+    create_count_triggers(connection)
+
+    print('Recounting tags...')
+    count = recount_tags(connection)
     db.session.commit()
 
-    # Re-assign comments, scores, tags, thumbnails to posts.
-    new_posts = db.session.scalars(
-        select(Post)
-        .order_by(Post.id.asc())
-    ).all()
-    tag_cache = dict()
-
-    for post in new_posts:
-        meta = post_meta[post.md5]
-
-        with db.session.no_autoflush:
-            # Comments.
-            for comment_data in meta['comments']:
-                comment = get_comment(comment_data['id'])
-
-                for score in comment_data['score']:
-                    if score['value'] == 1:
-                        add_vote(
-                            comment.id,
-                            score['user_id'],
-                            'comment'
-                        )
-                    else:
-                        remove_vote(
-                            comment.id,
-                            score['user_id'],
-                            'comment'
-                        )
-
-                if comment and comment not in post.comments:
-                    post.comments.append(comment)
-
-            # Scores.
-            for score in meta['score']:
-                if score['value'] == 1:
-                    add_vote(post.id, score['user_id'], 'post')
-                else:
-                    remove_vote(post.id, score['user_id'], 'post')
-
-            # Tags.
-            for tag_name in set(meta['tags']):
-                tag = tag_cache.get(tag_name) or get_tag(tag_name)
-
-                if not tag:
-                    tag = create_tag(tag_name)
-
-                tag_cache[tag_name] = tag
-                
-                if tag not in post.tags:
-                    post.tags.append(tag)
-
-            # Thumbnail.
-            thumb = create_thumbnail(post)
-
-            if thumb:
-                db.session.add(thumb)
+    print(f'Corrected post count of {count} tags.')
+
+def recount_users_command():
+    from db import UserStats, create_count_triggers, db, recount_users
 
+    connection = db.session.connection()
+
+    UserStats.__table__.create(connection, checkfirst = True)
+    create_count_triggers(connection)
+
+    print('Recounting user stats...')
+    count = recount_users(connection)
     db.session.commit()
-    db.session.execute(db.text('VACUUM'))
-    print("Reindexing complete.")
+
+    print(f'Corrected stats of {count} users.')
+
+@click.option(
+    '--batch-size',
+    default = 5000,
+    help = 'Amount of rows to copy per transaction.'
+)
+@click.option(
+    '--vacuum',
+    is_flag = True,
+    help = 'Reclaim free space afterwards, rewriting the whole database.'
+)
+def reindex_command(batch_size: int, vacuum: bool):
+    from db import db, reindex_posts
+
+    print('Stop the web server and workers before reindexing.')
+
+    # Tables are dropped and renamed outside of the session.
+    db.session.close()
+
+    with db.engine.connect().execution_options(
+        isolation_level = 'AUTOCOMMIT'
+    ) as connection:
+        count = reindex_posts(connection, batch_size, report = print)
+
+        if count and vacuum:
+            print('Vacuuming database...')
+            connection.exec_driver_sql('VACUUM')
+
+    print(f'Reindexing complete, renumbered {count} posts.')
 
 def setup_roles_command():
     from db import Permission, Role, db
@@ -219,3 +1120,92 @@ def setup_roles_command():
 
     db.session.add_all([admin, mod, user, janitor])
     db.session.commit()
+
+def _upgrade_job_tables() -> None:
+    """
+    Creates the job table and post status column older databases lack.
+    """
+    from alembic.migration import MigrationContext
+    from alembic.operations import Operations
+    from sqlalchemy import Column, String, inspect
+
+    from db import Job, PostStatus, db
+
+    connection = db.session.connection()
+    Job.__table__.create(connection, checkfirst = True)
+
+    columns = {
+        column['name'] for column in inspect(connection).get_columns('post')
+    }
+
+    if 'status' not in columns:
+        print('Adding post status column...')
+        Operations(MigrationContext.configure(connection)).add_column(
+            'post',
+            Column(
+                'status',
+                String(length = 10),
+                nullable = False,
+                server_default = PostStatus.READY.value
+            )
+        )
+
+    db.session.commit()
+
+@click.option('--threads', default = 2, help = 'Amount of jobs to run at once.')
+@click.option(
+    '--poll-interval',
+    default = 1.0,
+    help = 'Seconds to wait for jobs when none are due.'
+)
+@click.option('--burst', is_flag = True, help = 'Exit once no jobs are due.')
+def worker_command(threads: int, poll_interval: float, burst: bool):
+    """
+    Runs queued jobs, such as probing and thumbnailing uploads.
+    """
+    from os import getpid
+    from socket import gethostname
+    from threading import Event, Thread
+
+    from flask import current_app
+
+    from api import run_worker
+
+    _upgrade_job_tables()
+
+    app = current_app._get_current_object()
+    stop = Event()
+    counts = [0] * threads
+
+    # ffmpeg runs in its own process, so threads are enough to run
+    # jobs at once. Each has its own app context and database session.
+    def work(index: int) -> None:
+        with app.app_context():
+            counts[index] = run_worker(
+                f'{gethostname()}:{getpid()}:{index}',
+                stop,
+                poll_interval,
+                burst
+            )
+
+    workers = [
+        Thread(target = work, args = (index,), name = f'worker-{index}')
+        for index in range(threads)
+    ]
+
+    for worker in workers:
+        worker.start()
+
+    print(f'Started {threads} workers, press Ctrl+C to stop.')
+
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        print('Stopping after the running jobs...')
+        stop.set()
+
+        for worker in workers:
+            worker.join()
+
+    print(f'Ran {sum(counts)} jobs.')
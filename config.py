@@ -23,7 +23,36 @@ ALLOW_POSTS = getenv('ALLOW_POSTS') == 'true'
 ## Allow users to sign-up/login to accounts?
 ALLOW_USERS = getenv('ALLOW_USERS') == 'true'
 ## Thumbnail dimensions for user uploaded content
-TARGET_SIZE = getenv('TARGET_SIZE')
+TARGET_SIZE = int(getenv('TARGET_SIZE'))
+## Shorter sides in pixels of additional thumbnail sizes browsers pick
+## from by their screen, e.g 150,300,600, none if empty
+THUMBNAIL_SIZES = [
+    int(size) for size in getenv('THUMBNAIL_SIZES', '').split(',') if size
+]
+## Format of the additional sizes, 'webp', or 'jpg' for JPEG
+## (PNG if transparent) like TARGET_SIZE thumbnails
+THUMBNAIL_FORMAT = getenv('THUMBNAIL_FORMAT', 'webp')
+## Where new thumbnails are stored, 'database' or 'filesystem'
+THUMBNAIL_STORE = getenv('THUMBNAIL_STORE', 'database')
+## Which directory stores thumbnails of the filesystem store
+THUMBNAIL_PATH = Path(getenv('THUMBNAIL_PATH', 'thumbnails'))
+## Let a fronting proxy send thumbnail files,
+## 'x-accel' (nginx), 'x-sendfile' (Apache, lighttpd) or empty
+THUMBNAIL_SENDFILE = getenv('THUMBNAIL_SENDFILE', '')
+## Internal location THUMBNAIL_PATH is served at for X-Accel-Redirect
+THUMBNAIL_ACCEL_PREFIX = getenv('THUMBNAIL_ACCEL_PREFIX', '/_thumbnails')
+
+# Control variables for background jobs.
+## Probe and thumbnail uploads in a worker (flask worker) instead of
+## while uploading?
+BACKGROUND_JOBS = getenv('BACKGROUND_JOBS') == 'true'
+## How many times a job is attempted before it's marked failed
+JOB_MAX_ATTEMPTS = int(getenv('JOB_MAX_ATTEMPTS', 5))
+## How many seconds a failed job waits before its first retry,
+## doubled after every further attempt
+JOB_BACKOFF = int(getenv('JOB_BACKOFF', 30))
+## How many seconds a job may run before another worker takes it over
+JOB_TIMEOUT = int(getenv('JOB_TIMEOUT', 600))
 
 # Control variables for pagination.
 ## How many posts per page to display?
@@ -34,6 +63,23 @@ DEFAULT_SORT = getenv('DEFAULT_SORT')
 DEFAULT_SORT_DIR = getenv('DEFAULT_SORT_DIR')
 ## Posts per page maximum possible value
 LIMIT_THRESHOLD = int(getenv('LIMIT_THRESHOLD'))
+## How many parsed and compiled search queries to keep in memory
+SEARCH_CACHE_SIZE = int(getenv('SEARCH_CACHE_SIZE', 512))
+## Answer tag searches from an in-memory index?
+SEARCH_INDEX = getenv('SEARCH_INDEX') == 'true'
+## How many element counts to keep in memory
+COUNT_CACHE_SIZE = int(getenv('COUNT_CACHE_SIZE', 1024))
+## How many seconds a count is kept, bounds how long changes made by
+## other processes (e.g CLI commands) can go unnoticed
+COUNT_CACHE_TTL = int(getenv('COUNT_CACHE_TTL', 60))
+## Stop counting after this many elements, 0 always counts all of them
+COUNT_APPROXIMATE_AFTER = int(getenv('COUNT_APPROXIMATE_AFTER', 0))
+## How many pages rendered for anonymous users to keep in memory,
+## 0 renders every page
+PAGE_CACHE_SIZE = int(getenv('PAGE_CACHE_SIZE', 256))
+## How many seconds a page is kept, bounds how long changes made by
+## other processes (e.g CLI commands) can go unnoticed
+PAGE_CACHE_TTL = int(getenv('PAGE_CACHE_TTL', 30))
 
 # Leveling variables.
 ## How many scores count as one level?
@@ -1,2 +1,12 @@
-from .db import db
+from .db import begin_write, db
 from .models import *
+from .events import ChangeSet, subscribe
+from .counts import (
+    add_count_column,
+    create_count_triggers,
+    recount_scores,
+    recount_tags,
+    recount_users
+)
+from .fts import create_fts, fts_available, post_fts, rebuild_fts
+from .reindex import reindex_posts
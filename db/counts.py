@@ -0,0 +1,235 @@
+from logging import getLogger
+
+from sqlalchemy import (
+    Column,
+    ColumnElement,
+    Connection,
+    TextClause,
+    event,
+    func,
+    insert,
+    inspect,
+    or_,
+    select,
+    text,
+    update
+)
+
+from .db import db
+from .models import (
+    Comment,
+    Post,
+    ScoreAssociation,
+    Tag,
+    TagAssociation,
+    User,
+    UserStats
+)
+
+# Keep stored counts in step with association rows,
+# whichever way they're inserted or deleted.
+TAG_COUNT_DDL = (
+    'CREATE TRIGGER IF NOT EXISTS tag_post_count_insert '\
+    'AFTER INSERT ON tag_association BEGIN '\
+    'UPDATE tag SET post_count = post_count + 1 WHERE id = new.tag_id; END',
+    'CREATE TRIGGER IF NOT EXISTS tag_post_count_delete '\
+    'AFTER DELETE ON tag_association BEGIN '\
+    'UPDATE tag SET post_count = post_count - 1 WHERE id = old.tag_id; END',
+    'CREATE TRIGGER IF NOT EXISTS tag_post_count_update '\
+    'AFTER UPDATE OF tag_id ON tag_association BEGIN '\
+    'UPDATE tag SET post_count = post_count - 1 WHERE id = old.tag_id; '\
+    'UPDATE tag SET post_count = post_count + 1 WHERE id = new.tag_id; END'
+)
+
+# Keep user stats in step with their posts, comments and their scores,
+# which votes update. Every user gets a row, older users get one on demand.
+USER_STATS_DDL = (
+    'CREATE TRIGGER IF NOT EXISTS user_stats_user_insert '\
+    'AFTER INSERT ON "user" BEGIN '\
+    'INSERT OR IGNORE INTO user_stats (user_id) VALUES (new.id); END',
+    'CREATE TRIGGER IF NOT EXISTS user_stats_post_insert '\
+    'AFTER INSERT ON post BEGIN '\
+    'INSERT OR IGNORE INTO user_stats (user_id) VALUES (new.author_id); '\
+    'UPDATE user_stats SET post_count = post_count + 1, '\
+    'score = score + new.score, '\
+    'last_upload = max(coalesce(last_upload, new.created), new.created) '\
+    'WHERE user_id = new.author_id; END',
+    'CREATE TRIGGER IF NOT EXISTS user_stats_post_delete '\
+    'AFTER DELETE ON post BEGIN '\
+    'UPDATE user_stats SET post_count = post_count - 1, '\
+    'score = score - old.score, '\
+    'last_upload = (SELECT max(created) FROM post '\
+    'WHERE author_id = old.author_id) '\
+    'WHERE user_id = old.author_id; END',
+    'CREATE TRIGGER IF NOT EXISTS user_stats_post_update '\
+    'AFTER UPDATE OF score, author_id ON post BEGIN '\
+    'INSERT OR IGNORE INTO user_stats (user_id) VALUES (new.author_id); '\
+    'UPDATE user_stats SET score = score - old.score, '\
+    'post_count = post_count - (old.author_id IS NOT new.author_id) '\
+    'WHERE user_id = old.author_id; '\
+    'UPDATE user_stats SET score = score + new.score, '\
+    'post_count = post_count + (old.author_id IS NOT new.author_id) '\
+    'WHERE user_id = new.author_id; END',
+    'CREATE TRIGGER IF NOT EXISTS user_stats_comment_insert '\
+    'AFTER INSERT ON comment BEGIN '\
+    'INSERT OR IGNORE INTO user_stats (user_id) VALUES (new.author_id); '\
+    'UPDATE user_stats SET comment_count = comment_count + 1, '\
+    'score = score + new.score WHERE user_id = new.author_id; END',
+    'CREATE TRIGGER IF NOT EXISTS user_stats_comment_delete '\
+    'AFTER DELETE ON comment BEGIN '\
+    'UPDATE user_stats SET comment_count = comment_count - 1, '\
+    'score = score - old.score WHERE user_id = old.author_id; END',
+    'CREATE TRIGGER IF NOT EXISTS user_stats_comment_update '\
+    'AFTER UPDATE OF score, author_id ON comment BEGIN '\
+    'INSERT OR IGNORE INTO user_stats (user_id) VALUES (new.author_id); '\
+    'UPDATE user_stats SET score = score - old.score, '\
+    'comment_count = comment_count - (old.author_id IS NOT new.author_id) '\
+    'WHERE user_id = old.author_id; '\
+    'UPDATE user_stats SET score = score + new.score, '\
+    'comment_count = comment_count + (old.author_id IS NOT new.author_id) '\
+    'WHERE user_id = new.author_id; END'
+)
+
+logger = getLogger('app_logger')
+
+def add_count_column(connection: Connection, column: Column) -> bool:
+    """
+    Adds stored count column and its index to a table created before
+    the column existed. Returns whether the column was added.
+
+    Args:
+        connection: Database connection
+        column: Column of a mapped table
+    """
+    table = column.table
+    columns = { info['name'] for info in inspect(connection).get_columns(table.name) }
+
+    if column.name in columns:
+        return False
+
+    default = column.server_default.arg
+
+    if isinstance(default, TextClause):
+        default = default.text
+
+    connection.execute(text(
+        f'ALTER TABLE {table.name} ADD COLUMN {column.name} '\
+        f'{column.type.compile(connection.dialect)} NOT NULL DEFAULT {default}'
+    ))
+
+    for index in table.indexes:
+        if column in index.columns.values():
+            index.create(connection, checkfirst = True)
+
+    logger.info(f'Added {table.name}.{column.name} column')
+    return True
+
+def create_count_triggers(connection: Connection) -> None:
+    """
+    Creates triggers maintaining stored counts.
+
+    Args:
+        connection: Database connection
+    """
+    if connection.dialect.name != 'sqlite':
+        logger.warning(
+            f'Stored counts aren\'t maintained on {connection.dialect.name}'
+        )
+        return
+
+    for statement in TAG_COUNT_DDL + USER_STATS_DDL:
+        connection.execute(text(statement))
+
+def recount_tags(connection: Connection) -> int:
+    """
+    Recomputes post count of every tag in one grouped query
+    and returns amount of updated tags.
+
+    Args:
+        connection: Database connection
+    """
+    counts = (
+        select(func.count())
+        .where(TagAssociation.tag_id == Tag.id)
+        .scalar_subquery()
+    )
+
+    return connection.execute(
+        update(Tag)
+        .values(post_count = counts)
+        .where(Tag.post_count != counts)
+    ).rowcount
+
+def recount_scores(connection: Connection) -> int:
+    """
+    Recomputes score of every post and comment from their votes
+    and returns amount of updated elements.
+
+    Args:
+        connection: Database connection
+    """
+    count = 0
+
+    for element in (Post, Comment):
+        scores = (
+            select(func.coalesce(func.sum(ScoreAssociation.value), 0))
+            .where(
+                ScoreAssociation.target_id == element.id,
+                ScoreAssociation.target_type == element.__name__.lower()
+            )
+            .scalar_subquery()
+        )
+
+        count += connection.execute(
+            update(element)
+            .values(score = scores)
+            .where(element.score != scores)
+        ).rowcount
+
+    return count
+
+def recount_users(connection: Connection) -> int:
+    """
+    Recomputes stats of every user in one grouped query
+    and returns amount of updated users.
+
+    Args:
+        connection: Database connection
+    """
+    connection.execute(
+        insert(UserStats).from_select(
+            ['user_id'],
+            select(User.id).where(
+                User.id.not_in(select(UserStats.user_id))
+            )
+        )
+    )
+
+    def rollup(element, aggregate) -> ColumnElement:
+        return (
+            select(aggregate)
+            .where(element.author_id == UserStats.user_id)
+            .scalar_subquery()
+        )
+
+    values = {
+        'score': rollup(Post, func.coalesce(func.sum(Post.score), 0)) +\
+        rollup(Comment, func.coalesce(func.sum(Comment.score), 0)),
+        'post_count': rollup(Post, func.count()),
+        'comment_count': rollup(Comment, func.count()),
+        'last_upload': rollup(Post, func.max(Post.created))
+    }
+
+    return connection.execute(
+        update(UserStats)
+        .values(values)
+        .where(or_(*(
+            getattr(UserStats, key).is_distinct_from(value)
+            for key, value in values.items()
+        )))
+    ).rowcount
+
+# Triggers span several tables, create them once all of them exist.
+@event.listens_for(db.metadata, 'after_create')
+def _create_count_triggers(target, connection: Connection, **kwargs) -> None:
+    create_count_triggers(connection)
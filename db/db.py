@@ -1,3 +1,18 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import text
 
 db = SQLAlchemy()
+
+def begin_write() -> None:
+    """
+    Begins the session's transaction as a write transaction up front.
+    SQLite's driver only begins transactions before writes, so savepoints
+    taken before the first write would otherwise commit on their own.
+    """
+    connection = db.session.connection()
+
+    if connection.dialect.name != 'sqlite':
+        return
+
+    if not connection.connection.dbapi_connection.in_transaction:
+        connection.execute(text('BEGIN IMMEDIATE'))
@@ -0,0 +1,226 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+from logging import getLogger
+from typing import Callable
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, SessionTransaction
+
+from .db import db
+from .models import Post, Tag, Thumbnail, ThumbnailVariant
+
+CHANGES_KEY = 'changes'
+COMMITTED_KEY = 'committed'
+
+logger = getLogger('app_logger')
+
+@dataclass
+class ChangeSet:
+    """
+    Represents what a committed transaction has changed.
+    """
+    # Names of every model class with written rows.
+    models: set[str] = field(default_factory = set)
+
+    # Post ID mapped to its removal state.
+    posts_created: dict[int, bool] = field(default_factory = dict)
+    posts_removed: dict[int, bool] = field(default_factory = dict)
+    posts_deleted: set[int] = field(default_factory = set)
+
+    # Post ID mapped to tag IDs.
+    tags_added: defaultdict[int, set[int]] = field(
+        default_factory = lambda: defaultdict(set)
+    )
+    tags_removed: defaultdict[int, set[int]] = field(
+        default_factory = lambda: defaultdict(set)
+    )
+
+    # Tag ID mapped to its new name.
+    tags_named: dict[int, str] = field(default_factory = dict)
+    tags_deleted: set[int] = field(default_factory = set)
+
+    # Paths of thumbnail images within THUMBNAIL_PATH, whose rows
+    # were created or deleted.
+    thumbnail_paths_added: set[str] = field(default_factory = set)
+    thumbnail_paths_deleted: set[str] = field(default_factory = set)
+
+    def add_tag(self, post_id: int, tag_id: int) -> None:
+        if tag_id in self.tags_removed.get(post_id, ()):
+            self.tags_removed[post_id].discard(tag_id)
+        else:
+            self.tags_added[post_id].add(tag_id)
+
+    def remove_tag(self, post_id: int, tag_id: int) -> None:
+        if tag_id in self.tags_added.get(post_id, ()):
+            self.tags_added[post_id].discard(tag_id)
+        else:
+            self.tags_removed[post_id].add(tag_id)
+
+    def add_thumbnail_path(self, path: str) -> None:
+        self.thumbnail_paths_deleted.discard(path)
+        self.thumbnail_paths_added.add(path)
+
+    def delete_thumbnail_path(self, path: str) -> None:
+        self.thumbnail_paths_added.discard(path)
+        self.thumbnail_paths_deleted.add(path)
+
+    def merge(self, other: 'ChangeSet') -> None:
+        """
+        Applies changes that happened after this change set.
+        """
+        self.models |= other.models
+        self.posts_created.update(other.posts_created)
+        self.posts_removed.update(other.posts_removed)
+        self.posts_deleted |= other.posts_deleted
+
+        for post_id, tag_ids in other.tags_added.items():
+            for tag_id in tag_ids:
+                self.add_tag(post_id, tag_id)
+
+        for post_id, tag_ids in other.tags_removed.items():
+            for tag_id in tag_ids:
+                self.remove_tag(post_id, tag_id)
+
+        self.tags_named.update(other.tags_named)
+        self.tags_deleted |= other.tags_deleted
+
+        for path in other.thumbnail_paths_deleted:
+            self.delete_thumbnail_path(path)
+
+        for path in other.thumbnail_paths_added:
+            self.add_thumbnail_path(path)
+
+Subscriber = Callable[[ChangeSet], None]
+subscribers: list[Subscriber] = []
+
+def subscribe(callback: Subscriber) -> Subscriber:
+    """
+    Registers callback to receive changes of every committed transaction.
+
+    Args:
+        callback: Function receiving a ChangeSet
+    """
+    subscribers.append(callback)
+    return callback
+
+def _changes(session: Session, transaction: SessionTransaction) -> ChangeSet:
+    return session.info.setdefault(CHANGES_KEY, {}).setdefault(
+        transaction,
+        ChangeSet()
+    )
+
+def _record_tags(changes: ChangeSet, obj: Post | Tag) -> None:
+    """
+    Records added and removed tags from either side of the relationship.
+    """
+    if isinstance(obj, Post):
+        history = inspect(obj).attrs.tags.history
+
+        for tag in history.added:
+            changes.add_tag(obj.id, tag.id)
+
+        for tag in history.deleted:
+            changes.remove_tag(obj.id, tag.id)
+    else:
+        history = inspect(obj).attrs.posts.history
+
+        for post in history.added:
+            changes.add_tag(post.id, obj.id)
+
+        for post in history.deleted:
+            changes.remove_tag(post.id, obj.id)
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_changes(session: Session, flush_context) -> None:
+    transaction = session.get_nested_transaction() or\
+    session.get_transaction()
+    changes = _changes(session, transaction)
+
+    for obj in session.new:
+        changes.models.add(type(obj).__name__)
+
+        if isinstance(obj, Post):
+            changes.posts_created[obj.id] = bool(obj.removed)
+            _record_tags(changes, obj)
+        elif isinstance(obj, Tag):
+            changes.tags_named[obj.id] = obj.name
+            _record_tags(changes, obj)
+
+    for obj in session.dirty:
+        if not session.is_modified(obj):
+            continue
+
+        changes.models.add(type(obj).__name__)
+        state = inspect(obj)
+
+        if isinstance(obj, Post):
+            if state.attrs.removed.history.has_changes():
+                changes.posts_removed[obj.id] = bool(obj.removed)
+
+            _record_tags(changes, obj)
+        elif isinstance(obj, Tag):
+            if state.attrs.name.history.has_changes():
+                changes.tags_named[obj.id] = obj.name
+
+            _record_tags(changes, obj)
+
+    for obj in session.deleted:
+        changes.models.add(type(obj).__name__)
+
+        if isinstance(obj, Post):
+            changes.posts_deleted.add(obj.id)
+        elif isinstance(obj, Tag):
+            changes.tags_deleted.add(obj.id)
+        elif isinstance(obj, (Thumbnail, ThumbnailVariant)) and obj.path:
+            changes.delete_thumbnail_path(obj.path)
+
+    # Images regenerated at the same path are kept, so new rows
+    # are recorded after the deleted ones.
+    for obj in session.new:
+        if isinstance(obj, (Thumbnail, ThumbnailVariant)) and obj.path:
+            changes.add_thumbnail_path(obj.path)
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_rolled_back_changes(session: Session) -> None:
+    # Savepoints end before their soft rollback, which would merge
+    # their changes into the outer transaction first.
+    transaction = session.get_nested_transaction() or\
+    session.get_transaction()
+    session.info.get(CHANGES_KEY, {}).pop(transaction, None)
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_changes(
+    session: Session,
+    previous_transaction: SessionTransaction
+) -> None:
+    session.info.get(CHANGES_KEY, {}).pop(previous_transaction, None)
+
+@event.listens_for(db.session, 'after_commit')
+def _mark_committed(session: Session) -> None:
+    session.info[COMMITTED_KEY] = True
+
+@event.listens_for(db.session, 'after_transaction_end')
+def _dispatch_changes(
+    session: Session,
+    transaction: SessionTransaction
+) -> None:
+    pending: dict = session.info.get(CHANGES_KEY, {})
+    changes = pending.pop(transaction, None)
+
+    if transaction.parent is not None:
+        # Savepoint released, its changes belong to the outer transaction.
+        if changes:
+            _changes(session, transaction.parent).merge(changes)
+
+        return
+
+    if not session.info.pop(COMMITTED_KEY, False) or not changes:
+        return
+
+    for callback in subscribers:
+        try:
+            callback(changes)
+        except Exception as exception:
+            logger.error(
+                f'Change subscriber {callback.__name__} failed: {exception}'
+            )
@@ -0,0 +1,93 @@
+from logging import getLogger
+
+from sqlalchemy import Connection, column, event, table, text
+from sqlalchemy.exc import OperationalError
+
+from .db import db
+from .models import Post
+
+FTS_TABLE = 'post_fts'
+
+# External content table, captions are only stored once in post.
+FTS_DDL = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('\
+    'caption, content = \'post\', content_rowid = \'id\', '\
+    'tokenize = \'unicode61 remove_diacritics 2\')',
+    f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON post '\
+    f'BEGIN INSERT INTO {FTS_TABLE} (rowid, caption) '\
+    'VALUES (new.id, new.caption); END',
+    f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON post '\
+    f'BEGIN INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, caption) '\
+    'VALUES (\'delete\', old.id, old.caption); END',
+    f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update '\
+    'AFTER UPDATE OF caption ON post '\
+    f'BEGIN INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, caption) '\
+    'VALUES (\'delete\', old.id, old.caption); '\
+    f'INSERT INTO {FTS_TABLE} (rowid, caption) '\
+    'VALUES (new.id, new.caption); END'
+)
+
+# Lightweight table construct to query the index with.
+post_fts = table(FTS_TABLE, column('rowid'), column('caption'), column('rank'))
+
+logger = getLogger('app_logger')
+
+_available: dict[str, bool] = {}
+
+def create_fts(connection: Connection) -> bool:
+    """
+    Creates caption full-text index and triggers keeping it in sync.
+    Returns whether the index exists afterwards, which it can't
+    without SQLite compiled with FTS5.
+
+    Args:
+        connection: Database connection
+    """
+    if connection.dialect.name != 'sqlite':
+        return False
+
+    try:
+        for statement in FTS_DDL:
+            connection.execute(text(statement))
+    except OperationalError as exception:
+        logger.warning(f'Caption full-text index unavailable: {exception}')
+        return False
+
+    _available[str(connection.engine.url)] = True
+    return True
+
+def rebuild_fts(connection: Connection) -> None:
+    """
+    Refills caption full-text index from every post.
+
+    Args:
+        connection: Database connection
+    """
+    connection.execute(
+        text(f'INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES (\'rebuild\')')
+    )
+
+def fts_available() -> bool:
+    """
+    Returns whether captions can be searched with the full-text index,
+    otherwise caption searches fall back to LIKE.
+    """
+    engine = db.engine
+    url = str(engine.url)
+
+    if url not in _available:
+        _available[url] = engine.dialect.name == 'sqlite' and bool(
+            db.session.scalar(
+                text(
+                    'SELECT 1 FROM sqlite_master '\
+                    'WHERE type = \'table\' AND name = :name'
+                ),
+                { 'name': FTS_TABLE }
+            )
+        )
+
+    return _available[url]
+
+@event.listens_for(Post.__table__, 'after_create')
+def _create_fts(target, connection: Connection, **kwargs) -> None:
+    create_fts(connection)
@@ -1,5 +1,7 @@
 from .comment import Comment
-from .post import Post
+from .job import Job, JobStatus
+from .manifest import ManifestEntry
+from .post import Post, PostStatus
 from .permission import Permission
 from .role import Role
 from .role_perms import RolePerms
@@ -9,5 +11,7 @@ from .score_assoc import ScoreAssociation
 from .snapshot_assoc import TagSnapshotAssociation
 from .tag import Tag
 from .thumbnail import Thumbnail
+from .thumbnail_variant import ThumbnailVariant
 from .tag_assoc import TagAssociation
 from .user import User
+from .user_stats import UserStats
@@ -0,0 +1,50 @@
+from datetime import datetime
+from enum import StrEnum
+from typing import Optional
+
+from sqlalchemy import ForeignKey, Index, String
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from db import db
+from .mixins.created import CreatedMixin
+from .mixins.id import IdMixin
+
+class JobStatus(StrEnum):
+    """
+    Represents state of a job, finished jobs are deleted.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+
+class Job(db.Model, CreatedMixin, IdMixin):
+    # What handler runs the job, e.g process_post.
+    kind: Mapped[str] = mapped_column(String(length = 30), nullable = False)
+    post_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey('post.id', ondelete = 'CASCADE'),
+        index = True,
+        nullable = True
+    )
+    post: Mapped[Optional['Post']] = relationship('Post')
+
+    status: Mapped[str] = mapped_column(
+        String(length = 10),
+        default = JobStatus.QUEUED,
+        nullable = False
+    )
+    attempts: Mapped[int] = mapped_column(default = 0, nullable = False)
+    # When the job may run, pushed back after each failed attempt.
+    run_after: Mapped[datetime] = mapped_column(nullable = False)
+    # When and by which worker the running job was claimed.
+    claimed: Mapped[Optional[datetime]] = mapped_column(nullable = True)
+    worker: Mapped[Optional[str]] = mapped_column(
+        String(length = 60),
+        nullable = True
+    )
+    # Error of the last failed attempt.
+    error: Mapped[Optional[str]] = mapped_column(nullable = True)
+
+    __table_args__ = (
+        # Workers look for the next due job by these.
+        Index('ix_job_status_run_after', 'status', 'run_after'),
+    )
@@ -0,0 +1,23 @@
+from sqlalchemy import BigInteger, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from db import db
+
+class ManifestEntry(db.Model):
+    """
+    What flask add last saw of a file within CONTENT_PATH, so files
+    that didn't change since aren't read again (see api/manifest.py).
+    """
+    __tablename__ = 'manifest_entry'
+
+    # Path relative to CONTENT_PATH.
+    path: Mapped[str] = mapped_column(primary_key = True)
+    size: Mapped[int] = mapped_column(BigInteger, nullable = False)
+    mtime_ns: Mapped[int] = mapped_column(BigInteger, nullable = False)
+    inode: Mapped[int] = mapped_column(BigInteger, nullable = False)
+    # Not necessarily of a post, files that aren't media are kept too.
+    md5: Mapped[str] = mapped_column(
+        String(length = 32),
+        index = True,
+        nullable = False
+    )
@@ -1,25 +1,11 @@
-from sqlalchemy import func, and_, select
-from sqlalchemy.sql import ColumnElement
-from sqlalchemy.ext.hybrid import hybrid_property
-
-from ..score_assoc import ScoreAssociation
+from sqlalchemy import text
+from sqlalchemy.orm import Mapped, mapped_column
 
 class ScoreMixin:
-    @hybrid_property
-    def score(self) -> int:
-        return sum(score.value for score in self.scores)
-
-    @score.inplace.expression
-    def score(cls) -> ColumnElement[int]:
-        subquery = (
-            select(func.coalesce(func.sum(ScoreAssociation.value), 0))
-            .where(
-                and_(
-                    ScoreAssociation.target_id == cls.id,
-                    ScoreAssociation.target_type == cls.__name__.lower()
-                )
-            )
-            .correlate(cls) # This tells SQL exactly which "id" to use
-        ).scalar_subquery()
-        
-        return subquery
+    # Sum of vote values, kept in step by api/score.py.
+    score: Mapped[int] = mapped_column(
+        default = 0,
+        nullable = False,
+        server_default = text('0'),
+        index = True
+    )
@@ -10,13 +10,18 @@ class SortableMixin:
         return ( c.key for c in inspect(cls).mapper.column_attrs )
 
     @classmethod
-    def apply_sort(cls, stmt: Select[T], key: str, direction: Literal['asc', 'desc']) -> Select[T]:
-        valid_columns = cls.get_sortable_columns()
+    def get_sort_key(cls, key: str) -> str:
+        return key if key in cls.get_sortable_columns() else 'id'
 
-        if key not in valid_columns:
-            key = 'id'
+    @classmethod
+    def apply_sort(cls, stmt: Select[T], key: str, direction: Literal['asc', 'desc']) -> Select[T]:
+        key = cls.get_sort_key(key)
 
         column = getattr(cls, key)
         sort_method = getattr(column, direction)
 
+        # Sort ties by ID, so every element has a stable position.
+        if key != 'id':
+            return stmt.order_by(sort_method(), getattr(cls.id, direction)())
+
         return stmt.order_by(sort_method())
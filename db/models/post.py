@@ -1,18 +1,27 @@
 from datetime import datetime
+from enum import StrEnum
 from math import floor, log, pow
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 from urllib.parse import urlparse
 
 from flask import url_for
-from sqlalchemy import String, func
+from sqlalchemy import String, exists, func, select
 from sqlalchemy.ext.hybrid import hybrid_property
-from sqlalchemy.orm import Mapped, mapped_column, relationship, validates
+from sqlalchemy.orm import (
+    Mapped,
+    column_property,
+    declared_attr,
+    mapped_column,
+    relationship,
+    validates
+)
 from sqlalchemy.sql import ColumnElement
 
 from config import CONTENT_PATH, NSFW_TAG, SENSITIVE_DIRS
 from db import db
-from .thumbnail import Thumbnail
+from .thumbnail import Thumbnail, thumbnail_version
+from .thumbnail_variant import ThumbnailVariant
 from .mixins.author import AuthorMixin
 from .mixins.created import CreatedMixin
 from .mixins.id import IdMixin
@@ -23,6 +32,14 @@ from .mixins.serializer import SerializerMixin
 
 DISK_SIZES = ('B', 'KB', 'MB', 'GB')
 
+class PostStatus(StrEnum):
+    """
+    Represents whether post's file is probed and thumbnailed yet.
+    """
+    PROCESSING = 'processing'
+    READY = 'ready'
+    FAILED = 'failed'
+
 class Post(
     db.Model,
     AuthorMixin,
@@ -66,6 +83,14 @@ class Post(
     height: Mapped[int] = mapped_column(nullable = True)
     width: Mapped[int] = mapped_column(nullable = True)
 
+    # Uploads are processing until a job probes and thumbnails them.
+    status: Mapped[str] = mapped_column(
+        String(length = 10),
+        default = PostStatus.READY,
+        nullable = False,
+        server_default = PostStatus.READY.value
+    )
+
     comments: Mapped[list['Comment']] = relationship(back_populates = 'post', cascade = 'all, delete-orphan')
     snapshots: Mapped[list['Snapshot']] = relationship(
         back_populates = 'post',
@@ -80,6 +105,43 @@ class Post(
         overlaps="scores"
     )
 
+    @declared_attr
+    def has_thumbnail(cls) -> Mapped[bool]:
+        # Selected along the post, so tiles don't load their thumbnail.
+        return column_property(
+            exists()
+            .where(Thumbnail.post_id == cls.id)
+            .correlate_except(Thumbnail)
+        )
+
+    @declared_attr
+    def thumbnail_created(cls) -> Mapped[Optional[datetime]]:
+        # Tiles version their thumbnail's URL by it.
+        return column_property(
+            select(Thumbnail.created)
+            .where(Thumbnail.post_id == cls.id)
+            .correlate_except(Thumbnail)
+            .scalar_subquery()
+        )
+
+    @declared_attr
+    def thumbnail_widths(cls) -> Mapped[Optional[str]]:
+        # Sizes of the thumbnail's variants and their widths, e.g
+        # 150:266,300:533. Only tiles load it, for their srcset.
+        return column_property(
+            select(func.group_concat(
+                ThumbnailVariant.size.concat(':').concat(ThumbnailVariant.width)
+            ))
+            .join(Thumbnail)
+            .where(
+                Thumbnail.post_id == cls.id,
+                ThumbnailVariant.width != None
+            )
+            .correlate_except(Thumbnail, ThumbnailVariant)
+            .scalar_subquery(),
+            deferred = True
+        )
+
     @classmethod
     def is_hyperlink(cls, value: str) -> bool:
         url = urlparse(value)
@@ -171,6 +233,11 @@ class Post(
     def path(self) -> Path:
         return CONTENT_PATH / (self.directory or '') / self.name
 
+    @property
+    def thumbnail_version(self) -> Optional[str]:
+        if self.thumbnail_created:
+            return thumbnail_version(self.md5, self.thumbnail_created)
+
     @property
     def uri(self) -> str:
         return url_for(
@@ -184,9 +251,11 @@ class Post(
     def view_uri(self) -> str:
         # 2025.10.31 - Added 'v' parameter to trick around caching posts who
         # might have been replaced but the browser hasn't picked it up yet.
+        # Versioned by MD5, which only changes when the file is replaced,
+        # so the file can be cached as immutable.
         return url_for(
             'Root.Post.view_file_resource',
             post_id = self.id,
-            v = self.modified,
+            v = self.md5,
             _external = True
         )
@@ -27,6 +27,12 @@ class Tag(db.Model, CreatedMixin, IdMixin, SortableMixin, SerializerMixin):
         nullable = False
     )
     desc: Mapped[str] = mapped_column(nullable = True)
+    # Maintained by triggers on tag_association, see db/counts.py.
+    post_count: Mapped[int] = mapped_column(
+        default = 0,
+        server_default = '0',
+        nullable = False
+    )
 
     posts: Mapped[list['Post']] = relationship(
         back_populates = 'tags',
@@ -66,4 +72,4 @@ class Tag(db.Model, CreatedMixin, IdMixin, SortableMixin, SerializerMixin):
 
     @property
     def count(self) -> int:
-        return len(self.posts)
+        return self.post_count
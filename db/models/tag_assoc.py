@@ -1,4 +1,4 @@
-from sqlalchemy import ForeignKey, UniqueConstraint
+from sqlalchemy import ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column
 
 from db import db
@@ -17,4 +17,6 @@ class TagAssociation(db.Model):
 
     __table_args__ = (
         UniqueConstraint('post_id', 'tag_id', name = 'uq_post_tag'),
+        # Covers searching posts by tag without touching the table.
+        Index('ix_tag_association_tag_post', 'tag_id', 'post_id'),
     )
@@ -1,3 +1,6 @@
+from datetime import datetime
+from typing import Optional
+
 from flask import url_for
 from sqlalchemy import ForeignKey
 from sqlalchemy.orm import Mapped, mapped_column, relationship
@@ -7,6 +10,17 @@ from .mixins.created import CreatedMixin
 from .mixins.id import IdMixin
 from .mixins.serializer import SerializerMixin
 
+def thumbnail_version(md5: str, created: datetime) -> str:
+    """
+    Returns what thumbnail URLs of a post are versioned by.
+    Regenerated thumbnails are created anew, so their URLs change.
+
+    Args:
+        md5: MD5 of the post
+        created: When the post's thumbnail was created
+    """
+    return f'{md5}-{created:%Y%m%d%H%M%S}'
+
 class Thumbnail(db.Model, CreatedMixin, IdMixin, SerializerMixin):
     id: Mapped[int] = mapped_column(primary_key = True)
     post_id: Mapped[int] = mapped_column(
@@ -15,12 +29,30 @@ class Thumbnail(db.Model, CreatedMixin, IdMixin, SerializerMixin):
         unique = True
     )
     post: Mapped['Post'] = relationship('Post', back_populates = 'thumbnail')
-    data: Mapped[bytes] = mapped_column(nullable = False)
+    # Only thumbnail_route needs the image, never load it along the row.
+    # Empty when the image is a file of the filesystem store instead.
+    data: Mapped[Optional[bytes]] = mapped_column(
+        deferred = True,
+        nullable = True
+    )
+    # Path of the image within THUMBNAIL_PATH.
+    path: Mapped[Optional[str]] = mapped_column(nullable = True)
+    # Known when generated, so the image is never sniffed when sent.
+    mime: Mapped[Optional[str]] = mapped_column(nullable = True)
+    variants: Mapped[list['ThumbnailVariant']] = relationship(
+        back_populates = 'thumbnail',
+        cascade = 'all, delete-orphan'
+    )
+
+    @property
+    def version(self) -> str:
+        return thumbnail_version(self.post.md5, self.created)
 
     @property
     def view_uri(self) -> str:
         return url_for(
             'Root.Thumbnail.thumbnail_route',
             post_id = self.post_id,
+            v = self.version,
             _external = True
         )
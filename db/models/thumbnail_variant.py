@@ -0,0 +1,36 @@
+from typing import Optional
+
+from sqlalchemy import ForeignKey, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from db import db
+from .mixins.id import IdMixin
+
+class ThumbnailVariant(db.Model, IdMixin):
+    """
+    Additional size of a thumbnail, made from the same frame, which
+    browsers pick by their screen through srcset.
+    """
+    __tablename__ = 'thumbnail_variant'
+
+    thumbnail_id: Mapped[int] = mapped_column(
+        ForeignKey('thumbnail.id', ondelete = 'CASCADE'),
+        nullable = False
+    )
+    thumbnail: Mapped['Thumbnail'] = relationship(back_populates = 'variants')
+    # Shorter side of the image in pixels, one of THUMBNAIL_SIZES.
+    size: Mapped[int] = mapped_column(nullable = False)
+    # Stored the way thumbnail images are, see Thumbnail.
+    data: Mapped[Optional[bytes]] = mapped_column(
+        deferred = True,
+        nullable = True
+    )
+    path: Mapped[Optional[str]] = mapped_column(nullable = True)
+    mime: Mapped[str] = mapped_column(nullable = False)
+    # Width of the image in pixels, which srcset describes it by.
+    # Unknown of variants made before it was stored.
+    width: Mapped[Optional[int]] = mapped_column(nullable = True)
+
+    __table_args__ = (
+        UniqueConstraint('thumbnail_id', 'size', name = 'uq_thumbnail_variant_size'),
+    )
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import Optional
 
 from flask import url_for
@@ -5,9 +6,7 @@ from flask_login import UserMixin
 from secrets import token_urlsafe
 from sqlalchemy import ForeignKey, Integer, String, func, select
 from sqlalchemy.orm import (
-    declared_attr,
     Mapped,
-    column_property,
     mapped_column,
     relationship,
     validates
@@ -18,12 +17,12 @@ from sqlalchemy.ext.hybrid import hybrid_property
 from config import HARDNESS
 from db import db
 from encryption import bcrypt
-from .comment import Comment
 from .mixins.created import CreatedMixin
 from .mixins.id import IdMixin
 from .mixins.sortable import SortableMixin
 from .mixins.serializer import SerializerMixin
 from .post import Post
+from .user_stats import UserStats
 
 class User(
     db.Model,
@@ -87,6 +86,12 @@ class User(
         back_populates = 'user'
     )
     posts: Mapped[list['Post']] = relationship('Post', back_populates = 'author')
+    stats: Mapped[Optional[UserStats]] = relationship(
+        back_populates = 'user',
+        cascade = 'all, delete-orphan',
+        lazy = 'joined',
+        uselist = False
+    )
 
     @validates('mail')
     def validate_user(self, key: str, value: str) -> Optional[str]:
@@ -112,22 +117,31 @@ class User(
     def points_until_levelup(cls) -> ColumnElement[int]:
         return User.LEVEL_HARDNESS - (cls.score % User.LEVEL_HARDNESS)
 
-    @declared_attr
-    def score(cls) -> Mapped[int]:
-        return column_property(
-            (
-                select(func.coalesce(func.sum(Comment.score), 0))
-                .where(Comment.author_id == cls.id)
-                .correlate_except(Comment)
-                .scalar_subquery()
-            ) + (
-                select(func.coalesce(func.sum(Post.score), 0))
-                .where(Post.author_id == cls.id)
-                .correlate_except(Post)
-                .scalar_subquery()
-            )
+    @hybrid_property
+    def score(self) -> int:
+        return self.stats.score if self.stats else 0
+
+    @score.inplace.expression
+    def score_expression(cls) -> ColumnElement[int]:
+        return func.coalesce(
+            select(UserStats.score)
+            .where(UserStats.user_id == cls.id)
+            .scalar_subquery(),
+            0
         )
 
+    @property
+    def comment_count(self) -> int:
+        return self.stats.comment_count if self.stats else 0
+
+    @property
+    def last_upload(self) -> Optional[datetime]:
+        return self.stats.last_upload if self.stats else None
+
+    @property
+    def post_count(self) -> int:
+        return self.stats.post_count if self.stats else 0
+
     @property
     def avatar(self) -> str:
         return url_for(
@@ -179,7 +193,12 @@ class User(
 
     @property
     def recent_posts(self) -> list[Post]:
-        return tuple(reversed(self.posts))[:10]
+        return db.session.scalars(
+            select(Post)
+            .where(Post.author_id == self.id)
+            .order_by(Post.id.desc())
+            .limit(10)
+        ).all()
 
     @property
     def username(self) -> str:
@@ -0,0 +1,36 @@
+from datetime import datetime
+
+from sqlalchemy import ForeignKey, text
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from db import db
+
+class UserStats(db.Model):
+    """
+    Rollup of a user's activity, maintained by triggers (see db/counts.py).
+    """
+    __tablename__ = 'user_stats'
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey('user.id', ondelete = 'CASCADE'),
+        primary_key = True
+    )
+    user: Mapped['User'] = relationship(back_populates = 'stats')
+
+    # Sum of scores of the user's posts and comments.
+    score: Mapped[int] = mapped_column(
+        default = 0,
+        nullable = False,
+        server_default = text('0')
+    )
+    post_count: Mapped[int] = mapped_column(
+        default = 0,
+        nullable = False,
+        server_default = text('0')
+    )
+    comment_count: Mapped[int] = mapped_column(
+        default = 0,
+        nullable = False,
+        server_default = text('0')
+    )
+    last_upload: Mapped[datetime] = mapped_column(nullable = True)
@@ -0,0 +1,236 @@
+from contextlib import contextmanager
+from logging import getLogger
+from re import sub
+from typing import Callable, Iterator, Optional
+
+from sqlalchemy import Connection, text
+
+from .fts import FTS_TABLE, rebuild_fts
+
+# Maps every post's current ID to the one it's renumbered to.
+ID_MAP_TABLE = 'post_id_map'
+SHADOW_SUFFIX = '_reindex'
+
+# Tables holding post IDs, their column and which of their rows
+# hold one, if not every row does.
+POST_ID_COLUMNS: tuple[tuple[str, str, Optional[str]], ...] = (
+    ('post', 'id', None),
+    ('comment', 'post_id', None),
+    ('job', 'post_id', None),
+    ('removed_log', 'entity_id', 't.entity_type = \'Post\''),
+    ('score_association', 'target_id', 't.target_type = \'post\''),
+    ('snapshot', 'post_id', None),
+    ('tag_association', 'post_id', None),
+    ('thumbnail', 'post_id', None)
+)
+
+logger = getLogger('app_logger')
+
+@contextmanager
+def _transaction(connection: Connection) -> Iterator[None]:
+    """
+    Runs statements, DDL included, in one transaction of a connection
+    in autocommit mode, whose driver doesn't begin transactions itself.
+    """
+    connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+    try:
+        yield
+    except BaseException:
+        connection.exec_driver_sql('ROLLBACK')
+        raise
+
+    connection.exec_driver_sql('COMMIT')
+
+def _exists(connection: Connection, name: str) -> bool:
+    return connection.scalar(
+        text('SELECT 1 FROM sqlite_master WHERE name = :name'),
+        { 'name': name }
+    ) is not None
+
+def _count(connection: Connection, table: str) -> int:
+    return connection.scalar(text(f'SELECT count(*) FROM "{table}"'))
+
+def _copy_table(
+    connection: Connection,
+    table: str,
+    column: str,
+    condition: Optional[str],
+    batch_size: int
+) -> int:
+    """
+    Copies table to its shadow table, renumbering post IDs of column.
+    Rows of posts that no longer exist are left out, returns their amount.
+    """
+    shadow = f'{table}{SHADOW_SUFFIX}'
+    # Created the way the table was, which may predate the models.
+    table_sql = connection.scalar(
+        text(
+            'SELECT sql FROM sqlite_master '\
+            'WHERE type = \'table\' AND name = :name'
+        ),
+        { 'name': table }
+    )
+    columns = [
+        row[1] for row in connection.exec_driver_sql(
+            f'PRAGMA table_info("{table}")'
+        )
+    ]
+
+    values = ', '.join(
+        f'coalesce(m.new_id, t."{name}")' if name == column else f't."{name}"'
+        for name in columns
+    )
+    join = f'm.old_id = t."{column}"'
+    keep = f't."{column}" IS NULL OR m.new_id IS NOT NULL'
+
+    if condition:
+        join = f'{join} AND {condition}'
+        keep = f'{keep} OR NOT ({condition})'
+
+    with _transaction(connection):
+        connection.exec_driver_sql(sub(
+            r'^CREATE TABLE\s+("[^"]+"|\S+)',
+            f'CREATE TABLE "{shadow}"',
+            table_sql
+        ))
+
+    last = 0
+
+    while True:
+        with _transaction(connection):
+            upto = connection.scalar(
+                text(
+                    f'SELECT max(rowid) FROM (SELECT rowid FROM "{table}" '\
+                    'WHERE rowid > :last ORDER BY rowid LIMIT :limit)'
+                ),
+                { 'last': last, 'limit': batch_size }
+            )
+
+            if upto is None:
+                break
+
+            connection.execute(
+                text(
+                    f'INSERT INTO "{shadow}" '\
+                    f'({", ".join(f'"{name}"' for name in columns)}) '\
+                    f'SELECT {values} FROM "{table}" AS t '\
+                    f'LEFT JOIN {ID_MAP_TABLE} AS m ON {join} '\
+                    'WHERE t.rowid > :last AND t.rowid <= :upto '\
+                    f'AND ({keep})'
+                ),
+                { 'last': last, 'upto': upto }
+            )
+
+        last = upto
+
+    return _count(connection, table) - _count(connection, shadow)
+
+def _swap_tables(connection: Connection, tables: list[str]) -> None:
+    """
+    Replaces tables with their shadow tables in one transaction,
+    recreating their indexes and triggers.
+    """
+    with _transaction(connection):
+        for table in tables:
+            schema = connection.scalars(
+                text(
+                    'SELECT sql FROM sqlite_master '\
+                    'WHERE tbl_name = :name AND type IN (\'index\', \'trigger\') '\
+                    'AND sql IS NOT NULL'
+                ),
+                { 'name': table }
+            ).all()
+
+            connection.exec_driver_sql(f'DROP TABLE "{table}"')
+            connection.exec_driver_sql(
+                f'ALTER TABLE "{table}{SHADOW_SUFFIX}" RENAME TO "{table}"'
+            )
+
+            for statement in schema:
+                connection.exec_driver_sql(statement)
+
+        # Captions are indexed by post ID.
+        if _exists(connection, FTS_TABLE):
+            rebuild_fts(connection)
+
+        connection.exec_driver_sql(f'DROP TABLE {ID_MAP_TABLE}')
+
+def reindex_posts(
+    connection: Connection,
+    batch_size: int = 5000,
+    report: Callable[[str], None] = logger.info
+) -> int:
+    """
+    Renumbers posts by their creation from 1 without gaps, along every
+    row referring to them. Tables are copied to shadow tables in batches
+    and swapped at once, so memory use doesn't grow with the amount of
+    posts and the database is never left half renumbered.
+    Returns amount of renumbered posts.
+
+    Args:
+        connection: SQLite database connection in autocommit mode
+        batch_size: Amount of rows to copy per transaction
+        report: Function receiving progress messages
+    """
+    specs = [spec for spec in POST_ID_COLUMNS if _exists(connection, spec[0])]
+
+    # Dropping a table would delete rows referring to it otherwise.
+    foreign_keys = connection.exec_driver_sql('PRAGMA foreign_keys').scalar()
+    connection.exec_driver_sql('PRAGMA foreign_keys = OFF')
+
+    try:
+        with _transaction(connection):
+            # Leftovers of an interrupted reindex.
+            for table, *_ in specs:
+                connection.exec_driver_sql(
+                    f'DROP TABLE IF EXISTS "{table}{SHADOW_SUFFIX}"'
+                )
+
+            connection.exec_driver_sql(f'DROP TABLE IF EXISTS {ID_MAP_TABLE}')
+            connection.exec_driver_sql(
+                f'CREATE TABLE {ID_MAP_TABLE} ('\
+                'old_id INTEGER PRIMARY KEY, new_id INTEGER NOT NULL UNIQUE)'
+            )
+            connection.exec_driver_sql(
+                f'INSERT INTO {ID_MAP_TABLE} (old_id, new_id) '\
+                'SELECT id, row_number() OVER (ORDER BY created, id) FROM post'
+            )
+
+        renumbered = connection.scalar(text(
+            f'SELECT count(*) FROM {ID_MAP_TABLE} WHERE old_id != new_id'
+        ))
+
+        if not renumbered:
+            connection.exec_driver_sql(f'DROP TABLE {ID_MAP_TABLE}')
+            report('Posts are numbered in order already.')
+            return 0
+
+        report(f'Renumbering {renumbered} posts...')
+        orphans = 0
+
+        for table, column, condition in specs:
+            dropped = _copy_table(
+                connection,
+                table,
+                column,
+                condition,
+                batch_size
+            )
+            orphans += dropped
+
+            if dropped:
+                report(f'Copied {table}, left out {dropped} rows of missing posts.')
+            else:
+                report(f'Copied {table}.')
+
+        _swap_tables(connection, [table for table, *_ in specs])
+
+        # Counts kept by triggers included the left out rows.
+        if orphans:
+            report('Run flask recount-tags and flask recount-users to correct counts.')
+    finally:
+        connection.exec_driver_sql(f'PRAGMA foreign_keys = {foreign_keys}')
+
+    logger.info(f'Renumbered {renumbered} posts')
+    return renumbered
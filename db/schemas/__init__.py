@@ -10,12 +10,15 @@ from .file import FileIn
 from .post import PostFormIn, PostIn, PostDeleteIn, PostOut
 from .post_bulk import BulkPostIn, BulkPostOut
 from .score import ScoreIn, ScoreOut
+from .stats import CacheStats, CacheStatsOut
 from .tag import (
     TagIn,
     TagsIn,
     TagOut,
     TagsOut,
     TagBulkIn,
-    TagBulkOut
+    TagBulkOut,
+    TagSuggestIn,
+    TagSuggestOut
 )
 from .user import UserOut
@@ -1,5 +1,5 @@
 from apiflask import Schema
-from apiflask.fields import Integer, List, Nested, String
+from apiflask.fields import Boolean, Integer, List, Nested, String
 
 from api import DEFAULT_LIMIT, DEFAULT_SORT, DEFAULT_TERMS, DEFAULT_SORT_DIR
 from .comment import CommentOut
@@ -9,7 +9,10 @@ from .tag import TagOut
 class BrowseIn(Schema):
     """ Represents inbound browsing parameters object. """
     limit = Integer(load_default = DEFAULT_LIMIT)
-    page = Integer(required = True)
+    page = Integer(load_default = 1)
+    # Continue from a next/prev cursor of a previous page instead of page.
+    cursor = String(load_default = None)
+    include_total = Boolean(load_default = True)
     sort = String(load_default = DEFAULT_SORT)
     sort_by = String(load_default = DEFAULT_SORT_DIR)
     terms = String(load_default = 'a b c')
@@ -18,7 +21,13 @@ class BrowsePostIn(BrowseIn):
     terms = String(load_default = DEFAULT_TERMS)
 
 class BrowseOut(Schema):
-    pages = Integer(required = True)
+    # Counts are left out when include_total is false.
+    pages = Integer(allow_none = True)
+    total = Integer(allow_none = True)
+    # Whether more elements exist than counted.
+    approximate = Boolean()
+    next = String(allow_none = True)
+    prev = String(allow_none = True)
 
 class CommentBrowse(BrowseOut):
     comments = List(Nested(CommentOut))
@@ -2,7 +2,7 @@ from apiflask import Schema
 from apiflask.fields import Boolean, DateTime, Integer, List, Nested, String
 from apiflask.validators import Length
 
-from .base import AuthorSchema
+from .base import AuthorSchema, ScoreMixin
 from .file import FileIn
 
 class PostIn(Schema):
@@ -19,7 +19,7 @@ class PostFormIn(FileIn, PostIn):
     """ Represents an inbound post metadata for HTML forms object. """
     directory = String()
 
-class PostOut(AuthorSchema, PostIn):
+class PostOut(AuthorSchema, PostIn, ScoreMixin):
     """ Represents an outbound post object. """
     modified = DateTime()
     tags = List(Nested('TagOut', exclude = ('posts',)))
@@ -34,5 +34,7 @@ class PostOut(AuthorSchema, PostIn):
     disk_size = String(required = True)
     name = String(required = True)
     nsfw = Boolean(required = True)
+    # processing until a job probes and thumbnails it, or failed.
+    status = String(required = True)
     url = String(attribute = 'uri', required = True)
     view_url = String(attribute = 'view_uri', required = True)
@@ -0,0 +1,14 @@
+from apiflask import Schema
+from apiflask.fields import Integer, Nested
+
+class CacheStats(Schema):
+    """ Represents an outbound in-memory cache statistics object. """
+    hits = Integer(required = True)
+    misses = Integer(required = True)
+    entries = Integer(required = True)
+    size = Integer(required = True)
+
+class CacheStatsOut(Schema):
+    """ Represents an outbound statistics object of every cache. """
+    pages = Nested(CacheStats, required = True)
+    counts = Nested(CacheStats, required = True)
@@ -1,6 +1,6 @@
 from apiflask import Schema
 from apiflask.fields import Integer, List, Nested, String
-from apiflask.validators import OneOf
+from apiflask.validators import OneOf, Range
 
 from .base import BaseSchema
 
@@ -23,6 +23,7 @@ class TagsIn(Schema):
 
 class TagOut(BaseSchema, TagIn):
     """ Represents an outbound tag object. """
+    post_count = Integer(dump_only = True)
     posts = List(Nested('PostOut', exclude = ('tags',)))
 
 class TagsOut(Schema):
@@ -39,3 +40,18 @@ class TagBulkOut(Schema):
     """ Represents an outbound bulk tag object. """
     post_ids = List(Integer, required = True)
     tags = List(Nested(TagOut, exclude = ('posts',)))
+
+class TagSuggestIn(Schema):
+    """ Represents an inbound tag suggestion query object. """
+    q = String(load_default = '')
+    limit = Integer(load_default = 10, validate = Range(min = 1, max = 50))
+    exclude = List(String(), load_default = [])
+
+class TagSuggestion(Schema):
+    """ Represents an outbound suggested tag object. """
+    name = String(required = True)
+    count = Integer(required = True)
+
+class TagSuggestOut(Schema):
+    """ Represents an outbound tag suggestions object. """
+    tags = List(Nested(TagSuggestion))
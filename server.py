@@ -4,6 +4,18 @@ load_dotenv()
 
 from waitress import serve
 from app import create_app
+from config import SEARCH_INDEX
 
 if __name__ == '__main__':
-    serve(create_app(), host = '127.0.0.1', port = 5000)
+    app = create_app()
+
+    with app.app_context():
+        from api import tag_index, tag_suggester
+
+        # Build indexes before the first search has to wait for them.
+        if SEARCH_INDEX:
+            tag_index.build()
+
+        tag_suggester.build()
+
+    serve(app, host = '127.0.0.1', port = 5000)
@@ -28,25 +28,20 @@ async function handleSuggesting(input, list) {
     // Setup abort controller.
     controller = new AbortController();
 
-    // Ignore tags that are already specified.
-    const ignoreTags = [];
-
-    getSpans(input.parentElement.parentElement).forEach(function(span) {
-        ignoreTags.push('-' + span.textContent);
-    });
-
     try {
         const params = new URLSearchParams({
             limit: 10,
-            page: 1,
-            sort: 'name',
-            sort_by: 'desc',
-            terms: query
+            q: query
+        });
+
+        // Ignore tags that are already specified.
+        getSpans(input.parentElement.parentElement).forEach(function(span) {
+            params.append('exclude', span.textContent.replace(/^-/, ''));
         });
 
         // Make the request for suggestions.
         await fetch(
-            `/api/tags?${params.toString()}+${ignoreTags.join('+')}`,
+            `/api/tags/suggest?${params.toString()}`,
             {
                 signal: controller.signal
             }
@@ -0,0 +1,89 @@
+from os import environ
+from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import pytest
+
+# Settings are read once config is imported, so they're set before
+# the app is, in a directory of their own.
+ROOT = Path(mkdtemp(prefix = 'booru-test-'))
+
+environ.update({
+    'AVATAR_PATH': str(ROOT / 'avatars'),
+    'CONTENT_PATH': str(ROOT / 'content'),
+    'DATABASE_URI': f'sqlite:///{ROOT / "data.sqlite"}',
+    'TEMP_PATH': str(ROOT / 'temp'),
+    'THUMBNAIL_PATH': str(ROOT / 'thumbnails'),
+    'ALLOW_POSTS': 'true',
+    'ALLOW_USERS': 'true',
+    'TARGET_SIZE': '250',
+    'THUMBNAIL_SIZES': '150,300',
+    'DEFAULT_LIMIT': '20',
+    'DEFAULT_SORT': 'id',
+    'DEFAULT_SORT_DIR': 'desc',
+    'LIMIT_THRESHOLD': '100',
+    'HARDNESS': '5',
+    'MULTIPLIER': '1',
+    'COMMENT_LEVEL': '0',
+    'POSTING_LEVEL': '0',
+    'TAGGING_LEVEL': '2',
+    'NSFW_TAG': 'nsfw',
+    'SECRET_KEY': 'test',
+    'SSL_ENABLED': 'false',
+    'SENSITIVE_DIRS': 'nsfw'
+})
+
+@pytest.fixture(scope = 'session')
+def app():
+    """
+    Returns app of a database seeded with tagged posts, each with
+    a thumbnail and its variants.
+    """
+    from app import create_app
+    from commands import setup_roles_command
+    from db import Post, Tag, Thumbnail, ThumbnailVariant, User, db
+
+    app = create_app()
+
+    with app.app_context():
+        db.create_all()
+        setup_roles_command()
+
+        user = User(name = 'tester', mail = 'tester@localhost', role_id = 1)
+        user.password = 'password'
+        tags = [Tag(name = name) for name in ('cat', 'dog', 'nsfw')]
+        db.session.add(user)
+        db.session.add_all(tags)
+        db.session.flush()
+
+        for index in range(90):
+            post = Post(
+                author_id = user.id,
+                md5 = f'{index:032x}',
+                ext = 'png',
+                mime = 'image/png',
+                size = 100,
+                width = 400,
+                height = 300,
+                caption = f'Post {index}' if index % 2 else None
+            )
+            # Every third post is NSFW, which browsing leaves out.
+            post.tags = tags[:index % 3 + 1]
+            post.thumbnail = Thumbnail(data = b'', mime = 'image/jpeg')
+            post.thumbnail.variants = [
+                ThumbnailVariant(
+                    size = size,
+                    data = b'',
+                    mime = 'image/webp',
+                    width = size * 4 // 3
+                )
+                for size in (150, 300)
+            ]
+            db.session.add(post)
+
+        db.session.commit()
+
+    yield app
+
+    rmtree(ROOT, ignore_errors = True)
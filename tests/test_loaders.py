@@ -0,0 +1,46 @@
+from flask import render_template
+from sqlalchemy import event
+
+from api import browse_post
+from db import db
+
+def count_tile_queries(app, limit: int) -> int:
+    """
+    Returns amount of queries browsing and rendering a page of tiles takes.
+    """
+    statements = []
+
+    def count(connection, cursor, statement, *args):
+        statements.append(statement)
+
+    with app.test_request_context('/en/browse/1'):
+        event.listen(db.engine, 'before_cursor_execute', count)
+
+        try:
+            posts = browse_post(
+                limit = limit,
+                terms = '',
+                profile = 'tile',
+                include_total = False
+            )
+            html = render_template(
+                'frag/posts.html',
+                posts = posts,
+                blur = True
+            )
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+
+    # Every tile is rendered along its thumbnail's srcset.
+    assert html.count('data-post-id') == limit
+    assert html.count('srcset=') == limit
+
+    return len(statements)
+
+def test_tile_queries_dont_grow_with_page_size(app):
+    # Warms up caches of parsed terms and tags.
+    count_tile_queries(app, 1)
+
+    counts = [count_tile_queries(app, limit) for limit in (5, 20, 50)]
+
+    assert counts[0] == counts[1] == counts[2], counts